@@ -0,0 +1,295 @@
+"""WSGI и ASGI при одинаковом числе рабочих потоков и медленных клиентах.
+
+Оба сервера выполняют представления в пуле из ``--workers`` потоков.
+WSGI-сервер (как gunicorn с потоками) отдаёт потоку соединение целиком,
+ASGI-сервер читает запрос и пишет ответ в цикле событий, а поток
+занимает только на время представления (``core.asgi``). Пока
+``--slow`` клиентов по частям за ``--slow-seconds`` присылают запрос,
+``--clients`` быстрых клиентов читают ленты; для быстрых считаются
+RPS и задержки::
+
+    python -m benchmarks.asgi_concurrency --workers 4 --slow 8
+"""
+import argparse
+import asyncio
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIServer
+
+from benchmarks import common
+from benchmarks.loadtest import QuietHandler, Sample
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер с фиксированным пулом потоков на соединения."""
+    request_queue_size = 128
+
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_wsgi(db_path, port, workers, ready):
+    os.environ['YATUBE_PROFILING_SAMPLE'] = '0'
+    common.setup(db_path)
+    from django.core.wsgi import get_wsgi_application
+
+    server = PooledWSGIServer(('127.0.0.1', port), QuietHandler, workers)
+    server.set_app(get_wsgi_application())
+    ready.set()
+    server.serve_forever()
+
+
+async def _handle(application, port, reader, writer):
+    """Один запрос HTTP/1.1 без keep-alive — минимум для ASGI."""
+    try:
+        request_line = await reader.readline()
+        if not request_line:
+            return
+        method, target, version = request_line.decode('latin-1').split()
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((
+                name.strip().lower().encode('latin-1'),
+                value.strip().encode('latin-1'),
+            ))
+        length = int(dict(headers).get(b'content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': version.split('/')[1],
+            'method': method,
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'client': writer.get_extra_info('peername')[:2],
+            'server': ('127.0.0.1', port),
+        }
+        messages = [{'type': 'http.request', 'body': body}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+                lines += [
+                    f'{name.decode("latin-1")}: {value.decode("latin-1")}'
+                    for name, value in message['headers']
+                ]
+                lines.append('Connection: close')
+                writer.write(
+                    ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+                )
+            else:
+                writer.write(message.get('body', b''))
+            await writer.drain()
+
+        await application(scope, receive, send)
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+def serve_asgi(db_path, port, workers, ready):
+    os.environ['YATUBE_PROFILING_SAMPLE'] = '0'
+    os.environ['YATUBE_ASGI_WORKERS'] = str(workers)
+    common.setup(db_path)
+    from core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+
+    async def main():
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle(application, port, reader, writer),
+            '127.0.0.1', port, backlog=128
+        )
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def read_urls(sample):
+    urls = ['/']
+    urls += [f'/group/{slug}/' for slug in sample.slugs[:20]]
+    urls += [f'/profile/{name}/' for name in sample.usernames[:50]]
+    urls += [f'/posts/{pk}/' for pk in sample.post_ids[:50]]
+    return urls
+
+
+def fast_client(number, port, urls, deadline, latencies, errors):
+    rng = random.Random(number)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection(
+            '127.0.0.1', port, timeout=60
+        )
+        try:
+            connection.request('GET', rng.choice(urls))
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except OSError as error:
+            errors.append(error)
+            continue
+        finally:
+            connection.close()
+        latencies.append(time.perf_counter() - started)
+
+
+def slow_client(number, port, urls, seconds, deadline, completed):
+    """Присылает запрос по частям за ``seconds``, как плохая мобильная сеть.
+    """
+    rng = random.Random(-number)
+    while time.perf_counter() < deadline:
+        request = (
+            f'GET {rng.choice(urls)} HTTP/1.1\r\n'
+            f'Host: 127.0.0.1\r\nUser-Agent: slow-client/{number}\r\n'
+            f'Accept: text/html\r\nAccept-Language: ru\r\n\r\n'
+        ).encode()
+        parts = 10
+        step = -(-len(request) // parts)
+        try:
+            with socket.create_connection(('127.0.0.1', port), 60) as sock:
+                for start in range(0, len(request), step):
+                    sock.sendall(request[start:start + step])
+                    time.sleep(seconds / parts)
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            continue
+        completed.append(number)
+
+
+def run(server, db_path, urls, options):
+    port = common.free_port()
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    process = context.Process(
+        target=server, args=(db_path, port, options.workers, ready),
+        daemon=True
+    )
+    process.start()
+    try:
+        ready.wait(60)
+        latencies, errors, completed = [], [], []
+        started = time.perf_counter()
+        deadline = started + options.duration
+        threads = [
+            threading.Thread(
+                target=slow_client, daemon=True,
+                args=(num, port, urls, options.slow_seconds, deadline,
+                      completed)
+            )
+            for num in range(options.slow)
+        ]
+        # Медленные клиенты успевают занять потоки раньше быстрых.
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        threads += [
+            threading.Thread(
+                target=fast_client, daemon=True,
+                args=(num, port, urls, deadline, latencies, errors)
+            )
+            for num in range(options.clients)
+        ]
+        for thread in threads[options.slow:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.join()
+    return {
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(common.percentile(latencies, 0.5) * 1000, 1),
+        'p95_ms': round(common.percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(common.percentile(latencies, 0.99) * 1000, 1),
+        'errors': len(errors),
+        'slow_done': len(completed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--db', help='Файл базы; если есть — без наполнения.')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--comments', type=int, default=40000)
+    parser.add_argument('--follows', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Потоков для представлений у обоих серверов.')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--slow', type=int, default=8)
+    parser.add_argument('--slow-seconds', type=float, default=2.0)
+    parser.add_argument('--duration', type=float, default=15)
+    options = parser.parse_args()
+
+    db_path = options.db or common.temp_db_path()
+    fresh = not os.path.exists(db_path)
+    common.setup(db_path)
+    from django.core.management import call_command
+    if fresh:
+        common.seed(
+            users=options.users, posts=options.posts,
+            comments=options.comments, follows=options.follows
+        )
+    call_command('migrate', verbosity=0)
+    from django.db import connection
+    urls = read_urls(Sample(readers=0))
+    connection.close()
+
+    try:
+        print(f'{options.workers} потоков, {options.clients} быстрых и '
+              f'{options.slow} медленных клиентов')
+        print(f'{"server":8}{"rps":>8}{"p50 ms":>9}{"p95 ms":>9}'
+              f'{"p99 ms":>9}{"errors":>8}{"slow":>6}')
+        for name, server in (('wsgi', serve_wsgi), ('asgi', serve_asgi)):
+            stats = run(server, db_path, urls, options)
+            print(f'{name:8}{stats["rps"]:>8}{stats["p50_ms"]:>9}'
+                  f'{stats["p95_ms"]:>9}{stats["p99_ms"]:>9}'
+                  f'{stats["errors"]:>8}{stats["slow_done"]:>6}')
+    finally:
+        if not options.db:
+            os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
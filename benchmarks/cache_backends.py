@@ -0,0 +1,138 @@
+"""Сравнение бэкендов кеша под нагрузкой нескольких процессов.
+
+Каждый процесс — отдельный «воркер» со своим Django и тестовым
+клиентом. Замеряются доля попаданий в кеш фрагментов и задержки
+страниц ``/``, ``/group/<slug>/`` и ``/profile/<username>/``::
+
+    python -m benchmarks.cache_backends --processes 4 --requests 500
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks import common
+
+BACKENDS = ('locmem', 'file', 'sqlite', 'redis')
+
+
+def worker(args):
+    number, options = args
+    common.setup()
+    from django.core.cache import caches
+    from django.test import Client
+
+    from posts.models import Comment, Group, Post, User
+
+    stats = {'hits': 0, 'misses': 0}
+    fragment_cache = caches['default']
+    original_get = fragment_cache.get
+
+    def counting_get(key, default=None, version=None):
+        value = original_get(key, default, version)
+        if key.startswith('template.cache.'):
+            stats['hits' if value is not None else 'misses'] += 1
+        return value
+
+    fragment_cache.get = counting_get
+    rng = random.Random(number)
+    slugs = list(Group.objects.values_list('slug', flat=True))
+    usernames = list(User.objects.values_list('username', flat=True))
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:200])
+    weights = [1 / (rank + 1) for rank in range(len(usernames))]
+    client = Client()
+    latencies = {'index': [], 'group': [], 'profile': []}
+    for num in range(options.requests):
+        if options.write_every and num % options.write_every == 0:
+            Comment.objects.create(
+                post_id=rng.choice(post_ids),
+                author_id=1,
+                text='Комментарий из бенчмарка'
+            )
+        kind = rng.choice(tuple(latencies))
+        if kind == 'index':
+            url = '/'
+        elif kind == 'group':
+            url = f'/group/{rng.choice(slugs)}/'
+        else:
+            url = f'/profile/{rng.choices(usernames, weights)[0]}/'
+        start = time.perf_counter()
+        client.get(url)
+        latencies[kind].append(time.perf_counter() - start)
+    return latencies, stats
+
+
+def run_backend(backend, options):
+    os.environ['YATUBE_CACHE'] = backend
+    server = None
+    if backend == 'redis':
+        from core.cache_backends import resp_server
+        port = common.free_port()
+        server = resp_server.serve(port=port)
+        os.environ['YATUBE_REDIS_URL'] = f'redis://127.0.0.1:{port}/0'
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(options.processes) as pool:
+            results = pool.map(
+                worker,
+                [(num, options) for num in range(options.processes)]
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+    latencies = {}
+    hits = misses = 0
+    for worker_latencies, stats in results:
+        hits += stats['hits']
+        misses += stats['misses']
+        for kind, values in worker_latencies.items():
+            latencies.setdefault(kind, []).extend(values)
+    return latencies, hits, misses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument(
+        '--write-every', type=int, default=50,
+        help='Каждый N-й запрос воркер добавляет комментарий.'
+    )
+    parser.add_argument(
+        '--backends', nargs='+', choices=BACKENDS, default=BACKENDS
+    )
+    options = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='yatube-bench-')
+    common.setup(os.path.join(workdir, 'db.sqlite3'))
+    from django.conf import settings
+    common.seed(posts=options.posts)
+    print(f'{"backend":8} {"page":8} {"p50 ms":>8} {"p99 ms":>8} '
+          f'{"hit ratio":>9}')
+    try:
+        for backend in options.backends:
+            location = settings.CACHE_BACKENDS[backend].get('LOCATION', '')
+            if backend in ('file', 'sqlite'):
+                shutil.rmtree(location, ignore_errors=True)
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.isfile(location + suffix):
+                        os.unlink(location + suffix)
+            latencies, hits, misses = run_backend(backend, options)
+            ratio = hits / (hits + misses) if hits + misses else 0
+            for kind, values in latencies.items():
+                print(
+                    f'{backend:8} {kind:8} '
+                    f'{common.percentile(values, 0.5) * 1000:8.2f} '
+                    f'{common.percentile(values, 0.99) * 1000:8.2f} '
+                    f'{ratio:9.1%}'
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Общие части бенчмарков: настройка Django, тестовые данные, статистика."""
+import os
+import random
+import socket
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+import django
+
+
+def setup(db_path=None):
+    if db_path is not None:
+        os.environ['BENCH_DB'] = db_path
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def temp_db_path():
+    fd, path = tempfile.mkstemp(prefix='yatube-bench-', suffix='.sqlite3')
+    os.close(fd)
+    os.unlink(path)
+    return path
+
+
+@contextmanager
+def explicit_dates(model, field_name):
+    """Разрешить задать ``auto_now_add``-поле вручную при bulk_create."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+SEED_CHUNK = 10000
+
+
+def power_law(rng, population, count, exponent=1.0):
+    """``count`` элементов ``population``, первые выбираются чаще.
+
+    Вес ранга ``r`` — ``1 / (r + 1) ** exponent``; накопленные веса
+    считаются один раз, поэтому выборка миллионов элементов быстрая.
+    """
+    cumulative = list(accumulate(
+        1 / (rank + 1) ** exponent for rank in range(len(population))
+    ))
+    return rng.choices(population, cum_weights=cumulative, k=count)
+
+
+def _chunks(count):
+    for start in range(0, count, SEED_CHUNK):
+        yield start, min(SEED_CHUNK, count - start)
+
+
+def seed(users=200, groups=20, posts=5000, comments=10000, follows=2000,
+         rng=None, verbose=False):
+    """Заполнить пустую базу данными с правдоподобным распределением.
+
+    Авторы постов, популярность постов у комментаторов и авторов у
+    подписчиков распределены по степенному закону. Сигналы моделей
+    не срабатывают (``bulk_create``), поэтому ленты подписок и поисковый
+    индекс не заполняются; счётчики пересчитываются в конце.
+    """
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from posts import counters
+    from posts.models import Comment, Follow, Group, Post
+
+    def log(message):
+        if verbose:
+            print(message, flush=True)
+
+    User = get_user_model()
+    rng = rng or random.Random(0)
+    call_command('migrate', verbosity=0)
+    log(f'Пользователи: {users}')
+    for start, size in _chunks(users):
+        User.objects.bulk_create([
+            User(username=f'user{num}', password='!')
+            for num in range(start, start + size)
+        ])
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    Group.objects.bulk_create([
+        Group(title=f'Группа {num}', slug=f'group{num}',
+              description=f'Описание группы {num}')
+        for num in range(groups)
+    ])
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    # Немногие авторы пишут большую часть постов (степенной закон).
+    authors = power_law(rng, user_ids, posts)
+    now = timezone.now()
+    log(f'Посты: {posts}')
+    with explicit_dates(Post, 'pub_date'):
+        for start, size in _chunks(posts):
+            Post.objects.bulk_create([
+                Post(
+                    text=f'Тестовый пост номер {num}',
+                    author_id=authors[num],
+                    group_id=rng.choice(group_ids + [None]),
+                    pub_date=now - timedelta(minutes=posts - num),
+                )
+                for num in range(start, start + size)
+            ])
+    del authors
+    # Свежие посты комментируют чаще старых.
+    post_ids = list(
+        Post.objects.order_by('-pk').values_list('pk', flat=True)
+    )
+    log(f'Комментарии: {comments}')
+    for _, size in _chunks(comments):
+        Comment.objects.bulk_create([
+            Comment(post_id=post_id, author_id=rng.choice(user_ids),
+                    text='Комментарий')
+            for post_id in power_law(rng, post_ids, size, exponent=0.8)
+        ])
+    del post_ids
+    log(f'Подписки: {follows}')
+    edges = set(zip(
+        (rng.choice(user_ids) for _ in range(follows)),
+        power_law(rng, user_ids, follows),
+    ))
+    edges = [(user, author) for user, author in edges if user != author]
+    for start, size in _chunks(len(edges)):
+        Follow.objects.bulk_create([
+            Follow(user_id=user, author_id=author)
+            for user, author in edges[start:start + size]
+        ])
+    log('Счётчики')
+    counters.create_missing_stats()
+    counters.recount()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
@@ -0,0 +1,103 @@
+"""Скорость рассылки сводок подписчикам популярного автора.
+
+Создаёт автора с ``--followers`` подписчиками (у каждого есть почта) и
+``--posts`` его свежими постами, поднимает локальный SMTP-сервер
+(``benchmarks.smtp_server``) и рассылает сводки ``posts.digests``:
+пачками через пул соединений. Для сравнения ``--naive`` писем уходят
+по-старому — ``send_mail`` с отдельным соединением на письмо::
+
+    python -m benchmarks.digests --followers 100000
+"""
+import argparse
+import os
+import time
+
+from benchmarks import common, smtp_server
+
+
+def seed_followers(followers, posts):
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from posts import counters
+    from posts.models import Follow, Post
+
+    User = get_user_model()
+    call_command('migrate', verbosity=0)
+    author = User.objects.create_user('author')
+    for start, size in common._chunks(followers):
+        User.objects.bulk_create([
+            User(username=f'reader{num}', email=f'reader{num}@example.com',
+                 password='!')
+            for num in range(start, start + size)
+        ])
+    reader_ids = list(
+        User.objects.exclude(pk=author.pk).values_list('pk', flat=True)
+    )
+    for start, size in common._chunks(len(reader_ids)):
+        Follow.objects.bulk_create([
+            Follow(user_id=pk, author=author)
+            for pk in reader_ids[start:start + size]
+        ])
+    Post.objects.bulk_create([
+        Post(author=author, text=f'Новый пост номер {num} ' * 5)
+        for num in range(posts)
+    ])
+    counters.create_missing_stats()
+    counters.recount()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--followers', type=int, default=100000)
+    parser.add_argument('--posts', type=int, default=3)
+    parser.add_argument('--naive', type=int, default=2000,
+                        help='Писем для сравнения с письмом на соединение.')
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=500)
+    options = parser.parse_args()
+
+    db_path = common.temp_db_path()
+    common.setup(db_path)
+    from django.core.mail import send_mail
+    from django.test.utils import override_settings
+
+    from posts import digests
+
+    port = common.free_port()
+    server = smtp_server.serve(port=port)
+    try:
+        print(f'Подписчики: {options.followers}', flush=True)
+        seed_followers(options.followers, options.posts)
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=port,
+            DIGEST_CONNECTIONS=options.connections,
+            DIGEST_BATCH_SIZE=options.batch_size,
+        ):
+            started = time.perf_counter()
+            for num in range(options.naive):
+                send_mail(
+                    digests.SUBJECT, 'Новый пост', None,
+                    [f'reader{num}@example.com']
+                )
+            naive = options.naive / (time.perf_counter() - started)
+            before = dict(smtp_server.STATS)
+            started = time.perf_counter()
+            sent = digests.send_digests()
+            elapsed = time.perf_counter() - started
+        connections = smtp_server.STATS['connections'] - before[
+            'connections'
+        ]
+        print(f'{"":24}{"писем":>9}{"соединений":>12}{"писем/с":>10}')
+        print(f'{"письмо на соединение":24}{options.naive:>9}'
+              f'{options.naive:>12}{naive:>10.0f}')
+        print(f'{"сводки пачками":24}{sent:>9}{connections:>12}'
+              f'{sent / elapsed:>10.0f}')
+    finally:
+        server.shutdown()
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""Нагрузочный тест всех адресов posts/urls.py через настоящий WSGI-сервер.
+
+Наполняет базу (или берёт готовую из ``--db``), запускает в отдельном
+процессе многопоточный WSGI-сервер и гоняет по нему ``--clients``
+параллельных клиентов в течение ``--duration`` секунд. Для каждого
+маршрута считаются RPS, p50/p95/p99 и число SQL-запросов на запрос
+(из заголовка ``Server-Timing``). Итог сохраняется в JSON вместе с
+хешем коммита, чтобы сравнивать прогоны::
+
+    python -m benchmarks.loadtest --db /tmp/yatube-1m.sqlite3 \\
+        --users 100000 --posts 1000000 --comments 3000000 \\
+        --follows 1000000
+    python -m benchmarks.loadtest --db /tmp/yatube-1m.sqlite3 \\
+        --compare benchmarks/results/loadtest-<commit>.json
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from benchmarks import common
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+QUERIES_RE = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+# Маршрут: (вес в смеси запросов, нужен ли вход).
+ROUTES = {
+    'index': (20, False),
+    'search': (5, False),
+    'group_list': (10, False),
+    'profile': (15, False),
+    'post_detail': (20, False),
+    'comments': (5, False),
+    'follow_index': (10, True),
+    'post_create': (2, True),
+    'post_edit': (2, True),
+    'add_comment': (3, True),
+    'profile_follow': (1, True),
+    'profile_unfollow': (1, True),
+}
+SEARCH_WORDS = ('пост', 'тестовый', 'номер', 'комментарий')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(db_path, port, ready):
+    os.environ['YATUBE_PROFILING_SAMPLE'] = '0'
+    os.environ['YATUBE_SERVER_TIMING'] = '1'
+    common.setup(db_path)
+    from django.core.wsgi import get_wsgi_application
+
+    server = ThreadingWSGIServer(('127.0.0.1', port), QuietHandler)
+    server.set_app(get_wsgi_application())
+    ready.set()
+    server.serve_forever()
+
+
+class Sample:
+    """Объекты базы, из которых клиенты собирают адреса."""
+
+    def __init__(self, readers):
+        from django.contrib.auth import get_user_model
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.db.models import Count
+
+        from posts import feeds
+        from posts.models import Follow, Group, Post
+
+        User = get_user_model()
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.usernames = list(
+            User.objects.order_by('-stats__posts_count')
+            .values_list('username', flat=True)[:1000]
+        )
+        self.post_ids = list(
+            Post.objects.order_by('-comments_count')
+            .values_list('pk', flat=True)[:1000]
+        )
+        # Читатели — самые активные подписчики: их ленты наполняются
+        # здесь, потому что seed() не раскладывает посты по лентам.
+        users = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows')[:readers]
+        self.sessions = []
+        for user in users:
+            for author_id in Follow.objects.filter(
+                    user=user).values_list('author_id', flat=True):
+                feeds.backfill(user.pk, author_id)
+            session = SessionStore()
+            session['_auth_user_id'] = str(user.pk)
+            session['_auth_user_backend'] = (
+                'django.contrib.auth.backends.ModelBackend'
+            )
+            session['_auth_user_hash'] = user.get_session_auth_hash()
+            session.create()
+            own_posts = list(
+                Post.objects.filter(author=user)
+                .values_list('pk', flat=True)[:100]
+            )
+            self.sessions.append((session.session_key, own_posts))
+
+
+class Client(threading.Thread):
+    def __init__(self, number, port, sample, deadline, results):
+        super().__init__(daemon=True)
+        self.rng = random.Random(number)
+        self.port = port
+        self.sample = sample
+        self.deadline = deadline
+        self.results = results
+        self.cookies = {}
+        self.own_posts = []
+        # Нечётные клиенты ходят с входом, чётные — гости.
+        if sample.sessions and number % 2:
+            session_key, self.own_posts = self.rng.choice(sample.sessions)
+            self.cookies['sessionid'] = session_key
+
+    def request(self, method, url, body=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = {'Cookie': '; '.join(
+            f'{name}={value}' for name, value in self.cookies.items()
+        )}
+        if body is not None:
+            body = urlencode(body)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+        try:
+            connection.request(method, url, body, headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response
+
+    def route_request(self, route):
+        """Метод, адрес и тело запроса для маршрута."""
+        sample, rng = self.sample, self.rng
+        post_id = rng.choice(sample.post_ids)
+        username = rng.choice(sample.usernames)
+        requests = {
+            'index': lambda: ('GET', '/', None),
+            'search': lambda: (
+                'GET',
+                '/search/?' + urlencode({'q': rng.choice(SEARCH_WORDS)}),
+                None
+            ),
+            'group_list': lambda: (
+                'GET', f'/group/{rng.choice(sample.slugs)}/', None
+            ),
+            'profile': lambda: ('GET', f'/profile/{username}/', None),
+            'post_detail': lambda: ('GET', f'/posts/{post_id}/', None),
+            'comments': lambda: ('GET', f'/posts/{post_id}/comments/', None),
+            'follow_index': lambda: ('GET', '/follow/', None),
+            'post_create': lambda: ('GET', '/create/', None),
+            'post_edit': lambda: (
+                'GET', f'/posts/{rng.choice(self.own_posts)}/edit/', None
+            ),
+            'add_comment': lambda: (
+                'POST', f'/posts/{post_id}/comment/',
+                {'text': 'Комментарий из нагрузочного теста'}
+            ),
+            'profile_follow': lambda: (
+                'GET', f'/profile/{username}/follow/', None
+            ),
+            'profile_unfollow': lambda: (
+                'GET', f'/profile/{username}/unfollow/', None
+            ),
+        }
+        return requests[route]()
+
+    def routes(self):
+        names, weights = [], []
+        for name, (weight, login) in ROUTES.items():
+            if login and 'sessionid' not in self.cookies:
+                continue
+            if name == 'post_edit' and not self.own_posts:
+                continue
+            names.append(name)
+            weights.append(weight)
+        return names, weights
+
+    def run(self):
+        if 'sessionid' in self.cookies:
+            # Страница формы выдаёт cookie csrftoken для POST-запросов.
+            self.request('GET', '/create/')
+        names, weights = self.routes()
+        while time.perf_counter() < self.deadline:
+            route = self.rng.choices(names, weights)[0]
+            method, url, body = self.route_request(route)
+            started = time.perf_counter()
+            try:
+                response = self.request(method, url, body)
+            except OSError:
+                self.results.append((route, None, None, False))
+                continue
+            elapsed = time.perf_counter() - started
+            match = QUERIES_RE.search(response.getheader('Server-Timing', ''))
+            self.results.append((
+                route, elapsed,
+                int(match.group(1)) if match else None,
+                response.status < 400,
+            ))
+
+
+def summarize(results, duration):
+    routes = {}
+    for route, elapsed, queries, ok in results:
+        stats = routes.setdefault(
+            route, {'latencies': [], 'queries': [], 'errors': 0}
+        )
+        if not ok:
+            stats['errors'] += 1
+        if elapsed is not None:
+            stats['latencies'].append(elapsed)
+        if queries is not None:
+            stats['queries'].append(queries)
+    summary = {}
+    for route, stats in sorted(routes.items()):
+        latencies, queries = stats['latencies'], stats['queries']
+        summary[route] = {
+            'requests': len(latencies),
+            'errors': stats['errors'],
+            'rps': round(len(latencies) / duration, 1),
+            'p50_ms': round(common.percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(common.percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(common.percentile(latencies, 0.99) * 1000, 2),
+            'queries': (
+                round(sum(queries) / len(queries), 1) if queries else None
+            ),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_summary(summary, baseline=None):
+    if baseline:
+        print(f'Изменение p95 относительно {baseline["commit"]}')
+        baseline = baseline['routes']
+    print(f'{"route":18}{"req":>7}{"err":>5}{"rps":>8}{"p50 ms":>9}'
+          f'{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}')
+    for route, stats in summary.items():
+        line = (
+            f'{route:18}{stats["requests"]:>7}{stats["errors"]:>5}'
+            f'{stats["rps"]:>8}{stats["p50_ms"]:>9}{stats["p95_ms"]:>9}'
+            f'{stats["p99_ms"]:>9}{str(stats["queries"]):>9}'
+        )
+        old = (baseline or {}).get(route)
+        if old and old['p95_ms']:
+            change = stats['p95_ms'] / old['p95_ms'] - 1
+            line += f'{change:>+8.0%}'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--db', help='Файл базы; если есть — без наполнения.')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--comments', type=int, default=300000)
+    parser.add_argument('--follows', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=20,
+                        help='Сколько пользователей ходит с входом.')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--output', help='Куда сохранить JSON.')
+    parser.add_argument('--compare', help='JSON прошлого прогона.')
+    options = parser.parse_args()
+
+    db_path = options.db or common.temp_db_path()
+    fresh = not os.path.exists(db_path)
+    common.setup(db_path)
+    from django.core.management import call_command
+    if fresh:
+        common.seed(
+            users=options.users, groups=options.groups,
+            posts=options.posts, comments=options.comments,
+            follows=options.follows, verbose=True
+        )
+        print('Поисковый индекс', flush=True)
+        call_command('rebuild_search_index', verbosity=0)
+    call_command('migrate', verbosity=0)
+    from django.db import connection
+    sample = Sample(options.readers)
+    connection.close()
+
+    port = common.free_port()
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    server = context.Process(
+        target=serve, args=(db_path, port, ready), daemon=True
+    )
+    server.start()
+    try:
+        ready.wait(60)
+        results = []
+        started = time.perf_counter()
+        deadline = started + options.duration
+        clients = [
+            Client(num, port, sample, deadline, results)
+            for num in range(options.clients)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        duration = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.join()
+        if not options.db:
+            os.unlink(db_path)
+
+    summary = summarize(results, duration)
+    total = sum(stats['requests'] for stats in summary.values())
+    report = {
+        'commit': git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'options': vars(options),
+        'total_rps': round(total / duration, 1),
+        'routes': summary,
+    }
+    baseline = None
+    if options.compare:
+        with open(options.compare) as file:
+            baseline = json.load(file)
+    print_summary(summary, baseline)
+    print(f'Всего: {report["total_rps"]} запросов в секунду')
+    output = options.output or os.path.join(
+        RESULTS_DIR, f'loadtest-{report["commit"]}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f'Результаты: {output}')
+
+
+if __name__ == '__main__':
+    main()
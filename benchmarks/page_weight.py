@@ -0,0 +1,146 @@
+"""Вес главной страницы с картинками до и после вариантов для srcset.
+
+Создаёт посты с фотографиями, готовит миниатюры и варианты, затем
+рендерит ``/`` и для каждого профиля экрана выбирает картинку так же,
+как браузер: по ``sizes`` находит ширину слота, умножает на плотность
+пикселей и берёт самый узкий кандидат не уже неё. «До» — единственная
+960-пиксельная миниатюра, «после» — выбранный вариант::
+
+    python -m benchmarks.page_weight --posts 10
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import tempfile
+from io import BytesIO
+
+from benchmarks import common
+
+# (название, ширина окна в CSS-пикселях, плотность пикселей)
+VIEWPORTS = (
+    ('mobile-1x', 360, 1),
+    ('mobile', 375, 2),
+    ('tablet', 768, 2),
+    ('desktop', 1440, 1),
+)
+PICTURE_RE = re.compile(r'<picture>.*?</picture>', re.S)
+SOURCE_RE = re.compile(r'<(?:source|img)[^>]*?srcset="([^"]+)"'
+                       r'[^>]*?sizes="([^"]+)"')
+IMG_SRC_RE = re.compile(r'<img[^>]*?src="([^"]+)"')
+
+
+def photo(rng, width=2400, height=1600):
+    """Картинка с шумом и градиентом: сжимается примерно как фото."""
+    from PIL import Image, ImageFilter
+
+    noise = Image.effect_noise((width // 4, height // 4), 64)
+    noise = noise.resize((width, height)).filter(ImageFilter.GaussianBlur(2))
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (
+        noise,
+        gradient,
+        Image.eval(noise, lambda value: (value + rng.randrange(256)) % 256),
+    ))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def slot_width(sizes, viewport):
+    """Ширина слота по атрибуту ``sizes`` для ширины окна ``viewport``."""
+    for item in sizes.split(','):
+        item = item.strip()
+        match = re.match(r'\(max-width:\s*(\d+)px\)\s+(.+)', item)
+        if match:
+            if viewport > int(match.group(1)):
+                continue
+            item = match.group(2)
+        if item.endswith('vw'):
+            return viewport * float(item[:-2]) / 100
+        return float(item.rstrip('px'))
+    return viewport
+
+
+def choose(srcset, width):
+    candidates = sorted(
+        (int(descriptor.rstrip('w')), url)
+        for url, descriptor in (
+            candidate.split() for candidate in srcset.split(',')
+        )
+    )
+    for candidate_width, url in candidates:
+        if candidate_width >= width:
+            return url
+    return candidates[-1][1]
+
+
+def file_size(url, media_root):
+    from django.conf import settings
+
+    return os.path.getsize(
+        os.path.join(media_root, url[len(settings.MEDIA_URL):])
+    )
+
+
+def measure(html, media_root, viewport, density):
+    before = after = 0
+    for picture in PICTURE_RE.findall(html):
+        before += file_size(IMG_SRC_RE.search(picture).group(1), media_root)
+        # Браузер берёт первый <source>, формат которого поддерживает.
+        srcset, sizes = SOURCE_RE.search(picture).groups()
+        url = choose(srcset, slot_width(sizes, viewport) * density)
+        after += file_size(url, media_root)
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--posts', type=int, default=10)
+    options = parser.parse_args()
+
+    media_root = tempfile.mkdtemp(prefix='yatube-bench-media-')
+    db_path = common.temp_db_path()
+    os.environ['BENCH_DB'] = db_path
+    common.setup()
+    from django.conf import settings
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.core.management import call_command
+    from django.test import Client
+
+    from core.tasks import run_pending
+    from posts import thumbnails
+    from posts.models import Post, User
+
+    settings.MEDIA_ROOT = media_root
+    try:
+        call_command('migrate', verbosity=0)
+        author = User.objects.create_user(username='photographer')
+        rng = random.Random(0)
+        for num in range(options.posts):
+            Post.objects.create(
+                author=author,
+                text=f'Пост с фотографией {num}',
+                image=SimpleUploadedFile(
+                    f'photo{num}.jpg', photo(rng), 'image/jpeg'
+                ),
+            )
+        run_pending()
+        html = Client().get('/').content.decode()
+        print(f'Форматы вариантов: {", ".join(thumbnails.variant_formats())}')
+        print(f'HTML: {len(html) / 1024:.1f} КиБ')
+        print(f'{"экран":<10}{"до, КиБ":>12}{"после, КиБ":>14}'
+              f'{"экономия":>11}')
+        for name, viewport, density in VIEWPORTS:
+            before, after = measure(html, media_root, viewport, density)
+            print(f'{name:<10}{before / 1024:>12.1f}{after / 1024:>14.1f}'
+                  f'{1 - after / before:>11.0%}')
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+        if os.path.exists(db_path):
+            os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
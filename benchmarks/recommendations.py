@@ -0,0 +1,79 @@
+"""Время и память пересчёта «Кого почитать» при разном размере блока.
+
+Наполняет базу ``--users`` пользователями и ``--follows`` подписками
+(популярность авторов по степенному закону) и для каждого размера
+``--block-sizes`` запускает ``posts.recommendations.recompute`` в отдельном
+процессе: печатаются время и прирост пика памяти процесса::
+
+    python -m benchmarks.recommendations --users 100000 --follows 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+from benchmarks import common
+
+
+def recompute(db_path, block_size, results):
+    os.environ['YATUBE_PROFILING_SAMPLE'] = '0'
+    common.setup(db_path)
+    from posts import recommendations
+
+    # Процесс уже занял память на Django; считается только прирост.
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    users, total = recommendations.recompute(block_size=block_size)
+    results.put({
+        'seconds': round(time.perf_counter() - started, 1),
+        'users': users,
+        'rows': total,
+        'peak_mb': round((
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+        ) / 1024),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--db', help='Файл базы; если есть — без наполнения.')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--follows', type=int, default=1000000)
+    parser.add_argument('--block-sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    options = parser.parse_args()
+
+    db_path = options.db or common.temp_db_path()
+    fresh = not os.path.exists(db_path)
+    common.setup(db_path)
+    if fresh:
+        common.seed(users=options.users, posts=0, comments=0,
+                    follows=options.follows, verbose=True)
+    from django.db import connection
+    connection.close()
+
+    context = multiprocessing.get_context('spawn')
+    try:
+        print(f'{"блок":>12}{"секунд":>8}{"МБ":>7}'
+              f'{"пользователей":>15}{"строк":>10}')
+        for block_size in options.block_sizes:
+            results = context.Queue()
+            process = context.Process(
+                target=recompute, args=(db_path, block_size, results)
+            )
+            process.start()
+            process.join()
+            if process.exitcode:
+                raise SystemExit(f'Пересчёт упал: код {process.exitcode}')
+            stats = results.get()
+            print(f'{block_size:>12}{stats["seconds"]:>8}'
+                  f'{stats["peak_mb"]:>7}{stats["users"]:>15}'
+                  f'{stats["rows"]:>10}', flush=True)
+    finally:
+        if not options.db:
+            os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
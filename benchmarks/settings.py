@@ -0,0 +1,20 @@
+"""Настройки для бенчмарков: отдельная база, DEBUG выключен."""
+import os
+
+from yatube.settings import *  # noqa: F401,F403
+from core.databases import tuned_sqlite
+from yatube.settings import BASE_DIR, DATABASES, SQLITE_TUNING
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+# Реплики (YATUBE_DB_REPLICAS) остаются, меняется только основная база.
+DATABASES['default'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.getenv(
+        'BENCH_DB', os.path.join(BASE_DIR, 'bench.sqlite3')
+    ),
+}
+# И к ней применяется профиль SQLite (YATUBE_SQLITE_PROFILE).
+if SQLITE_TUNING:
+    DATABASES['default'] = tuned_sqlite(DATABASES['default'], **SQLITE_TUNING)
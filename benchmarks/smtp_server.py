@@ -0,0 +1,70 @@
+"""Минимальный SMTP-сервер, который принимает и выбрасывает письма.
+
+Понимает команды, которые шлёт ``django.core.mail`` через smtplib,
+и считает принятые письма и соединения::
+
+    python -m benchmarks.smtp_server --port 2525
+"""
+import argparse
+import socketserver
+import threading
+
+STATS = {'messages': 0, 'connections': 0}
+LOCK = threading.Lock()
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def read_data(self):
+        while True:
+            line = self.rfile.readline()
+            if not line or line == b'.\r\n':
+                return
+
+    def handle(self):
+        with LOCK:
+            STATS['connections'] += 1
+        self.reply('220 localhost ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == b'DATA':
+                self.reply('354 end with .')
+                self.read_data()
+                with LOCK:
+                    STATS['messages'] += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def serve(host='127.0.0.1', port=2525):
+    server = Server((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    options = parser.parse_args()
+    Server((options.host, options.port), Handler).serve_forever()
@@ -0,0 +1,152 @@
+"""Пропускная способность SQLite при одновременных записях и чтениях.
+
+Для каждого профиля ``--profiles`` (``YATUBE_SQLITE_PROFILE``) берётся
+копия одной и той же наполненной базы, и ``--writers`` процессов
+публикуют посты и комментарии через ``post_create`` и ``add_comment``,
+а ``--readers`` процессов открывают страницы постов и профилей. Процессы —
+как воркеры gunicorn: у каждого свои соединения. Печатаются записи и
+чтения в секунду, p95 задержки и запросы, упавшие с «database is locked»::
+
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import time
+
+from benchmarks import common
+
+SUFFIXES = ('', '-wal', '-shm')
+
+
+def work(db_path, profile, role, number, start, deadline, results):
+    os.environ['YATUBE_PROFILING_SAMPLE'] = '0'
+    os.environ['YATUBE_SQLITE_PROFILE'] = profile
+    common.setup(db_path)
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError
+    from django.test import Client
+    from django.urls import reverse
+
+    from posts.models import Post
+
+    rng = random.Random(number)
+    users = list(get_user_model().objects.values_list('pk', 'username'))
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    client = Client()
+    if role == 'write':
+        user_id, _ = users[number % len(users)]
+        client.force_login(get_user_model().objects.get(pk=user_id))
+
+    def request():
+        if role == 'read' and rng.random() < 0.5:
+            return client.get(reverse(
+                'posts:post_detail', args=[rng.choice(post_ids)]
+            ))
+        if role == 'read':
+            return client.get(reverse(
+                'posts:profile', args=[rng.choice(users)[1]]
+            ))
+        if rng.random() < 0.2:
+            return client.post(
+                reverse('posts:post_create'), {'text': 'Пост под нагрузкой'}
+            )
+        return client.post(
+            reverse('posts:add_comment', args=[rng.choice(post_ids)]),
+            {'text': 'Комментарий под нагрузкой'}
+        )
+
+    latencies, locked = [], 0
+    time.sleep(max(0.0, start - time.time()))
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            request()
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put((role, latencies, locked))
+
+
+def run(db_path, profile, options):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # Запас на запуск Django в процессах, чтобы все начали одновременно.
+    start = time.time() + 5
+    deadline = start + options.duration
+    processes = [
+        context.Process(target=work, args=(
+            db_path, profile, role, number, start, deadline, results
+        ))
+        for role, count in (
+            ('write', options.writers), ('read', options.readers)
+        )
+        for number in range(count)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            raise SystemExit(f'Процесс упал: код {process.exitcode}')
+    stats = {}
+    for role in ('write', 'read'):
+        latencies = [
+            value for kind, values, _ in collected if kind == role
+            for value in values
+        ]
+        stats[role] = (
+            round(len(latencies) / options.duration, 1),
+            round(common.percentile(latencies, 0.95) * 1000, 1),
+            sum(locked for kind, _, locked in collected if kind == role),
+        )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=10000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--profiles', nargs='+',
+                        default=['default', 'production'])
+    options = parser.parse_args()
+
+    template = common.temp_db_path()
+    common.setup(template)
+    common.seed(users=options.users, posts=options.posts,
+                comments=options.comments)
+    from django.db import connection
+    connection.close()
+
+    try:
+        print(f'{"профиль":12}{"записей/с":>10}{"p95 ms":>8}{"locked":>8}'
+              f'{"чтений/с":>10}{"p95 ms":>8}{"locked":>8}')
+        for profile in options.profiles:
+            db_path = common.temp_db_path()
+            shutil.copy(template, db_path)
+            try:
+                stats = run(db_path, profile, options)
+            finally:
+                for suffix in SUFFIXES:
+                    if os.path.exists(db_path + suffix):
+                        os.unlink(db_path + suffix)
+            line = f'{profile:12}'
+            for rps, p95, locked in (stats['write'], stats['read']):
+                line += f'{rps:>10}{p95:>8}{locked:>8}'
+            print(line, flush=True)
+    finally:
+        os.unlink(template)
+
+
+if __name__ == '__main__':
+    main()
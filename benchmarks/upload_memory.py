@@ -0,0 +1,83 @@
+"""Пиковая память процесса при обработке большой загруженной картинки.
+
+Каждый вариант запускается в отдельном процессе, чтобы ``ru_maxrss``
+не смешивался: ``decode`` — полное декодирование оригинала, как это
+происходило при первом показе миниатюры, ``pipeline`` — проверка и
+уменьшение ``posts.uploads.process_image``::
+
+    python -m benchmarks.upload_memory --megapixels 50
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks import common
+
+
+def make_photo(path, megapixels):
+    from PIL import Image
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    tile = Image.effect_noise((width // 8, height // 8), 48).convert('RGB')
+    tile.resize((width, height)).save(path, 'JPEG', quality=85)
+    return width, height
+
+
+def run(args):
+    mode, path = args
+    common.setup()
+    from django.core.files.uploadedfile import TemporaryUploadedFile
+    from PIL import Image
+
+    from posts.uploads import process_image
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == 'decode':
+        with Image.open(path) as image:
+            image.load()
+    else:
+        upload = TemporaryUploadedFile(
+            'photo.jpg', 'image/jpeg', os.path.getsize(path), None
+        )
+        with open(path, 'rb') as source:
+            upload.write(source.read())
+        upload.seek(0)
+        process_image(upload)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return mode, (peak - before) / 1024, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--megapixels', type=float, default=50)
+    options = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(prefix='yatube-bench-', suffix='.jpg')
+    os.close(fd)
+    try:
+        # ru_maxrss переживает exec, поэтому картинку рисует тоже
+        # отдельный процесс, а не родитель замеряемых.
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(1) as pool:
+            width, height = pool.apply(
+                make_photo, (path, options.megapixels)
+            )
+        print(f'Картинка {width}×{height}, '
+              f'{os.path.getsize(path) / 1024 / 1024:.1f} МиБ')
+        for mode in ('decode', 'pipeline'):
+            with context.Pool(1) as pool:
+                mode, megabytes, elapsed = pool.map(run, [(mode, path)])[0]
+            print(f'{mode:<10}прирост памяти {megabytes:>8.1f} МиБ'
+                  f'{elapsed * 1000:>10.0f} мс')
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Аутентификация запросов к API.
+
+Клиенты без cookie (мобильные приложения, интеграции) передают логин и
+пароль в заголовке ``Authorization: Basic``; для них CSRF не нужен.
+Запросы браузера с сессией проверяются на CSRF так же, как формы сайта.
+"""
+import base64
+import binascii
+
+from django.contrib.auth import authenticate
+from django.middleware.csrf import CsrfViewMiddleware
+
+
+def basic_credentials(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, encoded = header.partition(' ')
+    if scheme.lower() != 'basic' or not encoded:
+        return None
+    try:
+        decoded = base64.b64decode(encoded).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    username, separator, password = decoded.partition(':')
+    if not separator:
+        return None
+    return username, password
+
+
+def authenticate_request(request):
+    """Пользователь запроса или ``None``; вторым — ответ-отказ CSRF."""
+    credentials = basic_credentials(request)
+    if credentials is not None:
+        username, password = credentials
+        user = authenticate(request, username=username, password=password)
+        return user, None
+    if not request.user.is_authenticated:
+        return None, None
+    rejected = CsrfViewMiddleware().process_view(request, None, (), {})
+    return request.user, rejected
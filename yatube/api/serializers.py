@@ -0,0 +1,57 @@
+"""Представление объектов в ответах API.
+
+Клиент может попросить только часть полей (``?fields=id,text``),
+поэтому у каждого сериализатора есть список допустимых полей.
+"""
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'author', 'author_id', 'group_id', 'image',
+    'comments_count',
+)
+COMMENT_FIELDS = ('id', 'post_id', 'author', 'text', 'created')
+GROUP_FIELDS = ('id', 'title', 'slug', 'description', 'posts_count')
+AUTHOR_FIELDS = ('id', 'username', 'full_name')
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def post_data(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': _iso(post.pub_date),
+        'author': post.author.username,
+        'author_id': post.author_id,
+        'group_id': post.group_id,
+        'image': post.image.url if post.image else None,
+        'comments_count': post.comments_count,
+    }
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'post_id': comment.post_id,
+        'author': comment.author.username if comment.author else None,
+        'text': comment.text,
+        'created': _iso(comment.created),
+    }
+
+
+def group_data(group):
+    return {
+        'id': group.pk,
+        'title': group.title,
+        'slug': group.slug,
+        'description': group.description,
+        'posts_count': group.posts_count,
+    }
+
+
+def author_data(user):
+    return {
+        'id': user.pk,
+        'username': user.username,
+        'full_name': user.get_full_name(),
+    }
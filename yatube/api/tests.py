@@ -0,0 +1,192 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def basic_auth(username, password):
+    token = base64.b64encode(f'{username}:{password}'.encode()).decode()
+    return {'HTTP_AUTHORIZATION': f'Basic {token}'}
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='secret')
+        cls.reader = User.objects.create_user('reader', password='secret')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.user, group=cls.group
+            )
+            for number in range(15)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_auth = basic_auth('author', 'secret')
+        self.reader_auth = basic_auth('reader', 'secret')
+
+    def test_list_cursor(self):
+        '''Лента отдаётся страницами по курсору.'''
+        url = reverse('api:posts')
+        first = self.guest_client.get(url, {'limit': 10}).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(first['results'][0]['id'], self.posts[-1].pk)
+        self.assertIsNone(first['previous_cursor'])
+        second = self.guest_client.get(
+            url, {'limit': 10, 'cursor': first['next_cursor']}
+        ).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(second['results'][-1]['id'], self.posts[0].pk)
+
+    def test_list_one_query(self):
+        '''Страница ленты — один запрос: варианты картинок API
+        не нужны.'''
+        with self.assertNumQueries(1):
+            self.guest_client.get(reverse('api:posts'))
+
+    def test_fields(self):
+        '''?fields= оставляет только нужные поля.'''
+        response = self.guest_client.get(
+            reverse('api:group_posts', args=[self.group.pk]),
+            {'fields': 'id,text'}
+        )
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'}
+        )
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['unknown'], ['password'])
+
+    def test_not_modified(self):
+        '''Повторный запрос с ETag получает 304 без запросов к базе.'''
+        url = reverse('api:posts')
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        other = self.guest_client.get(url, {'limit': 5})
+        self.assertNotEqual(other['ETag'], response['ETag'])
+
+    def test_create_requires_auth(self):
+        '''Создать пост можно только с логином и паролем.'''
+        url = reverse('api:posts')
+        response = self.guest_client.post(url, {'text': 'Текст'})
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+        response = self.guest_client.post(
+            url, {'text': 'Текст'}, **basic_auth('author', 'wrong')
+        )
+        self.assertEqual(response.status_code, 401)
+        response = self.guest_client.post(
+            url, json.dumps({'text': 'Текст', 'group': self.group.pk}),
+            content_type='application/json', **self.author_auth
+        )
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(pk=response.json()['id'])
+        self.assertEqual(post.author, self.user)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(response['Location'], f'/api/v1/posts/{post.pk}/')
+        response = self.guest_client.post(
+            url, {'text': ''}, **self.author_auth
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_update_and_delete(self):
+        '''Изменить и удалить пост может только автор.'''
+        post = self.posts[0]
+        url = reverse('api:post_detail', args=[post.pk])
+        body = json.dumps({'text': 'Исправлено'})
+        response = self.guest_client.patch(
+            url, body, content_type='application/json', **self.reader_auth
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.guest_client.patch(
+            url, body, content_type='application/json', **self.author_auth
+        )
+        self.assertEqual(response.json()['text'], 'Исправлено')
+        post.refresh_from_db()
+        self.assertEqual(post.group, self.group)
+        response = self.guest_client.delete(url, **self.author_auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 404)
+        response = self.guest_client.put(url, **self.author_auth)
+        self.assertEqual(response.status_code, 405)
+
+    def test_comments(self):
+        '''Комментарии читаются по порядку и добавляются.'''
+        post = self.posts[0]
+        url = reverse('api:post_comments', args=[post.pk])
+        response = self.guest_client.post(
+            url, {'text': 'Комментарий'}, **self.reader_auth
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Comment.objects.filter(
+            post=post, author=self.reader, text='Комментарий'
+        ).exists())
+        results = self.guest_client.get(url).json()['results']
+        self.assertEqual(results[0]['author'], 'reader')
+
+    def test_follow(self):
+        '''Подписка, лента подписок и отписка.'''
+        response = self.guest_client.post(
+            reverse('api:follows'), {'author': 'author'},
+            **self.reader_auth
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.user).exists()
+        )
+        response = self.guest_client.get(
+            reverse('api:follow_posts'), **self.reader_auth
+        )
+        self.assertEqual(len(response.json()['results']), 10)
+        response = self.guest_client.get(
+            reverse('api:follows'), **self.reader_auth
+        )
+        self.assertEqual(response.json()['results'][0]['username'], 'author')
+        url = reverse('api:unfollow', args=[self.user.pk])
+        response = self.guest_client.delete(url, **self.reader_auth)
+        self.assertEqual(response.status_code, 204)
+        response = self.guest_client.delete(url, **self.reader_auth)
+        self.assertEqual(response.status_code, 404)
+        response = self.guest_client.get(reverse('api:follow_posts'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_session_csrf(self):
+        '''Запросы из браузера с сессией проверяются на CSRF.'''
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = reverse('api:posts')
+        self.assertEqual(client.get(url).status_code, 200)
+        response = client.post(url, {'text': 'Текст'})
+        self.assertEqual(response.status_code, 403)
+        client.get(reverse('posts:post_create'))
+        token = client.cookies['csrftoken'].value
+        response = client.post(
+            url, {'text': 'Текст'}, HTTP_X_CSRFTOKEN=token
+        )
+        self.assertEqual(response.status_code, 201)
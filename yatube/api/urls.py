@@ -0,0 +1,33 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('groups/', views.groups, name='groups'),
+    path(
+        'groups/<int:group_id>/posts/',
+        views.group_posts,
+        name='group_posts'
+    ),
+    path(
+        'users/<int:user_id>/posts/',
+        views.user_posts,
+        name='user_posts'
+    ),
+    path('follow/', views.follow_posts, name='follow_posts'),
+    path('follows/', views.follows, name='follows'),
+    path(
+        'follows/<int:author_id>/',
+        views.unfollow,
+        name='unfollow'
+    ),
+]
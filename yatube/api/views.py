@@ -0,0 +1,317 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+
+from posts import feeds, versions
+from posts.feeds import follow_feed
+from posts.forms import CommentForm, PostForm
+from posts.models import Follow, Group, Post
+from posts.paginators import CursorPaginator
+
+from .auth import authenticate_request
+from .serializers import (AUTHOR_FIELDS, COMMENT_FIELDS, GROUP_FIELDS,
+                          POST_FIELDS, author_data, comment_data, group_data,
+                          post_data)
+
+User = get_user_model()
+
+MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+    def response(self):
+        response = JsonResponse(
+            {'error': str(self), **self.extra}, status=self.status
+        )
+        if self.status == 401:
+            response['WWW-Authenticate'] = 'Basic realm="api"'
+        return response
+
+
+def api_view(*methods):
+    """Обёртка представлений API: методы, вход и ошибки в JSON."""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = ApiError(
+                    'Метод не поддерживается', status=405
+                ).response()
+                response['Allow'] = ', '.join(methods)
+                return response
+            user, rejected = authenticate_request(request)
+            if rejected is not None and request.method != 'GET':
+                return ApiError('Ошибка CSRF', status=403).response()
+            request.api_user = user
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return error.response()
+            except Http404:
+                return ApiError('Не найдено', status=404).response()
+            except PermissionDenied:
+                return ApiError('Недостаточно прав', status=403).response()
+        return wrapper
+    return decorator
+
+
+def require_user(request):
+    if request.api_user is None:
+        raise ApiError('Нужна аутентификация', status=401)
+    return request.api_user
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError('Некорректный JSON')
+        if not isinstance(data, dict):
+            raise ApiError('Ожидается JSON-объект')
+        return data
+    if request.method == 'POST':
+        return request.POST
+    return QueryDict(request.body)
+
+
+def requested_fields(request, allowed):
+    """Поля из ``?fields=``; без параметра — все."""
+    fields = request.GET.get('fields')
+    if not fields:
+        return allowed
+    fields = tuple(field.strip() for field in fields.split(','))
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise ApiError(
+            'Неизвестные поля', unknown=sorted(unknown), allowed=allowed
+        )
+    return fields
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def page_response(request, queryset, serialize, allowed,
+                  ordering=('-pub_date', '-pk')):
+    fields = requested_fields(request, allowed)
+    paginator = CursorPaginator(queryset, page_size(request), ordering)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [
+            {field: data[field] for field in fields}
+            for data in map(serialize, page)
+        ],
+        'next_cursor': paginator.next_cursor,
+        'previous_cursor': paginator.previous_cursor,
+    })
+
+
+def form_errors(form):
+    return ApiError('Некорректные данные', errors=form.errors.get_json_data())
+
+
+# Условные запросы. ETag и Last-Modified считаются только по версиям
+# лент в кеше (posts.versions), поэтому неизменившаяся лента отвечает
+# 304 без запросов к её таблицам.
+
+def versioned(scopes):
+    """``condition`` по версиям, которые ``scopes`` строит из запроса."""
+    def stamps(request, *args, **kwargs):
+        if not hasattr(request, 'api_versions'):
+            request.api_versions = [
+                versions.get(scope, pk)
+                for scope, pk in scopes(request, *args, **kwargs)
+            ]
+        return request.api_versions
+
+    def etag(request, *args, **kwargs):
+        user = request.api_user
+        key = repr((
+            stamps(request, *args, **kwargs),
+            sorted(request.GET.items()),
+            user.pk if user else None,
+        ))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            max(stamps(request, *args, **kwargs)) / 1_000_000,
+            tz=timezone.utc
+        )
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _user_scopes(*scopes):
+    """Версии ``scopes`` и профиля вошедшего пользователя."""
+    def build(request):
+        user = request.api_user
+        return [*scopes, *([('profile', user.pk)] if user else [])]
+    return build
+
+
+@api_view('GET', 'POST')
+@versioned(lambda request: [('index', None)])
+def posts(request):
+    if request.method == 'GET':
+        return page_response(
+            request, Post.objects.feed(), post_data, POST_FIELDS
+        )
+    return create_post(request)
+
+
+def create_post(request):
+    form = PostForm(
+        request_data(request), files=request.FILES or None
+    )
+    if not form.is_valid():
+        raise form_errors(form)
+    post = form.save(commit=False)
+    post.author = require_user(request)
+    with transaction.atomic():
+        post.save()
+    response = JsonResponse(post_data(post), status=201)
+    response['Location'] = f'/api/v1/posts/{post.pk}/'
+    return response
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+@versioned(lambda request, post_id: [('post', post_id)])
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author'), pk=post_id
+    )
+    if request.method == 'GET':
+        fields = requested_fields(request, POST_FIELDS)
+        data = post_data(post)
+        return JsonResponse({field: data[field] for field in fields})
+    if post.author_id != require_user(request).pk:
+        raise PermissionDenied
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    return update_post(request, post)
+
+
+def update_post(request, post):
+    data = {'text': post.text, 'group': post.group_id}
+    data.update(request_data(request).items())
+    form = PostForm(data, files=request.FILES or None, instance=post)
+    if not form.is_valid():
+        raise form_errors(form)
+    with transaction.atomic():
+        post = form.save()
+    return JsonResponse(post_data(post))
+
+
+@api_view('GET', 'POST')
+@versioned(lambda request, post_id: [('post', post_id)])
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    if request.method == 'GET':
+        return page_response(
+            request, post.comments.select_related('author'),
+            comment_data, COMMENT_FIELDS, ordering=('created', 'pk')
+        )
+    user = require_user(request)
+    form = CommentForm(request_data(request))
+    if not form.is_valid():
+        raise form_errors(form)
+    with transaction.atomic():
+        comment = form.save(commit=False)
+        comment.author = user
+        comment.post = post
+        comment.save()
+    return JsonResponse(comment_data(comment), status=201)
+
+
+@api_view('GET')
+@versioned(lambda request: [('index', None)])
+def groups(request):
+    return page_response(
+        request, Group.objects.all(), group_data, GROUP_FIELDS,
+        ordering=('pk',)
+    )
+
+
+@api_view('GET')
+@versioned(lambda request, group_id: [('group', group_id)])
+def group_posts(request, group_id):
+    group = get_object_or_404(Group, pk=group_id)
+    return page_response(
+        request, group.posts.feed(), post_data, POST_FIELDS
+    )
+
+
+@api_view('GET')
+@versioned(lambda request, user_id: [('profile', user_id)])
+def user_posts(request, user_id):
+    author = get_object_or_404(User, pk=user_id)
+    return page_response(
+        request, author.posts.feed(), post_data, POST_FIELDS
+    )
+
+
+@api_view('GET')
+# Лента подписок меняется при любом новом посте (в том числе
+# «знаменитостей», которые не раскладываются по лентам) и при подписке
+# или отписке самого пользователя.
+@versioned(_user_scopes(('index', None)))
+def follow_posts(request):
+    user = require_user(request)
+    return page_response(
+        request, follow_feed(user).feed(), post_data, POST_FIELDS,
+        ordering=feeds.ORDERING
+    )
+
+
+@api_view('GET', 'POST')
+@versioned(_user_scopes())
+def follows(request):
+    user = require_user(request)
+    if request.method == 'GET':
+        return page_response(
+            request, User.objects.filter(following__user=user),
+            author_data, AUTHOR_FIELDS, ordering=('pk',)
+        )
+    username = request_data(request).get('author')
+    if not username:
+        raise ApiError('Не указан автор', errors={'author': 'required'})
+    author = get_object_or_404(User, username=username)
+    if author == user:
+        raise ApiError('Нельзя подписаться на себя')
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(user=user, author=author)
+    return JsonResponse(author_data(author), status=201 if created else 200)
+
+
+@api_view('DELETE')
+def unfollow(request, author_id):
+    user = require_user(request)
+    deleted, _ = Follow.objects.filter(
+        user=user, author_id=author_id
+    ).delete()
+    if not deleted:
+        raise Http404
+    return HttpResponse(status=204)
@@ -0,0 +1,212 @@
+"""Кеш на сервере с протоколом Redis (RESP).
+
+Клиент протокола встроен, отдельный пакет не нужен: поддерживается
+ровно тот набор команд, которым пользуется Django. ``LOCATION`` —
+адрес вида ``redis://127.0.0.1:6379/0``. Для локальной проверки
+годится заглушка ``core.cache_backends.resp_server``.
+"""
+import pickle
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class RESPError(Exception):
+    pass
+
+
+class Connection:
+    def __init__(self, host, port, db, timeout):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        if db:
+            self.execute('SELECT', db)
+
+    @staticmethod
+    def encode(*args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Соединение с кешем закрыто')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise RESPError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            return self.reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self.read() for _ in range(length)]
+        raise RESPError(f'Неизвестный ответ: {line!r}')
+
+    def pipeline(self, commands):
+        self.sock.sendall(b''.join(self.encode(*cmd) for cmd in commands))
+        return [self.read() for _ in commands]
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class RedisCache(BaseCache):
+    def __init__(self, server, params):
+        super().__init__(params)
+        url = urlsplit(server)
+        self._address = (
+            url.hostname or '127.0.0.1',
+            url.port or 6379,
+            int(url.path.strip('/') or 0),
+            params.get('OPTIONS', {}).get('SOCKET_TIMEOUT', 1),
+        )
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = Connection(*self._address)
+            self._local.connection = connection
+        return connection
+
+    def _pipeline(self, commands):
+        try:
+            return self._connection().pipeline(commands)
+        except (OSError, ConnectionError):
+            # Сервер мог закрыть простаивающее соединение: одна повторная
+            # попытка на свежем соединении.
+            self._disconnect()
+            return self._connection().pipeline(commands)
+
+    def _execute(self, *args):
+        return self._pipeline([args])[0]
+
+    def _disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+        self._local.connection = None
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dumps(value):
+        # Целые числа хранятся как есть, чтобы работал INCRBY.
+        if type(value) is int:
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _loads(value):
+        if value is None:
+            return None
+        if value[:1] == b'\x80':
+            return pickle.loads(value)
+        return int(value)
+
+    def _set_command(self, key, value, timeout, *flags):
+        command = ['SET', key, self._dumps(value)]
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None:
+            command += ['PX', max(int(timeout * 1000), 1)]
+        return command + list(flags)
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        # Серверу нужен относительный срок жизни, а не момент истечения.
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
+
+    def get(self, key, default=None, version=None):
+        value = self._loads(self._execute('GET', self._key(key, version)))
+        return default if value is None else value
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        values = self._execute('MGET', *keys)
+        return {
+            original: self._loads(value)
+            for original, value in zip(keys.values(), values)
+            if value is not None
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if timeout is not None and timeout != DEFAULT_TIMEOUT \
+                and timeout <= 0:
+            self._execute('DEL', key)
+            return
+        self._execute(*self._set_command(key, value, timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        self._pipeline([
+            self._set_command(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ])
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._execute(
+            *self._set_command(key, value, timeout, 'NX')
+        ) is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            self._execute('PERSIST', key)
+            return bool(self._execute('EXISTS', key))
+        return bool(self._execute('PEXPIRE', key, int(timeout * 1000)))
+
+    def delete(self, key, version=None):
+        self._execute('DEL', self._key(key, version))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._execute('DEL', *keys)
+
+    def has_key(self, key, version=None):
+        return bool(self._execute('EXISTS', self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self._execute('EXISTS', key):
+            raise ValueError("Key '%s' not found" % key)
+        return self._execute('INCRBY', key, delta)
+
+    def clear(self):
+        self._execute('FLUSHDB')
+
+    def close(self, **kwargs):
+        pass
@@ -0,0 +1,147 @@
+"""Минимальный сервер с протоколом Redis для локальных проверок.
+
+Держит данные в памяти одного процесса и понимает только команды,
+которые использует ``core.cache_backends.resp.RedisCache``. Его
+запускают тесты и бенчмарки, а вручную — из каталога проекта::
+
+    python -m core.cache_backends.resp_server --port 6379
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+DATA = {}
+EXPIRES = {}
+LOCK = threading.Lock()
+
+
+def _alive(key):
+    expires = EXPIRES.get(key)
+    if expires is not None and expires <= time.monotonic():
+        DATA.pop(key, None)
+        EXPIRES.pop(key, None)
+    return key in DATA
+
+
+def _set(key, value, args):
+    args = [arg.upper() for arg in args]
+    expires = None
+    if b'PX' in args:
+        expires = int(args[args.index(b'PX') + 1]) / 1000
+    elif b'EX' in args:
+        expires = int(args[args.index(b'EX') + 1])
+    if b'NX' in args and _alive(key):
+        return None
+    DATA[key] = value
+    EXPIRES.pop(key, None)
+    if expires is not None:
+        EXPIRES[key] = time.monotonic() + expires
+    return b'OK'
+
+
+def _delete(*keys):
+    deleted = 0
+    for key in keys:
+        if _alive(key):
+            del DATA[key]
+            EXPIRES.pop(key, None)
+            deleted += 1
+    return deleted
+
+
+def _incrby(key, delta):
+    value = (int(DATA[key]) if _alive(key) else 0) + int(delta)
+    DATA[key] = str(value).encode()
+    return value
+
+
+def _pexpire(key, milliseconds):
+    if not _alive(key):
+        return 0
+    EXPIRES[key] = time.monotonic() + int(milliseconds) / 1000
+    return 1
+
+
+def _flushdb():
+    DATA.clear()
+    EXPIRES.clear()
+    return b'OK'
+
+
+COMMANDS = {
+    b'PING': lambda: b'PONG',
+    b'SELECT': lambda db: b'OK',
+    b'GET': lambda key: DATA[key] if _alive(key) else None,
+    b'MGET': lambda *keys: [DATA[k] if _alive(k) else None for k in keys],
+    b'SET': lambda key, value, *args: _set(key, value, args),
+    b'DEL': _delete,
+    b'EXISTS': lambda *keys: sum(_alive(key) for key in keys),
+    b'INCRBY': _incrby,
+    b'PEXPIRE': _pexpire,
+    b'PERSIST': lambda key: int(EXPIRES.pop(key, None) is not None),
+    b'FLUSHDB': _flushdb,
+}
+
+
+def execute(command, args):
+    if command not in COMMANDS:
+        raise ValueError(f'unknown command {command!r}')
+    with LOCK:
+        return COMMANDS[command](*args)
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(map(encode, value))
+    if value in (b'OK', b'PONG'):
+        return b'+%s\r\n' % value
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if not args:
+                return
+            try:
+                reply = encode(execute(args[0].upper(), args[1:]))
+            except Exception as error:
+                reply = b'-ERR %s\r\n' % str(error).encode()
+            self.wfile.write(reply)
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(host='127.0.0.1', port=6379):
+    """Запустить сервер в фоновом потоке; ``port=0`` — свободный порт."""
+    server = Server((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    options = parser.parse_args()
+    Server((options.host, options.port), Handler).serve_forever()
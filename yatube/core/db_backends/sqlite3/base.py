@@ -0,0 +1,29 @@
+"""SQLite под конкурентную запись.
+
+Прагмы из ``PRAGMAS`` настроек базы выполняются на каждом новом
+соединении (``core.databases.tuned_sqlite`` задаёт WAL, mmap,
+``synchronous=NORMAL`` и ``busy_timeout``).
+
+Транзакции ``transaction.atomic`` начинаются с ``BEGIN IMMEDIATE``.
+Обычный ``BEGIN`` берёт блокировку записи только на первом изменении, и
+если другое соединение успело записать после чтения в транзакции,
+SQLite сразу возвращает «database is locked», не дожидаясь
+``busy_timeout``: снимок транзакции уже устарел. ``BEGIN IMMEDIATE``
+ждёт блокировку в начале транзакции, пока в ней ещё ничего не прочитано.
+
+Поэтому любой ``atomic`` держит блокировку записи всей базы до конца
+блока: в него оборачивается только само сохранение, а проверка формы,
+обработка загрузки и отрисовка шаблона идут вне транзакции.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет реплики SQLite копией основной базы — для запуска '
+        'реплик локально, без репликации СУБД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, обновляя реплики по расписанию.'
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Основная база, копия которой расходится по репликам.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Пауза между копированиями, секунд: отставание реплик.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: YATUBE_DB_REPLICAS')
+        # По vendor, а не ENGINE: профиль SQLite (core.db_backends)
+        # меняет бэкенд основной базы.
+        primary = connections[options['database']]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копировать можно только основную базу SQLite')
+        for alias in settings.DATABASE_REPLICAS:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(
+                    f'{alias} не SQLite: её наполняет репликация СУБД'
+                )
+        while True:
+            started = time.monotonic()
+            primary.ensure_connection()
+            for alias in settings.DATABASE_REPLICAS:
+                stamp = replicas.copy_sqlite(
+                    primary.connection, settings.DATABASES[alias]['NAME']
+                )
+                replicas.mark_synced(alias, stamp)
+                self.stdout.write(f'Реплика {alias} обновлена')
+            primary.close()
+            if not options['loop']:
+                return
+            time.sleep(max(0, options['interval'] - (
+                time.monotonic() - started
+            )))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, опрашивая очередь.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help='Пауза между опросами пустой очереди, секунд.'
+        )
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Потоков для задач; для процессов запустите несколько '
+                 'команд.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            done = tasks.run_pending(options['limit'], options['workers'])
+            if done:
+                self.stdout.write(f'Выполнено задач: {done}')
+            if not options['loop']:
+                return
+            if not done:
+                time.sleep(options['interval'])
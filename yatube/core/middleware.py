@@ -0,0 +1,180 @@
+"""Замер запросов к базе, шаблонов и кеша для каждого запроса к сайту.
+
+``ProfilingMiddleware`` считает для представлений из
+``settings.PROFILING_VIEWS`` число и время SQL-запросов, время
+рендеринга шаблонов, попадания и промахи кеша. Итог уходит в
+заголовок ``Server-Timing`` (его показывает вкладка Network браузера)
+персоналу и с ``DEBUG``, а всем — только с ``PROFILING_SERVER_TIMING``:
+число запросов и тайминги подсказывают, какие страницы дороги для
+сервера. Часть запросов (``PROFILING_SAMPLE_RATE``) пишется в лог
+``yatube.profiling``, а превышение бюджетов ``PROFILING_BUDGETS`` —
+всегда, уровнем WARNING. Всё работает и с ``DEBUG = False``: запросы
+считает ``connection.execute_wrapper``, а не ``connection.queries``.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('yatube.profiling')
+
+_local = threading.local()
+_installed = False
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка ``connection.execute_wrapper``."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - started
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'ms': round(self.total_time * 1000, 1),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hit {self.cache_misses} miss"',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def current():
+    """Счётчики текущего запроса или ``None``, если он не замеряется."""
+    return getattr(_local, 'stats', None)
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        stats = current()
+        if stats is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats.template_time += time.perf_counter() - started
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, default, version)
+        stats = current()
+        if stats is not None:
+            if value is default:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def install():
+    """Обернуть рендеринг шаблонов и ``get`` бэкендов кеша (один раз)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    Template.render = _timed_render(Template.render)
+    for backend in {type(caches[alias]) for alias in settings.CACHES}:
+        backend.get = _counted_get(backend.get)
+
+
+def over_budget(stats):
+    budget = {
+        **settings.PROFILING_BUDGETS['*'],
+        **settings.PROFILING_BUDGETS.get(stats.view, {}),
+    }
+    exceeded = []
+    if stats.queries > budget['queries']:
+        exceeded.append(f'queries {stats.queries} > {budget["queries"]}')
+    if stats.total_time * 1000 > budget['ms']:
+        exceeded.append(
+            f'ms {stats.total_time * 1000:.0f} > {budget["ms"]}'
+        )
+    return exceeded
+
+
+def show_server_timing(request):
+    if settings.PROFILING_SERVER_TIMING or settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        if stats.view is not None:
+            self.report(request, response, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = f'{view_func.__module__}.{view_func.__name__}'
+        if view.startswith(tuple(settings.PROFILING_VIEWS)):
+            current().view = view
+
+    def report(self, request, response, stats):
+        if show_server_timing(request):
+            response['Server-Timing'] = stats.server_timing()
+        exceeded = over_budget(stats)
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        if not (exceeded or sampled):
+            return
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **stats.as_dict(),
+        }
+        if exceeded:
+            record['over_budget'] = exceeded
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
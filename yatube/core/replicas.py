@@ -0,0 +1,165 @@
+"""Чтение с реплик базы для нагруженных страниц.
+
+Реплики — алиасы ``settings.DATABASE_REPLICAS`` (их задаёт переменная
+окружения ``YATUBE_DB_REPLICAS``). ``ReplicaMiddleware`` отправляет на
+случайную реплику чтения GET-запросов к представлениям из
+``settings.REPLICA_VIEWS``; всё остальное и любая запись идут в
+``default`` (``ReplicaRouter``).
+
+Реплика отстаёт от основной базы, поэтому:
+
+* запись в запросе переключает его оставшиеся чтения на основную базу
+  и ставит cookie ``settings.REPLICA_PIN_COOKIE`` на
+  ``REPLICA_PIN_SECONDS``: автор поста, комментария или подписки
+  сразу видит свои изменения;
+* ``manage.py copy_replicas`` запоминает в кеше, по какой момент
+  реплика содержит данные, и ``require_fresh(version)`` уводит запрос на
+  основную базу, если версия ленты (``posts.versions``, время изменения)
+  новее: фрагмент, закешированный под новой версией, не соберётся из
+  старых данных.
+
+Отметка, как и версии, должна быть в общем кеше (``YATUBE_CACHE``), а
+не в locmem процесса. Реплики PostgreSQL наполняет репликация СУБД;
+для них отметки нет, и они считаются свежими.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+SYNCED_KEY = 'replica:synced:{alias}'
+# Сессия и пользователь нужны сразу после входа и регистрации, когда
+# реплика о них ещё может не знать.
+PRIMARY_APPS = ('auth', 'sessions')
+# Запас на транзакции, сдвинувшие версию, но не закоммиченные к началу
+# копирования.
+SYNC_MARGIN = 1_000_000
+
+_local = threading.local()
+
+
+def _now():
+    # Те же единицы, что у версий posts.versions: микросекунды.
+    return int(time.time() * 1_000_000)
+
+
+def current():
+    """Алиас реплики, с которой читает текущий запрос, или ``None``."""
+    return getattr(_local, 'alias', None)
+
+
+def use_replica():
+    if settings.DATABASE_REPLICAS:
+        _local.alias = random.choice(settings.DATABASE_REPLICAS)
+
+
+def use_primary():
+    _local.alias = None
+
+
+def wrote():
+    return getattr(_local, 'wrote', False)
+
+
+def reset():
+    _local.alias = None
+    _local.wrote = False
+
+
+def synced(alias):
+    return cache.get(SYNCED_KEY.format(alias=alias))
+
+
+def mark_synced(alias, stamp):
+    cache.set(SYNCED_KEY.format(alias=alias), stamp, None)
+
+
+def require_fresh(version):
+    """Читать с основной базы, если реплика старше ``version``."""
+    alias = current()
+    if alias is None:
+        return
+    stamp = synced(alias)
+    if stamp is not None and stamp < version:
+        use_primary()
+
+
+def copy_sqlite(source, path):
+    """Скопировать открытую базу SQLite ``source`` в файл ``path``.
+
+    Копия собирается рядом и подменяет файл целиком: открытые
+    соединения дочитывают старую копию, новые открывают новую.
+    Возвращает отметку, по какой момент копия содержит данные.
+    """
+    stamp = _now() - SYNC_MARGIN
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix=f'.{name}.')
+    os.close(fd)
+    try:
+        target = sqlite3.connect(temporary)
+        try:
+            source.backup(target)
+            # Копия основной базы в WAL тоже была бы в WAL, и новая копия
+            # встретила бы -wal и -shm файлы старой.
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return stamp
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return current() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # После записи в запросе реплика может не знать о ней.
+        _local.wrote = True
+        use_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы: данные одни и те же.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset()
+        try:
+            response = self.get_response(request)
+            if wrote() and settings.DATABASE_REPLICAS:
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True, samesite='Lax'
+                )
+            return response
+        finally:
+            reset()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = f'{view_func.__module__}.{view_func.__name__}'
+        if (
+            view in settings.REPLICA_VIEWS
+            and request.method in ('GET', 'HEAD')
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        ):
+            use_replica()
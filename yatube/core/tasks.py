@@ -0,0 +1,157 @@
+"""Очередь фоновых задач в таблице базы данных.
+
+Функция становится задачей декоратором ``@task``; ``defer(func, *args)``
+записывает её вызов в таблицу ``Task`` в той же транзакции, что и
+изменение, которое её породило: откат запроса откатывает и задачу,
+а закоммиченная задача не потеряется при падении процесса. Аргументы
+хранятся в JSON, поэтому передаются id, а не объекты.
+
+Задачи выполняет ``manage.py run_tasks`` (можно запускать несколько:
+задача забирается атомарным UPDATE) и, если задано
+``settings.TASK_WORKERS``, пул потоков процесса сразу после коммита.
+Упавшая задача повторяется с растущей паузой до ``MAX_ATTEMPTS`` раз.
+Задача выполняется в транзакции; ``@task(atomic=False)`` — без неё,
+для долгой работы вне базы (миниатюры картинок), которая иначе держала
+бы блокировку записи SQLite.
+
+С ``settings.TASKS_EAGER`` задача выполняется сразу при вызове
+``defer``, как раньше выполнялась вся работа внутри запроса. Задача
+``@task(eager=False)`` и тогда записывается в очередь: ей не место в
+транзакции запроса. Её выполняют потоки ``TASK_WORKERS``, а если их
+нет — тот же процесс сразу после коммита, так что без воркера она не
+застрянет.
+"""
+import json
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# Пауза перед повтором: RETRY_DELAY * 2 ** (попытка - 1).
+RETRY_DELAY = timedelta(seconds=10)
+# Задача «в работе» дольше этого срока считается брошенной упавшим
+# воркером и возвращается в очередь.
+STALE_AFTER = timedelta(minutes=10)
+
+REGISTRY = {}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TASK_WORKERS,
+            thread_name_prefix='tasks'
+        )
+    return _executor
+
+
+def task(func=None, *, atomic=True, eager=True):
+    """Зарегистрировать функцию как задачу под её полным именем."""
+    if func is None:
+        return lambda func: task(func, atomic=atomic, eager=eager)
+    func.task_name = f'{func.__module__}.{func.__name__}'
+    func.task_atomic = atomic
+    func.task_eager = eager
+    REGISTRY[func.task_name] = func
+    return func
+
+
+def defer(func, *args):
+    """Выполнить задачу ``func(*args)`` в фоне после коммита."""
+    if func.task_name not in REGISTRY:
+        raise ValueError(f'{func.task_name} не зарегистрирована как задача')
+    payload = json.dumps(args)
+    if settings.TASKS_EAGER and func.task_eager:
+        # Тот же путь через JSON, что и в очереди: несериализуемый
+        # аргумент обнаружится и в тестах.
+        return func(*json.loads(payload))
+    job = Task.objects.create(name=func.task_name, args=payload)
+    if settings.TASK_WORKERS:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_run_in_thread, job.pk)
+        )
+    elif settings.TASKS_EAGER:
+        # Упавшая задача остаётся в очереди на повтор, запрос не падает.
+        transaction.on_commit(lambda: run(job.pk))
+    return job
+
+
+def _run_in_thread(task_id):
+    close_old_connections()
+    try:
+        return run(task_id)
+    finally:
+        close_old_connections()
+
+
+def _claim(task_id):
+    """Забрать задачу в работу, если её ещё никто не взял."""
+    return Task.objects.filter(
+        pk=task_id, status=Task.PENDING, run_at__lte=timezone.now()
+    ).update(
+        status=Task.RUNNING,
+        attempts=F('attempts') + 1,
+        updated=timezone.now()
+    )
+
+
+def run(task_id):
+    """Выполнить задачу; вернуть ``True``, если она выполнена."""
+    if not _claim(task_id):
+        return False
+    job = Task.objects.get(pk=task_id)
+    func = REGISTRY[job.name]
+    try:
+        # Упавшая задача не оставляет половину изменений.
+        with transaction.atomic() if func.task_atomic else nullcontext():
+            func(*json.loads(job.args))
+    except Exception:
+        logger.exception('Задача %s (%s) упала', job.pk, job.name)
+        job.error = traceback.format_exc()
+        if job.attempts < MAX_ATTEMPTS:
+            job.status = Task.PENDING
+            job.run_at = timezone.now() + RETRY_DELAY * 2 ** (
+                job.attempts - 1
+            )
+        else:
+            job.status = Task.FAILED
+        job.save(update_fields=['status', 'run_at', 'error', 'updated'])
+        return False
+    job.delete()
+    return True
+
+
+def requeue_stale():
+    return Task.objects.filter(
+        status=Task.RUNNING,
+        updated__lt=timezone.now() - STALE_AFTER
+    ).update(status=Task.PENDING)
+
+
+def run_pending(limit=None, workers=1):
+    """Выполнить готовые задачи из очереди; вернуть число выполненных."""
+    requeue_stale()
+    tasks = Task.objects.filter(
+        status=Task.PENDING, run_at__lte=timezone.now()
+    ).order_by('run_at', 'pk').values_list('pk', flat=True)
+    if limit:
+        tasks = tasks[:limit]
+    tasks = list(tasks)
+    if workers <= 1:
+        return sum(map(run, tasks))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(_run_in_thread, tasks))
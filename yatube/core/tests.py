@@ -0,0 +1,548 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import (
+    DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+)
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+
+from . import replicas
+from .asgi import ASGIHandler, get_asgi_application
+from .cache_backends import resp_server
+from .cache_backends.resp import RedisCache
+from .cache_backends.sqlite import CULL_EVERY, SQLiteCache
+from .databases import tuned_sqlite
+from .models import Task
+from .tasks import (
+    MAX_ATTEMPTS, STALE_AFTER, _claim, defer, requeue_stale, run_pending,
+    task
+)
+
+CALLS = []
+
+
+@task
+def record(value):
+    CALLS.append(value)
+
+
+@task
+def fail():
+    raise ValueError('задача упала')
+
+
+@task
+def depth():
+    CALLS.append(len(connections[DEFAULT_DB_ALIAS].savepoint_ids))
+
+
+@task(atomic=False)
+def depth_outside():
+    CALLS.append(len(connections[DEFAULT_DB_ALIAS].savepoint_ids))
+
+
+@task(eager=False)
+def queued(value):
+    CALLS.append(value)
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'), {}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 2))
+
+    def test_many_and_incr(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+        self.assertEqual(self.cache.incr('a', 10), 11)
+        with self.assertRaises(ValueError):
+            self.cache.incr('c')
+
+    def test_shared_between_instances(self):
+        other = SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'), {}
+        )
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+
+    def test_cull_keeps_persistent(self):
+        ''' При вытеснении бессрочные записи остаются.'''
+        cache = SQLiteCache(
+            os.path.join(self.directory, 'cull.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 50, 'CULL_FREQUENCY': 2}}
+        )
+        cache.set('version', 1, timeout=None)
+        for number in range(CULL_EVERY):
+            cache.set(f'fragment{number}', number, timeout=3600)
+        self.assertEqual(cache.get('version'), 1)
+        self.assertIsNone(cache.get('fragment0'))
+
+
+class RedisCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = resp_server.serve(port=0)
+        host, port = cls.server.server_address
+        cls.location = f'redis://{host}:{port}/0'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = RedisCache(self.location, {})
+        self.cache.clear()
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.cache.set('expired', 1, timeout=0)
+        self.assertIsNone(self.cache.get('expired'))
+        self.cache.set('short', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertEqual(self.cache.get('short'), 2)
+
+    def test_many_and_incr(self):
+        self.cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'два'}
+        )
+        self.assertEqual(self.cache.incr('a', 10), 11)
+        self.assertEqual(self.cache.get('a'), 11)
+        with self.assertRaises(ValueError):
+            self.cache.incr('c')
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_touch(self):
+        self.cache.set('key', 1, timeout=0.01)
+        self.assertTrue(self.cache.touch('key', None))
+        time.sleep(0.02)
+        self.assertEqual(self.cache.get('key'), 1)
+        self.assertFalse(self.cache.touch('missing'))
+
+    def test_reconnect(self):
+        ''' Закрытое сервером соединение открывается заново.'''
+        self.cache.set('key', 1)
+        self.cache._connection().sock.close()
+        self.assertEqual(self.cache.get('key'), 1)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.guest_user = Client()
+        cache.clear()
+
+    def server_timing(self, response):
+        return dict(
+            metric.strip().split(';', 1)
+            for metric in response['Server-Timing'].split(',')
+        )
+
+    @override_settings(PROFILING_SERVER_TIMING=True)
+    def test_server_timing(self):
+        ''' Страницы posts.views отдают заголовок Server-Timing,
+            остальные — нет.
+        '''
+        response = self.guest_user.get(reverse('posts:index'))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'sql', 'tpl', 'cache', 'total'})
+        self.assertIn('queries', timing['sql'])
+        self.assertIn('miss', timing['cache'])
+        response = self.guest_user.get(reverse('posts:index'))
+        self.assertIn('0 miss', self.server_timing(response)['cache'])
+        response = self.guest_user.get(reverse('about:author'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_SERVER_TIMING=False)
+    def test_server_timing_staff_only(self):
+        ''' Без PROFILING_SERVER_TIMING заголовок видит только персонал.
+        '''
+        url = reverse('posts:index')
+        self.assertFalse(
+            self.guest_user.get(url).has_header('Server-Timing')
+        )
+        staff = Client()
+        staff.force_login(get_user_model().objects.create_user(
+            username='staff', is_staff=True
+        ))
+        self.assertTrue(staff.get(url).has_header('Server-Timing'))
+        with self.settings(DEBUG=True):
+            self.assertTrue(
+                self.guest_user.get(url).has_header('Server-Timing')
+            )
+
+    @override_settings(PROFILING_BUDGETS={'*': {'queries': 0, 'ms': 10000}})
+    def test_over_budget_logged(self):
+        ''' Превышение бюджета пишется в лог всегда.'''
+        with self.assertLogs('yatube.profiling', 'WARNING') as logs:
+            self.guest_user.get(reverse('posts:index'))
+        self.assertIn('"view": "posts.views.index"', logs.output[0])
+        self.assertIn('over_budget', logs.output[0])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests_logged(self):
+        ''' Выборка запросов пишется в лог уровнем INFO.'''
+        with self.assertLogs('yatube.profiling', 'INFO') as logs:
+            self.guest_user.get(reverse('posts:index'))
+        self.assertIn('INFO', logs.output[0])
+        self.assertIn('"queries"', logs.output[0])
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    def request(self, application, scope, body=b''):
+        messages = [
+            {'type': 'http.request', 'body': body[:3], 'more_body': True},
+            {'type': 'http.request', 'body': body[3:]},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(application({'type': 'http', **scope}, receive, send))
+        return sent
+
+    def test_environ(self):
+        ''' Запрос ASGI превращается в окружение WSGI.'''
+        environs = []
+
+        def wsgi_application(environ, start_response):
+            environs.append({**environ, 'body': environ['wsgi.input'].read()})
+            start_response('201 Created', [('X-Test', 'yes')])
+            return [b'first', b'', b'second']
+
+        sent = self.request(ASGIHandler(wsgi_application, 1), {
+            'method': 'POST',
+            'path': '/group/тест/',
+            'query_string': b'q=1',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'cookie', b'a=1'),
+                (b'cookie', b'b=2'),
+            ],
+        }, body=b'request body')
+        environ = environs[0]
+        self.assertEqual(environ['REQUEST_METHOD'], 'POST')
+        self.assertEqual(
+            environ['PATH_INFO'].encode('latin-1').decode(), '/group/тест/'
+        )
+        self.assertEqual(environ['QUERY_STRING'], 'q=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['body'], b'request body')
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertIn((b'x-test', b'yes'), sent[0]['headers'])
+        self.assertEqual(
+            [message['body'] for message in sent[1:]], [b'first', b'second']
+        )
+        self.assertFalse(sent[-1]['more_body'])
+
+    def test_disconnect(self):
+        ''' Если клиент ушёл, не дослав тело, представление не вызывается.
+        '''
+        def wsgi_application(environ, start_response):
+            raise AssertionError
+
+        sent = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(ASGIHandler(wsgi_application, 1)(
+            {'type': 'http', 'method': 'POST', 'path': '/'}, receive, send
+        ))
+        self.assertEqual(sent, [])
+
+    def test_django_page(self):
+        ''' Страница сайта через ASGI совпадает со страницей через WSGI.
+        '''
+        url = reverse('about:author')
+        sent = self.request(
+            get_asgi_application(), {'method': 'GET', 'path': url}
+        )
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message['body'] for message in sent[1:])
+        self.assertEqual(body, Client().get(url).content)
+
+
+@override_settings(TASKS_EAGER=False, TASK_WORKERS=0)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_deferred(self):
+        ''' Задача ждёт в таблице, пока её не выполнит воркер.'''
+        defer(record, {'post': 1})
+        self.assertEqual(CALLS, [])
+        self.assertEqual(Task.objects.get().name, 'core.tests.record')
+        call_command('run_tasks', stdout=StringIO())
+        self.assertEqual(CALLS, [{'post': 1}])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager(self):
+        ''' В режиме TASKS_EAGER задача выполняется сразу.'''
+        defer(record, 2)
+        self.assertEqual(CALLS, [2])
+        self.assertFalse(Task.objects.exists())
+        with self.assertRaises(TypeError):
+            defer(record, object())
+
+    def test_retry(self):
+        ''' Упавшая задача повторяется позже, а после MAX_ATTEMPTS
+            попыток остаётся с ошибкой.
+        '''
+        defer(fail)
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(run_pending(), 0)
+        job = Task.objects.get()
+        self.assertEqual(job.status, Task.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('задача упала', job.error)
+        self.assertEqual(run_pending(), 0)
+        Task.objects.update(
+            run_at=timezone.now(), attempts=MAX_ATTEMPTS - 1
+        )
+        with self.assertLogs('core.tasks', 'ERROR'):
+            run_pending()
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_not_eager(self):
+        ''' Задача с eager=False ждёт в очереди и при TASKS_EAGER.'''
+        defer(queued, 4)
+        self.assertEqual(CALLS, [])
+        run_pending()
+        self.assertEqual(CALLS, [4])
+
+    def test_claimed_not_stale(self):
+        ''' Взятая в работу задача не возвращается в очередь сразу.'''
+        job = defer(record, 3)
+        Task.objects.update(updated=timezone.now() - 2 * STALE_AFTER)
+        _claim(job.pk)
+        self.assertEqual(requeue_stale(), 0)
+        self.assertEqual(Task.objects.get().status, Task.RUNNING)
+
+    def test_not_atomic(self):
+        ''' Задача с atomic=False выполняется без своей транзакции.'''
+        defer(depth)
+        defer(depth_outside)
+        run_pending()
+        inside, outside = CALLS
+        self.assertEqual(inside, outside + 1)
+
+
+@override_settings(TASKS_EAGER=True, TASK_WORKERS=0)
+class TaskAfterCommitTests(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_not_eager_without_workers(self):
+        ''' Без потоков и воркера задача с eager=False выполняется
+            после коммита, а не остаётся в очереди навсегда.
+        '''
+        with transaction.atomic():
+            defer(queued, 5)
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, [5])
+        self.assertFalse(Task.objects.exists())
+
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaTests(TransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user(username='author')
+        Post.objects.create(author=self.author, text='Есть на реплике')
+
+    def copy(self, stamp=None):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        connections[REPLICA].close()
+        copied = replicas.copy_sqlite(
+            primary.connection, connections.databases[REPLICA]['NAME']
+        )
+        replicas.mark_synced(REPLICA, stamp or copied)
+
+    def test_read_from_replica_until_write(self):
+        ''' Ленты читаются с реплики, а после записи — с основной базы.
+        '''
+        # Реплика «свежее» всех версий; пост ниже не сдвигает версии.
+        self.copy(stamp=replicas._now() + 10 ** 12)
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Только в основной базе')
+        ])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Есть на реплике')
+        self.assertNotContains(response, 'Только в основной базе')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        self.client.force_login(self.author)
+        post = Post.objects.get(text='Есть на реплике')
+        response = self.client.post(
+            reverse('posts:add_comment', args=[post.pk]),
+            {'text': 'Комментарий'}
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        cache.clear()
+        replicas.mark_synced(REPLICA, replicas._now() + 10 ** 12)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Только в основной базе')
+
+    def test_stale_replica(self):
+        ''' Если лента изменилась после копирования, она читается
+            с основной базы, а не кешируется из старых данных.
+        '''
+        self.copy()
+        Post.objects.create(author=self.author, text='Новее реплики')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новее реплики')
+
+
+class TunedSQLiteTests(SimpleTestCase):
+    databases = {'tuned', 'tuned_other', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        config = tuned_sqlite({
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'tuned.sqlite3'),
+        }, conn_max_age=60, busy_timeout=50, mmap_size=2 ** 20)
+        for alias in ('tuned', 'tuned_other'):
+            connections.databases[alias] = dict(config)
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in cls.databases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def pragma(self, name):
+        with connections['tuned'].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        ''' Прагмы профиля выполняются на новом соединении.
+        '''
+        settings_dict = connections['tuned'].settings_dict
+        self.assertEqual(settings_dict['CONN_MAX_AGE'], 60)
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 50)
+        self.assertEqual(self.pragma('mmap_size'), 2 ** 20)
+
+    def test_atomic_takes_write_lock(self):
+        ''' Транзакция сразу берёт блокировку записи: другое соединение
+            ждёт busy_timeout и получает отказ.
+        '''
+        other = connections['tuned_other'].cursor()
+        with transaction.atomic(using='tuned'):
+            connections['tuned'].cursor().execute('SELECT 1')
+            with self.assertRaisesMessage(
+                OperationalError, 'database is locked'
+            ):
+                other.execute('CREATE TABLE t (id INTEGER)')
+        other.execute('CREATE TABLE t (id INTEGER)')
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_copy_replicas(self):
+        ''' Основная база с профилем копируется в реплики
+            без WAL-файлов.
+        '''
+        cache.clear()
+        connections['tuned'].cursor().execute(
+            'CREATE TABLE copied (id INTEGER)'
+        )
+        call_command('copy_replicas', database='tuned', stdout=StringIO())
+        self.assertIsNotNone(replicas.synced(REPLICA))
+        with connections[REPLICA].cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM copied')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'delete')
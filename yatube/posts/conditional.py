@@ -0,0 +1,65 @@
+"""Условные ответы для страниц лент и поста.
+
+Валидаторы страницы считаются по её версии из ``posts.versions``, а не
+по выборке постов: версия уже лежит в кеше и сдвигается при любом
+изменении того, что видно на странице. Поэтому повторный запрос
+с актуальным ``If-None-Match`` или ``If-Modified-Since`` получает 304
+до пагинации и рендеринга.
+
+Страница вошедшего пользователя отличается (шапка, форма комментария,
+кнопка подписки, CSRF-токен), поэтому его ETag включает пользователя
+и CSRF-cookie, а ответ помечен ``private``. Страницы гостей можно
+хранить и в общем кеше (``public``); ``Vary: Cookie`` не даёт отдать
+гостевую страницу вошедшему и наоборот.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+def validators(request, version):
+    """``(etag, last_modified)`` страницы с версией ``version``."""
+    user = request.user
+    key = repr((
+        version,
+        request.get_full_path(),
+        user.pk,
+        request.META.get('CSRF_COOKIE'),
+    ))
+    etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+    # Дата не знает о пользователе: после входа браузер прислал бы
+    # дату гостевой страницы. Вошедшим хватает ETag.
+    if user.is_authenticated:
+        return etag, None
+    return etag, version // 1_000_000
+
+
+def not_modified(request, version):
+    """Ответ 304, если у клиента страница этой версии, иначе ``None``."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    etag, last_modified = validators(request, version)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is not None:
+        add_headers(request, response, version)
+    return response
+
+
+def add_headers(request, response, version):
+    etag, last_modified = validators(request, version)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE
+        )
+    patch_vary_headers(response, ('Cookie',))
+    return response
@@ -0,0 +1,96 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными ``UPDATE ... SET n = n + 1`` из сигналов
+моделей, поэтому одинаково работают и во views, и в админке. Всё, что
+обходит сигналы (``bulk_create``, ``QuerySet.update``), исправляется
+командой ``manage.py recount``.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+STATS_BATCH_SIZE = 1000
+
+
+def change(model, lookup, field, delta, **also):
+    """Сдвинуть счётчик ``field`` на ``delta``, не уходя ниже нуля.
+
+    ``also`` — поля, которые записываются тем же ``UPDATE``.
+    """
+    if not lookup or None in lookup.values():
+        return
+    queryset = model.objects.filter(**lookup)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta}, **also)
+
+
+def change_user(user_id, field, delta):
+    change(UserStats, {'user_id': user_id}, field, delta)
+
+
+def change_group(group_id, delta):
+    change(Group, {'pk': group_id}, 'posts_count', delta)
+
+
+def change_post(post_id, delta):
+    # Комментарии входят в оценки лент (posts.ranking).
+    change(Post, {'pk': post_id}, 'comments_count', delta, score_stale=True)
+
+
+def _count(model, field, outer='pk'):
+    rows = model.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+# (модель, счётчик, выражение для точного значения)
+COUNTERS = (
+    (Post, 'comments_count', lambda: _count(Comment, 'post')),
+    (Group, 'posts_count', lambda: _count(Post, 'group')),
+    (UserStats, 'posts_count', lambda: _count(Post, 'author', 'user')),
+    (UserStats, 'followers_count', lambda: _count(Follow, 'author', 'user')),
+    (UserStats, 'following_count', lambda: _count(Follow, 'user', 'user')),
+)
+
+
+def missing_stats():
+    return User.objects.filter(stats=None).values_list('pk', flat=True)
+
+
+def create_missing_stats():
+    missing = list(missing_stats())
+    # Пачками, а не через batch_size: явный batch_size Django 2.2 не
+    # ограничивает пределом СУБД, а без пачек на PostgreSQL все записи
+    # уходят одним INSERT.
+    for start in range(0, len(missing), STATS_BATCH_SIZE):
+        UserStats.objects.bulk_create([
+            UserStats(user_id=pk)
+            for pk in missing[start:start + STATS_BATCH_SIZE]
+        ])
+    return len(missing)
+
+
+def drift():
+    """Записи, у которых счётчик расходится с реальным значением.
+
+    Возвращает список ``(модель, pk, счётчик, хранимое, реальное)``.
+    """
+    result = []
+    for model, field, expected in COUNTERS:
+        rows = model.objects.annotate(
+            expected=expected()
+        ).exclude(**{field: F('expected')}).values_list(
+            'pk', field, 'expected'
+        )
+        for pk, stored, actual in rows.iterator():
+            result.append((model, pk, field, stored, actual))
+    return result
+
+
+def recount():
+    """Пересчитать все счётчики целиком."""
+    for model, field, expected in COUNTERS:
+        model.objects.update(**{field: expected()})
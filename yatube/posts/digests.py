@@ -0,0 +1,201 @@
+"""Сводки новых постов подписок по почте.
+
+Вместо письма на каждый пост подписчик раз в
+``settings.DIGEST_INTERVAL_HOURS`` получает одну сводку: до
+``DIGEST_MAX_POSTS`` новых постов авторов, на которых он подписан
+(``Follow``), с момента прошлой сводки, но не старше
+``DIGEST_LOOKBACK_DAYS`` дней. Подписчики обходятся пачками
+по ``DIGEST_BATCH_SIZE``: на пачку запрос ключей новых постов и запрос
+текстов тех, что войдут в письма; письма пачки уходят одним вызовом
+``send_messages`` через соединение из пула (``DIGEST_CONNECTIONS``
+соединений, каждое открывается один раз за рассылку). Время сводки
+записывается только после отправки пачки: упавшая пачка уйдёт при
+следующем запуске.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DigestState, Post
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+SUBJECT = 'Новые посты ваших подписок'
+
+
+class Mailer:
+    """Пул почтовых соединений: по одному на поток, открытых до ``close``.
+    """
+
+    def __init__(self, connections):
+        self.executor = ThreadPoolExecutor(
+            max_workers=connections, thread_name_prefix='digests'
+        )
+        self.local = threading.local()
+        self.opened = []
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = get_connection()
+            connection.open()
+            with self.lock:
+                self.opened.append(connection)
+        return connection
+
+    def send(self, messages):
+        """Отправить письма в фоне; вернуть ``Future`` с их числом."""
+        return self.executor.submit(
+            lambda: self._connection().send_messages(messages)
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for connection in self.opened:
+            connection.close()
+
+
+def due_users(now):
+    """Получатели, которым пора прислать сводку, по возрастанию pk."""
+    cutoff = now - timedelta(hours=settings.DIGEST_INTERVAL_HOURS)
+    return User.objects.filter(is_active=True).exclude(email='').filter(
+        Q(digest=None)
+        | Q(digest__enabled=True, digest__last_sent=None)
+        | Q(digest__enabled=True, digest__last_sent__lte=cutoff)
+    ).order_by('pk').values_list(
+        'pk', 'username', 'email', 'digest__last_sent'
+    )
+
+
+def batches(now, batch_size):
+    users = due_users(now)
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1][0]
+
+
+def new_posts(batch, now):
+    """Новые посты подписок пользователей пачки:
+    ``{user_id: (до DIGEST_MAX_POSTS постов, сколько ещё не вошло)}``.
+    """
+    # Кто сводок ещё не получал, узнаёт только о постах последнего
+    # интервала, а не обо всех постах своих подписок; давно не
+    # получавший — не больше чем о DIGEST_LOOKBACK_DAYS днях.
+    cutoff = now - timedelta(hours=settings.DIGEST_INTERVAL_HOURS)
+    oldest = now - timedelta(days=settings.DIGEST_LOOKBACK_DAYS)
+    since = {
+        pk: max(last_sent or cutoff, oldest)
+        for pk, _, _, last_sent in batch
+    }
+    # Сначала только ключи постов: тексты читаются вторым запросом и
+    # лишь для тех, что войдут в письма.
+    rows = Post.objects.filter(
+        author__following__user_id__in=since,
+        pub_date__gt=min(since.values()),
+        pub_date__lte=now,
+    ).order_by('-pub_date', '-pk').values_list(
+        'author__following__user_id', 'pk', 'pub_date'
+    )
+    shown, more = {}, {}
+    for user_id, pk, pub_date in rows.iterator():
+        if pub_date <= since[user_id]:
+            continue
+        user_posts = shown.setdefault(user_id, [])
+        if len(user_posts) < settings.DIGEST_MAX_POSTS:
+            user_posts.append(pk)
+        else:
+            more[user_id] = more.get(user_id, 0) + 1
+    posts = {
+        pk: {'pk': pk, 'text': text, 'pub_date': pub_date, 'author': author}
+        for pk, text, pub_date, author in Post.objects.filter(
+            pk__in={pk for pks in shown.values() for pk in pks}
+        ).values_list('pk', 'text', 'pub_date', 'author__username')
+    }
+    return {
+        user_id: ([posts[pk] for pk in pks], more.get(user_id, 0))
+        for user_id, pks in shown.items()
+    }
+
+
+def message(username, email, posts, more):
+    site = settings.SITE_URL
+    for post in posts:
+        post['url'] = site + reverse(
+            'posts:post_detail', kwargs={'post_id': post['pk']}
+        )
+    body = render_to_string('posts/email/digest.txt', {
+        'username': username,
+        'posts': posts,
+        'more': more,
+        'follow_url': site + reverse('posts:follow_index'),
+    })
+    return EmailMessage(SUBJECT, body, to=[email])
+
+
+def mark_sent(user_ids, now):
+    DigestState.objects.bulk_create(
+        [DigestState(user_id=pk) for pk in user_ids], ignore_conflicts=True
+    )
+    DigestState.objects.filter(user_id__in=user_ids).update(last_sent=now)
+
+
+def _settle(future, user_ids, now):
+    try:
+        future.result()
+    except Exception:
+        logger.exception('Не удалось отправить %s сводок', len(user_ids))
+        return 0
+    mark_sent(user_ids, now)
+    return len(user_ids)
+
+
+def send_digests(now=None, limit=None):
+    """Разослать сводки тем, кому пора; вернуть число отправленных писем.
+    """
+    now = now or timezone.now()
+    mailer = Mailer(settings.DIGEST_CONNECTIONS)
+    # Пачки в работе: не больше двух на соединение, чтобы письма всей
+    # рассылки не копились в памяти.
+    pending = []
+    delivered = queued = 0
+    try:
+        for batch in batches(now, settings.DIGEST_BATCH_SIZE):
+            posts = new_posts(batch, now)
+            recipients = [user for user in batch if user[0] in posts]
+            if limit is not None:
+                recipients = recipients[:limit - queued]
+            if not recipients:
+                continue
+            messages = [
+                message(username, email, *posts[pk])
+                for pk, username, email, _ in recipients
+            ]
+            pending.append((
+                mailer.send(messages), [user[0] for user in recipients]
+            ))
+            queued += len(messages)
+            while len(pending) > 2 * settings.DIGEST_CONNECTIONS:
+                delivered += _settle(*pending.pop(0), now)
+            if limit is not None and queued >= limit:
+                break
+    finally:
+        mailer.close()
+        for future, user_ids in pending:
+            delivered += _settle(future, user_ids, now)
+    return delivered
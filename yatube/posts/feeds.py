@@ -0,0 +1,142 @@
+"""Лента подписок, материализованная при записи (fan-out on write).
+
+Новый пост раскладывается по «почтовым ящикам» подписчиков автора
+(таблица ``FeedEntry``), поэтому чтение ``/follow/`` — выборка по индексу
+одного пользователя. Запись хранит дату поста, и страница ленты
+читается по индексу ``(user, -pub_date, -post)`` без сортировки.
+
+Авторы, у которых подписчиков больше ``settings.FEED_CELEBRITY_FOLLOWERS``,
+не раскладываются: их посты подмешиваются в ленту при чтении. Когда
+автор опускается ниже порога, его последние посты раскладываются по
+лентам всех подписчиков (``backfill_followers``).
+"""
+from django.conf import settings
+from django.db.models import F, Q
+
+from .graph import graph
+from .models import FeedEntry, Follow, Post, UserStats
+
+FAN_OUT_BATCH_SIZE = 1000
+# Порядок ленты подписок для CursorPaginator — поля записи FeedEntry.
+ORDERING = ('-feed_date', '-feed_post')
+
+
+def celebrity_authors(authors):
+    """Авторы из ``authors``, посты которых читаются без раскладки."""
+    return UserStats.objects.filter(
+        user__in=authors,
+        followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS
+    ).values_list('user', flat=True)
+
+
+def is_celebrity(author):
+    return celebrity_authors([author]).exists()
+
+
+def left_celebrities(author):
+    """Автор только что опустился ниже порога «знаменитостей»."""
+    return UserStats.objects.filter(
+        user=author,
+        followers_count=settings.FEED_CELEBRITY_FOLLOWERS - 1
+    ).exists()
+
+
+def _batches(user_ids, posts):
+    batch = []
+    for user_id in user_ids:
+        for pk, pub_date in posts:
+            batch.append(
+                FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            )
+            if len(batch) >= FAN_OUT_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _entries(user_ids, posts):
+    """Записи лент ``user_ids`` для ``posts`` — пар ``(pk, pub_date)``."""
+    for batch in _batches(user_ids, posts):
+        # Пачку не длиннее FAN_OUT_BATCH_SIZE собирает _batches, а на
+        # INSERT её делит сам bulk_create по пределу СУБД. Явный
+        # batch_size Django 2.2 этим пределом не ограничивает, и на
+        # SQLite INSERT из 1000 записей падает.
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _followers(author_id):
+    return Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator(
+        chunk_size=FAN_OUT_BATCH_SIZE
+    )
+
+
+def _latest_posts(author_id):
+    return list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_SIZE])
+
+
+def fan_out(post):
+    """Положить новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    _entries(_followers(post.author_id), [(post.pk, post.pub_date)])
+
+
+def move(post):
+    """Переложить пост, сменивший автора, в ленты его подписчиков."""
+    FeedEntry.objects.filter(post=post).delete()
+    fan_out(post)
+
+
+def backfill(user_id, author_id):
+    """Заполнить ленту нового подписчика последними постами автора."""
+    if is_celebrity(author_id):
+        return
+    _entries([user_id], _latest_posts(author_id))
+
+
+def backfill_followers(author_id):
+    """Разложить последние посты бывшей «знаменитости» по лентам.
+
+    Пока у автора было много подписчиков, его посты не раскладывались,
+    а теперь и не подмешиваются при чтении.
+    """
+    if is_celebrity(author_id):
+        return
+    _entries(_followers(author_id), _latest_posts(author_id))
+
+
+def prune(user_id, author_id):
+    """Убрать посты автора из ленты отписавшегося пользователя."""
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+def follow_feed(user):
+    """Посты ленты подписок пользователя (без сортировки).
+
+    Ключ сортировки (``ORDERING``) — аннотации ``feed_date`` и
+    ``feed_post``: поля FeedEntry или, если в ленте есть «знаменитости»,
+    самого поста.
+    """
+    authors = graph.following(user.pk)
+    if not authors:
+        return Post.objects.none().annotate(
+            feed_date=F('pub_date'), feed_post=F('pk')
+        )
+    celebrities = list(celebrity_authors(list(authors)))
+    if not celebrities:
+        return Post.objects.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'),
+            feed_post=F('feed_entries__post'),
+        )
+    return Post.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=celebrities)
+    ).annotate(feed_date=F('pub_date'), feed_post=F('pk'))
@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Comment, Post
+from .uploads import process_image
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +14,9 @@ class PostForm(forms.ModelForm):
             'image',
         )
 
+    def clean_image(self):
+        return process_image(self.cleaned_data.get('image'))
+
 
 class CommentForm(forms.ModelForm):
 
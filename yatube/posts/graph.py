@@ -0,0 +1,167 @@
+"""Граф подписок в памяти процесса.
+
+Для каждого пользователя, о котором спрашивали, хранятся два
+отсортированных массива id (``array('q')``): на кого он подписан и кто
+подписан на него. Проверка подписки — двоичный поиск, взаимные
+подписки — слияние двух массивов, число подписок — длина массива;
+база не нужна. Массивы загружаются лениво, по одному запросу на
+направление, и вытесняются по LRU (``settings.FOLLOW_GRAPH_MAX_USERS``).
+
+Каждый процесс сервера держит свой граф, поэтому перед ответом
+сверяется версия ``follows:<pk>`` из ``posts.versions`` (один запрос
+к кешу): подписка в другом процессе сдвигает её, и массивы
+перечитываются. Свои подписки и отписки процесс вносит в массивы сразу
+после коммита, не перечитывая их. На случай изменений в обход сигналов
+(``bulk_create``, загрузка данных) запись живёт не дольше
+``settings.FOLLOW_GRAPH_TTL`` секунд.
+
+С locmem версии у каждого процесса свои, и чужая подписка видна в графе
+только через ``settings.VERSIONS_TIMEOUT`` секунд. Поэтому то, что
+пользователь должен увидеть сразу после своей подписки (кнопка на
+профиле), читается из базы, а не из графа.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import versions
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+
+class Adjacency:
+    __slots__ = ('version', 'loaded', FOLLOWING, FOLLOWERS)
+
+    def __init__(self, version):
+        self.version = version
+        self.loaded = time.monotonic()
+        self.following = None
+        self.followers = None
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+class FollowGraph:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _entry(self, user_id):
+        version = versions.get('follows', user_id)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            fresh = (
+                entry is not None and entry.version == version
+                and time.monotonic() - entry.loaded
+                < settings.FOLLOW_GRAPH_TTL
+            )
+            if not fresh:
+                entry = self.entries[user_id] = Adjacency(version)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.FOLLOW_GRAPH_MAX_USERS:
+                self.entries.popitem(last=False)
+        return entry
+
+    def _ids(self, user_id, direction):
+        entry = self._entry(user_id)
+        ids = getattr(entry, direction)
+        if ids is None:
+            # Массивы живут под версией, поэтому читаются с основной
+            # базы: отстающая реплика не попадёт в граф надолго.
+            follows = Follow.objects.using(DEFAULT_DB_ALIAS)
+            if direction == FOLLOWING:
+                rows = follows.filter(user_id=user_id).values_list(
+                    'author_id', flat=True
+                ).order_by('author_id')
+            else:
+                rows = follows.filter(author_id=user_id).values_list(
+                    'user_id', flat=True
+                ).order_by('user_id')
+            ids = array('q', rows.iterator())
+            with self.lock:
+                if getattr(entry, direction) is None:
+                    setattr(entry, direction, ids)
+                ids = getattr(entry, direction)
+        return ids
+
+    def following(self, user_id):
+        """Отсортированные id авторов, на которых подписан пользователь."""
+        return self._ids(user_id, FOLLOWING)
+
+    def followers(self, user_id):
+        """Отсортированные id подписчиков пользователя."""
+        return self._ids(user_id, FOLLOWERS)
+
+    def is_following(self, user_id, author_id):
+        if user_id is None or author_id is None:
+            return False
+        return _contains(self.following(user_id), author_id)
+
+    def mutual(self, user_id):
+        """Id пользователей, с которыми подписки взаимны."""
+        following = self.following(user_id)
+        followers = self.followers(user_id)
+        result = []
+        i = j = 0
+        while i < len(following) and j < len(followers):
+            if following[i] == followers[j]:
+                result.append(following[i])
+                i += 1
+                j += 1
+            elif following[i] < followers[j]:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def counts(self, user_id):
+        """``(подписок, подписчиков)``."""
+        return len(self.following(user_id)), len(self.followers(user_id))
+
+    def _apply(self, user_id, direction, other_id, added, stamps):
+        old, new = stamps
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry.version == new:
+                return
+            if entry.version != old:
+                # Пропущено чужое изменение: перечитать при обращении.
+                del self.entries[user_id]
+                return
+            ids = getattr(entry, direction)
+            if ids is not None:
+                present = _contains(ids, other_id)
+                if added and not present:
+                    insort(ids, other_id)
+                elif not added and present:
+                    ids.pop(bisect_left(ids, other_id))
+            entry.version = new
+
+    def apply(self, user_id, author_id, added, stamps):
+        """Внести подписку или отписку; ``stamps`` — итог ``versions.bump``.
+        """
+        self._apply(
+            user_id, FOLLOWING, author_id, added,
+            stamps[versions.make_key('follows', user_id)]
+        )
+        self._apply(
+            author_id, FOLLOWERS, user_id, added,
+            stamps[versions.make_key('follows', author_id)]
+        )
+
+
+graph = FollowGraph()
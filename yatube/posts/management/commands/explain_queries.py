@@ -0,0 +1,115 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from posts import ranking, search
+from posts.feeds import ORDERING as FOLLOW_ORDERING
+from posts.feeds import follow_feed
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.views import comments_paginator
+
+# Признаки плохого плана по СУБД: полный просмотр таблицы и сортировка
+# во временной структуре вместо чтения индекса по порядку.
+PROBLEMS = {
+    'sqlite': (
+        ('полный просмотр', re.compile(r'\bSCAN (?:TABLE )?\w+$')),
+        ('сортировка', re.compile(r'USE TEMP B-TREE')),
+    ),
+    'postgresql': (
+        ('полный просмотр', re.compile(r'\bSeq Scan on')),
+        ('сортировка', re.compile(r'^\s*(?:->\s*)?Sort\b')),
+    ),
+    'mysql': (
+        ('полный просмотр', re.compile(r'\btype: ALL\b|\bALL\b')),
+        ('сортировка', re.compile(r'Using filesort|Using temporary')),
+    ),
+}
+
+# Известные и принятые сортировки. Поиск ранжирует по сумме весов: его
+# порядок не может дать ни один индекс.
+ALLOWED = {
+    'search_posts': {'сортировка'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов представлений posts.views и '
+        'сообщает о полных просмотрах таблиц и сортировках без индекса.'
+    )
+
+    def samples(self):
+        """Объекты, для которых строятся запросы: самые «тяжёлые»."""
+        group = Group.objects.order_by('-posts_count').first()
+        author = User.objects.order_by('-stats__posts_count').first()
+        reader = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows').first()
+        post = Post.objects.order_by('-comments_count').first()
+        return group, author, reader, post
+
+    def querysets(self):
+        """Пары (представление, запрос) в том виде, как их строят views."""
+        group, author, reader, post = self.samples()
+        chronological = ('-pub_date', '-pk')
+        feeds = [('index', Post.objects.feed(), chronological)]
+        feeds += [
+            (f'index?mode={mode}', Post.objects.feed(), ordering)
+            for mode, ordering in ranking.MODES.items()
+        ]
+        if group is not None:
+            feeds.append(('group_posts', group.posts.feed(), chronological))
+        if author is not None:
+            feeds.append(('profile', author.posts.feed(), chronological))
+        # Пустая лента (нет подписок) не ходит в базу.
+        if reader is not None and reader.follows:
+            feeds.append((
+                'follow_index', follow_feed(reader).feed(), FOLLOW_ORDERING
+            ))
+        for view, queryset, ordering in feeds:
+            paginator = CursorPaginator(
+                queryset, settings.POSTS_PER_PAGE, ordering=ordering
+            )
+            yield view, paginator.get_queryset()
+            # Глубокая страница: с условием по ключу сортировки.
+            first = queryset.order_by(*paginator.ordering).first()
+            if first is not None:
+                values, _ = paginator.decode_cursor(
+                    paginator.encode_cursor(first)
+                )
+                yield f'{view} (курсор)', paginator.get_queryset(values)
+        if post is not None:
+            yield 'post_detail', comments_paginator(post).get_queryset()
+        yield 'search_posts', search.search(
+            Post.objects.feed(), 'пост'
+        )[:settings.POSTS_PER_PAGE]
+
+    def check_plan(self, view, plan):
+        patterns = PROBLEMS.get(connection.vendor, ())
+        allowed = ALLOWED.get(view.split(' ')[0], set())
+        problems = []
+        for line in plan.splitlines():
+            for problem, pattern in patterns:
+                if problem not in allowed and pattern.search(line):
+                    problems.append(f'{problem}: {line.strip()}')
+        return problems
+
+    def handle(self, *args, **options):
+        found = 0
+        for view, queryset in self.querysets():
+            plan = queryset.explain()
+            problems = self.check_plan(view, plan)
+            found += len(problems)
+            style = self.style.ERROR if problems else self.style.SUCCESS
+            self.stdout.write(style(view))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+            for problem in problems:
+                self.stdout.write(f'  {problem}')
+        if found:
+            raise CommandError(f'Подозрительных шагов в планах: {found}')
+        self.stdout.write(self.style.SUCCESS('Планы запросов в порядке'))
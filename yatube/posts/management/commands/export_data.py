@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON-файл или каталог CSV-файлов, не держа данные в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл NDJSON («-» — стандартный вывод) или каталог CSV.'
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'), default='ndjson'
+        )
+        parser.add_argument(
+            '--models', nargs='+', choices=tuple(transfer.MODELS),
+            default=tuple(transfer.MODELS)
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=transfer.CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        path, models = options['path'], options['models']
+        chunk_size = options['chunk_size']
+        if options['format'] == 'csv':
+            count = transfer.export_csv(path, models, chunk_size)
+        elif path == '-':
+            count = transfer.export_ndjson(
+                self.stdout, models, chunk_size
+            )
+        else:
+            with open(path, 'w', encoding='utf-8') as stream:
+                count = transfer.export_ndjson(stream, models, chunk_size)
+        self.stderr.write(f'Выгружено записей: {count}')
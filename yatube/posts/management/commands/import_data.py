@@ -0,0 +1,53 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает данные, выгруженные export_data, пачками через '
+        'bulk_create. Прерванную загрузку можно повторить: она '
+        'продолжится с контрольной точки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON или каталог CSV.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=transfer.CHUNK_SIZE
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint).'
+        )
+        parser.add_argument(
+            '--no-finalize',
+            action='store_true',
+            help='Не пересчитывать счётчики, поиск и ленты после загрузки.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'].rstrip(os.sep)
+        if not os.path.exists(path):
+            raise CommandError(f'Нет такого файла или каталога: {path}')
+        if os.path.isdir(path):
+            records = transfer.read_csv(path)
+        else:
+            records = transfer.read_ndjson(path)
+        checkpoint = transfer.Checkpoint(
+            options['checkpoint'] or f'{path}.checkpoint'
+        )
+        if checkpoint.done:
+            self.stdout.write(
+                f'Продолжение с контрольной точки: {checkpoint.done}'
+            )
+        count = transfer.import_records(
+            records, checkpoint, options['chunk_size']
+        )
+        self.stdout.write(f'Загружено записей: {count}')
+        if not options['no_finalize']:
+            transfer.finalize()
+            self.stdout.write('Счётчики, поиск и ленты пересчитаны')
+        checkpoint.remove()
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя.'
+        )
+
+    def handle(self, *args, **options):
+        drift = counters.drift()
+        for model, pk, field, stored, actual in drift:
+            self.stdout.write(
+                f'{model._meta.label} pk={pk} {field}: '
+                f'{stored} != {actual}'
+            )
+        if options['check']:
+            missing = counters.missing_stats().count()
+            if drift or missing:
+                raise CommandError(
+                    f'Расхождений: {len(drift)}, '
+                    f'пользователей без счётчиков: {missing}'
+                )
+            self.stdout.write(self.style.SUCCESS('Счётчики в порядке'))
+            return
+        with transaction.atomic():
+            created = counters.create_missing_stats()
+            counters.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено расхождений: {len(drift)}, '
+            f'создано записей счётчиков: {created}'
+        ))
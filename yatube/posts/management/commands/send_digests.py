@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import digests
+
+
+class Command(BaseCommand):
+    help = 'Рассылает сводки новых постов подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, запуская рассылку по расписанию.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=600,
+            help='Пауза между рассылками, секунд.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Не больше стольких писем за рассылку.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            sent = digests.send_digests(limit=options['limit'])
+            self.stdout.write(f'Отправлено сводок: {sent}')
+            if not options['loop']:
+                return
+            time.sleep(max(0, options['interval'] - (
+                time.monotonic() - started
+            )))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import ranking
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает оценки постов для лент «В тренде» и «Популярное».'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать все посты, например после смены весов.'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, пересчитывая оценки по расписанию.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60,
+            help='Пауза между пересчётами, секунд.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Не больше стольких постов за пересчёт.'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            ranking.mark_all()
+        while True:
+            started = time.monotonic()
+            updated = ranking.update_scores(limit=options['limit'])
+            self.stdout.write(f'Пересчитано оценок: {updated}')
+            if not options['loop']:
+                return
+            time.sleep(max(0, options['interval'] - (
+                time.monotonic() - started
+            )))
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='popular_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Оценка популярности'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='score_stale',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Оценки устарели'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Оценка в тренде'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='followers_level',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень популярности в оценках'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-popular_score', '-id'], name='post_popular_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(score_stale=True), fields=['id'], name='post_score_stale'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:40
+
+import json
+
+from django.db import migrations
+
+
+def move_jobs(apps, schema_editor):
+    # Ждущие задачи миниатюр переходят в общую очередь core.tasks.
+    # Перед миграцией остановите process_thumbnails и процессы с
+    # THUMBNAIL_WORKERS: прежний воркер пишет в удаляемую таблицу
+    # ThumbnailJob. Задачи «в работе» не переносятся, чтобы пост не
+    # обработали дважды. Если воркер не успел их доделать, миниатюры
+    # постов с thumbnail_ready=False ставит в очередь
+    # transfer.enqueue_thumbnails.
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    Task = apps.get_model('core', 'Task')
+    post_ids = ThumbnailJob.objects.filter(
+        status='pending'
+    ).values_list('post_id', flat=True).distinct()
+    Task.objects.bulk_create([
+        Task(name='posts.tasks.make_thumbnails', args=json.dumps([pk]))
+        for pk in post_ids
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0026_feedentry_pub_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='ThumbnailJob',
+        ),
+    ]
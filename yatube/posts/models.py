@@ -4,6 +4,26 @@ from django.db import models
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для списков: автор и группа одним запросом,
+        без лишних колонок."""
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__email',
+            'author__last_login',
+            'author__date_joined',
+            'group__description',
+        )
+
+    def pictures(self):
+        """Варианты картинок для ``<picture>`` одним запросом на страницу.
+
+        Нужны только HTML-спискам; API отдаёт исходную картинку.
+        """
+        return self.prefetch_related('image_variants')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='текст поста',
@@ -35,15 +55,105 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False
+    )
+    thumbnail_ready = models.BooleanField(
+        verbose_name='Миниатюра готова',
+        default=False,
+        editable=False
+    )
+    # Оценки для лент «В тренде» и «Популярное» (posts.ranking).
+    trending_score = models.FloatField(
+        verbose_name='Оценка в тренде',
+        default=0,
+        editable=False
+    )
+    popular_score = models.FloatField(
+        verbose_name='Оценка популярности',
+        default=0,
+        editable=False
+    )
+    score_stale = models.BooleanField(
+        verbose_name='Оценки устарели',
+        default=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Под сортировку лент и CursorPaginator: (-pub_date, -pk).
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_feed'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed'
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='post_trending_feed'
+            ),
+            models.Index(
+                fields=['-popular_score', '-id'],
+                name='post_popular_feed'
+            ),
+            # Очередь пересчёта оценок: в индексе только устаревшие.
+            models.Index(
+                fields=['id'],
+                name='post_score_stale',
+                condition=models.Q(score_stale=True)
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def picture_sources(self):
+        """Наборы ``srcset`` картинки по форматам для тега ``<picture>``.
+
+        Последний элемент — запасной формат для самого ``<img>``.
+        Варианты берутся из ``PostQuerySet.pictures()``.
+        """
+        sources = {}
+        for variant in self.image_variants.all():
+            sources.setdefault(variant.format, []).append(variant)
+        return [
+            {
+                'type': variants[0].mime_type,
+                'srcset': ', '.join(
+                    f'{variant.file.url} {variant.width}w'
+                    for variant in variants
+                ),
+            }
+            for _, variants in sorted(
+                sources.items(),
+                key=lambda item: ImageVariant.FORMATS.index(item[0])
+            )
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Автор и группа на момент загрузки нужны счётчикам при их
+        # смене, картинка — чтобы не готовить миниатюры повторно.
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -62,6 +172,11 @@ class Group(models.Model):
         verbose_name='Описания сообщества',
         help_text='Тут могут быть правила, описания группы и т.д.'
     )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
@@ -95,9 +210,23 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_post_id = instance.__dict__.get('post_id')
+        return instance
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -124,3 +253,239 @@ class Follow(models.Model):
                 name='unique_following'
             ),
         ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Подписка, изменённая в админке, — это отписка от прежнего
+        # автора и подписка на нового.
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        return instance
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    # Копия Post.pub_date: лента читается по индексу одной таблицы.
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+        editable=False
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            ),
+        ]
+        # Под сортировку ленты подписок: (-pub_date, -post).
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_entry_order'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Число постов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Число подписок',
+        default=0
+    )
+    # floor(log2(1 + подписчиков)), учтённый в оценках постов.
+    followers_level = models.PositiveSmallIntegerField(
+        verbose_name='Уровень популярности в оценках',
+        default=0,
+        editable=False
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class SearchTerm(models.Model):
+    term = models.CharField(
+        verbose_name='Основа слова',
+        max_length=64
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        verbose_name='Комментарий',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_terms'
+    )
+    weight = models.PositiveIntegerField(
+        verbose_name='Вес'
+    )
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        indexes = [
+            models.Index(fields=['term', 'post'], name='search_term_post'),
+        ]
+
+
+class ImageVariant(models.Model):
+    # Форматы в порядке предпочтения браузером; последний — запасной.
+    FORMATS = ('AVIF', 'WEBP', 'JPEG')
+
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Пост',
+        on_delete=models.CASCADE,
+        related_name='image_variants'
+    )
+    width = models.PositiveSmallIntegerField(
+        verbose_name='Ширина'
+    )
+    format = models.CharField(
+        verbose_name='Формат',
+        max_length=10
+    )
+    file = models.FileField(
+        verbose_name='Файл',
+        upload_to='posts/variants/'
+    )
+    size = models.PositiveIntegerField(
+        verbose_name='Размер, байт',
+        default=0
+    )
+
+    class Meta:
+        ordering = ['width']
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'width', 'format'],
+                name='unique_image_variant'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.width}w {self.format}'
+
+    @property
+    def mime_type(self):
+        return f'image/{self.format.lower()}'
+
+
+class DigestState(models.Model):
+    """Рассылка сводок о новых постах подписок одному пользователю.
+
+    Строка появляется после первой сводки; у кого её нет, тот получает
+    сводки с настройками по умолчанию.
+    """
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='digest'
+    )
+    enabled = models.BooleanField(
+        verbose_name='Присылать сводки',
+        default=True
+    )
+    last_sent = models.DateTimeField(
+        verbose_name='Последняя сводка',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Сводка подписок'
+        verbose_name_plural = 'Сводки подписок'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.last_sent}'
+
+
+class Recommendation(models.Model):
+    """Кого почитать: автор, предложенный пользователю пакетным расчётом.
+
+    Строки целиком пересчитывает ``manage.py recommend_follows``
+    (``posts.recommendations``); страницы только читают их.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    candidate = models.ForeignKey(
+        User,
+        verbose_name='Предложенный автор',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    rank = models.PositiveSmallIntegerField(
+        verbose_name='Место'
+    )
+    score = models.FloatField(
+        verbose_name='Оценка'
+    )
+    mutual = models.PositiveIntegerField(
+        verbose_name='Читают из подписок',
+        default=0
+    )
+
+    class Meta:
+        ordering = ('rank',)
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'candidate'],
+                name='unique_recommendation'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'rank'],
+                name='recommendation_rank'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.candidate_id}'
@@ -0,0 +1,154 @@
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу сортировки (keyset pagination).
+
+    Вместо номера страницы используется непрозрачный курсор со значениями
+    полей сортировки крайней записи соседней страницы. Выборка страницы
+    не требует ни ``COUNT(*)``, ни ``OFFSET``, поэтому её стоимость
+    не зависит от глубины. Последнее поле ``ordering`` должно быть
+    уникальным (обычно ``pk``); поля могут быть и аннотациями запроса.
+    """
+    cursor_based = True
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk')):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.number = 1
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def _check_object_list_is_ordered(self):
+        # Порядок задаёт self.ordering, а не сам object_list.
+        pass
+
+    @cached_property
+    def num_pages(self):
+        # Точное число страниц без COUNT(*) неизвестно: достаточно того,
+        # чтобы Page.has_next() и Page.has_previous() отвечали верно.
+        return self.number + 1 if self.next_cursor else self.number
+
+    def _fields(self):
+        model = self.object_list.model
+        annotations = self.object_list.query.annotations
+        for name in self.ordering:
+            name = name.lstrip('-')
+            if name == 'pk':
+                yield name, model._meta.pk
+            elif name in annotations:
+                yield name, annotations[name].output_field
+            else:
+                yield name, model._meta.get_field(name)
+
+    def encode_cursor(self, obj, reverse=False):
+        values = []
+        for name, _ in self._fields():
+            value = getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps({'v': values, 'r': reverse})
+        return urlsafe_base64_encode(data.encode())
+
+    def decode_cursor(self, cursor):
+        """Вернуть ``(values, reverse)`` или ``None`` для битого курсора."""
+        try:
+            data = json.loads(urlsafe_base64_decode(cursor).decode())
+            values = data['v']
+            if values is not None:
+                values = [
+                    field.to_python(value)
+                    for (_, field), value in zip(self._fields(), values)
+                ]
+                if len(values) != len(self.ordering):
+                    return None
+            return values, bool(data['r'])
+        except Exception:
+            return None
+
+    def _keyset_filter(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for (name, _), order, value in zip(
+                self._fields(), self.ordering, values):
+            descending = order.startswith('-')
+            lookup = 'gt' if descending == reverse else 'lt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_queryset(self, values=None, reverse=False):
+        """Запрос одной страницы (с лишней записью для has_next)."""
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            )
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse))
+        return queryset[:self.per_page + 1]
+
+    def get_page(self, cursor=None):
+        """Страница по курсору; пустой или битый курсор — первая."""
+        values, reverse = None, False
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is not None:
+            values, reverse = decoded
+        objects = list(self.get_queryset(values, reverse))
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if reverse:
+            objects.reverse()
+            has_previous, has_next = has_more, values is not None
+        else:
+            has_previous, has_next = values is not None, has_more
+        if objects and has_previous:
+            self.previous_cursor = self.encode_cursor(
+                objects[0], reverse=True
+            )
+        if objects and has_next:
+            self.next_cursor = self.encode_cursor(objects[-1])
+        self.number = 2 if self.previous_cursor else 1
+        return Page(objects, self.number, self)
+
+    def get_lazy_page(self, cursor=None):
+        """Страница, которая читается при первом обращении к ней."""
+        return LazyPage(self, cursor)
+
+    def last_cursor(self):
+        """Курсор последней страницы: выборка с конца без ключа."""
+        data = json.dumps({'v': None, 'r': True})
+        return urlsafe_base64_encode(data.encode())
+
+
+class LazyPage(Page):
+    """Страница ``CursorPaginator``, выбираемая при первом обращении.
+
+    Списки постов выводятся внутри ``{% cache %}``: при попадании в кеш
+    ни запрос страницы, ни связанные с ним выборки не выполняются.
+    """
+
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.cursor = cursor
+
+    @cached_property
+    def page(self):
+        return self.paginator.get_page(self.cursor)
+
+    @property
+    def object_list(self):
+        return self.page.object_list
+
+    @property
+    def number(self):
+        return self.page.number
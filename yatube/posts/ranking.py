@@ -0,0 +1,130 @@
+"""Ленты «В тренде» и «Популярное»: посты по затухающей вовлечённости.
+
+Вовлечённость поста — ``1 + комментарии + SCORE_FOLLOWER_WEIGHT ·
+уровень автора``, где уровень — ``floor(log2(1 + подписчиков))``.
+Вес вовлечённости убывает вдвое за ``TRENDING_HALF_LIFE_HOURS``
+(«В тренде») или ``POPULAR_HALF_LIFE_HOURS`` («Популярное»). Оценка
+хранится в логарифме::
+
+    score = log2(вовлечённость) + часы_с_эпохи(pub_date) / полураспад
+
+``2 ** (score - сейчас / полураспад)`` — это и есть затухшая
+вовлечённость, а общий для всех постов множитель порядок не меняет.
+Поэтому оценку не нужно пересчитывать с течением времени, только когда
+меняется вовлечённость, и лента — обычная выборка по индексу
+``(-score, -id)`` с ``CursorPaginator``, как хронологическая.
+
+Новый комментарий помечает пост ``score_stale`` (``posts.counters``);
+``manage.py update_scores`` пересчитывает помеченные посты пачками по
+частичному индексу и посты авторов, у которых сменился уровень.
+"""
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import versions
+from .models import Post, UserStats
+
+HOUR = 3600
+# Лента: (-оценка, -pk) для CursorPaginator.
+MODES = {
+    'trending': ('-trending_score', '-pk'),
+    'popular': ('-popular_score', '-pk'),
+}
+
+
+def followers_level(followers):
+    return int(math.log2(1 + followers))
+
+
+def engagement(comments, level):
+    return 1 + comments + settings.SCORE_FOLLOWER_WEIGHT * level
+
+
+def scores(pub_date, comments, level):
+    """``(trending_score, popular_score)`` поста."""
+    weight = math.log2(engagement(comments, level))
+    hours = pub_date.timestamp() / HOUR
+    return (
+        weight + hours / settings.TRENDING_HALF_LIFE_HOURS,
+        weight + hours / settings.POPULAR_HALF_LIFE_HOURS,
+    )
+
+
+def _chunked(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def refresh_levels():
+    """Пометить посты авторов, у которых сменился уровень.
+
+    Уровень меняется при удвоении числа подписчиков, поэтому посты
+    популярного автора пересчитываются не на каждую подписку. Возвращает
+    число таких авторов.
+    """
+    level = F('followers_level')
+    changed = UserStats.objects.filter(
+        Q(followers_count__gte=2 ** (level + 1) - 1)
+        | Q(followers_count__lt=2 ** level - 1)
+    ).values_list('user_id', 'followers_count')
+    changed = list(changed)
+    for chunk in _chunked(changed, settings.SCORE_BATCH_SIZE):
+        with transaction.atomic():
+            Post.objects.filter(
+                author_id__in=[user_id for user_id, _ in chunk]
+            ).update(score_stale=True)
+            for user_id, followers in chunk:
+                UserStats.objects.filter(user_id=user_id).update(
+                    followers_level=followers_level(followers)
+                )
+    return len(changed)
+
+
+def update_batch(size):
+    """Пересчитать оценки пачки устаревших постов; вернуть её размер."""
+    with transaction.atomic():
+        ids = list(Post.objects.filter(score_stale=True).order_by(
+            'pk'
+        ).values_list('pk', flat=True)[:size])
+        if not ids:
+            return 0
+        # Флаг снимается до чтения счётчиков: комментарий, пришедший
+        # после чтения, снова пометит пост к следующему запуску.
+        Post.objects.filter(pk__in=ids).update(score_stale=False)
+        rows = Post.objects.filter(pk__in=ids).values_list(
+            'pk', 'pub_date', 'comments_count',
+            'author__stats__followers_level'
+        )
+        posts = []
+        for pk, pub_date, comments, level in rows:
+            trending, popular = scores(pub_date, comments, level or 0)
+            posts.append(Post(
+                pk=pk, trending_score=trending, popular_score=popular
+            ))
+        Post.objects.bulk_update(posts, ['trending_score', 'popular_score'])
+    return len(posts)
+
+
+def update_scores(limit=None):
+    """Пересчитать устаревшие оценки; вернуть число постов."""
+    refresh_levels()
+    updated = 0
+    while limit is None or updated < limit:
+        size = settings.SCORE_BATCH_SIZE
+        if limit is not None:
+            size = min(size, limit - updated)
+        done = update_batch(size)
+        if not done:
+            break
+        updated += done
+    if updated:
+        versions.bump(('ranking', None))
+    return updated
+
+
+def mark_all():
+    """Пометить все посты: после смены весов или ``recount``."""
+    return Post.objects.update(score_stale=True)
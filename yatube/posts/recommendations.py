@@ -0,0 +1,176 @@
+"""«Кого почитать»: пакетный расчёт рекомендаций по графу подписок.
+
+Подписки загружаются в память, как в ``posts.graph``: для каждого
+пользователя — отсортированный массив id авторов (``array('q')``).
+Оценка кандидата для пользователя складывается из двух частей:
+
+* друзья друзей: сколько авторов, которых читает пользователь, читают
+  кандидата (это число показывается на странице);
+* совместные подписки: для ``SIMILAR_USERS`` ближайших соседей —
+  пользователей с наибольшей косинусной близостью по общим подпискам —
+  их близость прибавляется каждому автору, которого читает сосед.
+  Авторы с ``settings.FEED_CELEBRITY_FOLLOWERS`` подписчиков в
+  близости не учитываются: их читают все, и о сходстве это ничего не
+  говорит.
+
+Из оценок убираются сам пользователь и те, на кого он уже подписан;
+остаются ``settings.RECOMMENDATIONS_TOP_K`` лучших. Оценки одного
+пользователя считаются счётчиками (``Counter``) и сразу сворачиваются
+в его лучших кандидатов, поэтому память расчёта — это граф подписок и
+рекомендации одного блока. Результат блока из
+``settings.RECOMMENDATIONS_BLOCK_SIZE`` пользователей сразу заменяет
+их строки ``Recommendation``.
+
+Страницы читают готовую таблицу (``posts.suggestions``).
+"""
+import heapq
+from array import array
+from collections import Counter
+from math import sqrt
+
+from django.conf import settings
+from django.db import transaction
+
+from . import versions
+from .models import Follow, Recommendation
+
+SIMILAR_USERS = 50
+READ_CHUNK = 10000
+DELETE_CHUNK = 500
+
+
+def load_graph():
+    """Подписки из базы: ``{пользователь: array('q')}`` id авторов
+    по возрастанию.
+    """
+    following = {}
+    rows = Follow.objects.exclude(user=None).exclude(author=None).order_by(
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in rows.iterator(chunk_size=READ_CHUNK):
+        following.setdefault(user_id, array('q')).append(author_id)
+    for user_id, authors in following.items():
+        following[user_id] = array('q', sorted(set(authors)))
+    return following
+
+
+class Recommender:
+    """Рекомендации для пользователей одного снимка подписок."""
+
+    def __init__(self, following, top_k):
+        self.following = following
+        self.top_k = top_k
+        counts = Counter()
+        for authors in following.values():
+            counts.update(authors)
+        # Подписчики обычных (не «знаменитых») авторов — для близости.
+        self.readers = {}
+        for user_id, authors in following.items():
+            for author_id in authors:
+                if counts[author_id] < settings.FEED_CELEBRITY_FOLLOWERS:
+                    self.readers.setdefault(
+                        author_id, array('q')
+                    ).append(user_id)
+        # Близость делится на корни из числа обычных подписок обоих:
+        # получается косинус между пользователями.
+        self.norm = {
+            user_id: 1 / sqrt(max(
+                sum(author_id in self.readers for author_id in authors), 1
+            ))
+            for user_id, authors in following.items()
+        }
+
+    def users(self):
+        """Id пользователей, которые на кого-нибудь подписаны."""
+        return sorted(self.following)
+
+    def neighbours(self, user_id):
+        """``SIMILAR_USERS`` ближайших соседей: пары ``(близость, id)``."""
+        common = Counter()
+        for author_id in self.following[user_id]:
+            common.update(self.readers.get(author_id, ()))
+        del common[user_id]
+        norm = self.norm[user_id]
+        best = heapq.nsmallest(SIMILAR_USERS, (
+            (-count * norm * self.norm[other], other)
+            for other, count in common.items()
+        ))
+        return [(-closeness, other) for closeness, other in best]
+
+    def score(self, user_id):
+        """Рекомендации пользователя: список ``Recommendation``."""
+        followed = self.following[user_id]
+        friends = Counter()
+        for author_id in followed:
+            friends.update(self.following.get(author_id, ()))
+        scores = Counter(friends)
+        for closeness, other in self.neighbours(user_id):
+            for candidate in self.following[other]:
+                scores[candidate] += closeness
+        # Ни сам пользователь, ни его подписки не предлагаются.
+        del scores[user_id]
+        for author_id in followed:
+            del scores[author_id]
+        best = heapq.nsmallest(self.top_k, (
+            (-value, candidate) for candidate, value in scores.items()
+            if value > 0
+        ))
+        return [
+            Recommendation(
+                user_id=user_id,
+                candidate_id=candidate,
+                rank=place,
+                score=float(-value),
+                mutual=friends[candidate],
+            )
+            for place, (value, candidate) in enumerate(best, 1)
+        ]
+
+
+def _chunked(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def store(user_ids, recommendations):
+    """Заменить рекомендации пользователей ``user_ids``."""
+    with transaction.atomic():
+        for chunk in _chunked(user_ids, DELETE_CHUNK):
+            Recommendation.objects.filter(user_id__in=chunk).delete()
+        Recommendation.objects.bulk_create(recommendations)
+
+
+def prune(user_ids):
+    """Удалить рекомендации всех, кроме ``user_ids``: они отписались от всех.
+    """
+    active = set(user_ids)
+    stale = [
+        user_id for user_id in Recommendation.objects.order_by(
+        ).values_list('user_id', flat=True).distinct().iterator()
+        if user_id not in active
+    ]
+    for chunk in _chunked(stale, DELETE_CHUNK):
+        Recommendation.objects.filter(user_id__in=chunk).delete()
+    return len(stale)
+
+
+def recompute(top_k=None, block_size=None):
+    """Пересчитать рекомендации всех пользователей.
+
+    Возвращает ``(пользователей, рекомендаций)``.
+    """
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    block_size = block_size or settings.RECOMMENDATIONS_BLOCK_SIZE
+    recommender = Recommender(load_graph(), top_k)
+    users = recommender.users()
+    total = 0
+    for block in _chunked(users, block_size):
+        recommendations = [
+            recommendation for user_id in block
+            for recommendation in recommender.score(user_id)
+        ]
+        store(block, recommendations)
+        total += len(recommendations)
+    prune(users)
+    if users:
+        versions.bump(('recommendations', None))
+    return len(users), total
@@ -0,0 +1,157 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Обратный индекс хранится в таблице ``SearchTerm``: для каждой основы
+слова — пост, источник (текст поста или комментарий) и вес. Слова
+приводятся к основе стеммером Портера для русского языка, поэтому
+«котики», «котиков» и «котик» находят одно и то же. Индекс
+обновляется сигналами при сохранении и удалении постов и
+комментариев; ``manage.py rebuild_search_index`` строит его заново.
+"""
+import re
+from collections import Counter
+
+from django.db.models import Count, Sum
+
+from .models import Comment, Post, SearchTerm
+
+POST_WEIGHT = 2
+COMMENT_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а',
+    'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же',
+    'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от',
+    'меня', 'еще', 'нет', 'о', 'из', 'ему', 'ли', 'если', 'или', 'ни',
+    'быть', 'был', 'до', 'вас', 'уже', 'для', 'это', 'the', 'and', 'of',
+))
+
+WORD = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+RV = re.compile(rf'^(.*?[{VOWELS}])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|'
+    r'йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(rf'.*[^{VOWELS}]+[{VOWELS}].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Основа слова по алгоритму Портера для русского языка."""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    without_gerund = PERFECTIVE_GERUND.sub('', rv, 1)
+    if without_gerund != rv:
+        rv = without_gerund
+    else:
+        rv = REFLEXIVE.sub('', rv, 1)
+        without_adjective = ADJECTIVE.sub('', rv, 1)
+        if without_adjective != rv:
+            rv = PARTICIPLE.sub('', without_adjective, 1)
+        else:
+            without_verb = VERB.sub('', rv, 1)
+            rv = without_verb if without_verb != rv else NOUN.sub('', rv, 1)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if DERIVATIONAL.match(rv):
+        rv = DERIVATIONAL_SUFFIX.sub('', rv, 1)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return start + rv
+
+
+def terms(text):
+    """Основы значимых слов текста в порядке появления."""
+    result = []
+    for word in WORD.findall(text.lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        term = stem(word)[:MAX_TERM_LENGTH]
+        if term:
+            result.append(term)
+    return result
+
+
+def _rows(text, weight, **fields):
+    return [
+        SearchTerm(term=term, weight=count * weight, **fields)
+        for term, count in Counter(terms(text)).items()
+    ]
+
+
+def index_post(post):
+    SearchTerm.objects.filter(post=post, comment=None).delete()
+    SearchTerm.objects.bulk_create(_rows(post.text, POST_WEIGHT, post=post))
+
+
+def index_comment(comment):
+    SearchTerm.objects.filter(comment=comment).delete()
+    if comment.post_id is None:
+        return
+    SearchTerm.objects.bulk_create(_rows(
+        comment.text, COMMENT_WEIGHT,
+        post_id=comment.post_id, comment=comment
+    ))
+
+
+def rebuild():
+    SearchTerm.objects.all().delete()
+    for post in Post.objects.only('pk', 'text').iterator():
+        SearchTerm.objects.bulk_create(
+            _rows(post.text, POST_WEIGHT, post=post)
+        )
+    comments = Comment.objects.exclude(post=None).only(
+        'pk', 'post_id', 'text'
+    )
+    for comment in comments.iterator():
+        SearchTerm.objects.bulk_create(_rows(
+            comment.text, COMMENT_WEIGHT,
+            post_id=comment.post_id, comment=comment
+        ))
+
+
+def query_terms(query):
+    return list(dict.fromkeys(terms(query)))[:MAX_QUERY_TERMS]
+
+
+def matching_posts(query):
+    """Id постов, в которых встречаются все слова запроса."""
+    query = query_terms(query)
+    return SearchTerm.objects.filter(term__in=query).values('post').annotate(
+        matched=Count('term', distinct=True)
+    ).filter(matched=len(query)).values('post')
+
+
+def search(queryset, query):
+    """Посты из ``queryset`` со всеми словами запроса, лучшие первыми."""
+    query = query_terms(query)
+    if not query:
+        return queryset.none()
+    return queryset.filter(search_terms__term__in=query).annotate(
+        score=Sum('search_terms__weight'),
+        matched=Count('search_terms__term', distinct=True)
+    ).filter(matched=len(query)).order_by('-score', '-pub_date', '-pk')
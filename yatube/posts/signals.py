@@ -0,0 +1,166 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.tasks import defer
+
+from . import counters, feeds, tasks, thumbnails, versions
+from .graph import graph
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+# Поля пользователя, которые видны в списках постов.
+USER_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields, **kwargs):
+    instance._display_changed = False
+    if instance.pk is None:
+        return
+    if update_fields is not None and not (
+        set(update_fields) & set(USER_DISPLAY_FIELDS)
+    ):
+        return
+    loaded = User.objects.filter(pk=instance.pk).values_list(
+        *USER_DISPLAY_FIELDS
+    ).first()
+    instance._display_changed = loaded is not None and loaded != tuple(
+        getattr(instance, field) for field in USER_DISPLAY_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        # id могли достаться от удалённого пользователя.
+        versions.bump(('follows', instance.pk))
+    elif update_fields != frozenset({'last_login'}):
+        # Имя автора видно в профиле и на страницах его постов; вход
+        # пользователя сохраняет только last_login.
+        versions.bump(('profile', instance.pk))
+    if getattr(instance, '_display_changed', False):
+        # Имя видно и в ленте, и в группах, где он писал.
+        group_ids = Post.objects.filter(author=instance).exclude(
+            group=None
+        ).order_by().values_list('group_id', flat=True).distinct()
+        versions.bump(
+            ('index', None),
+            *(('group', group_id) for group_id in group_ids)
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    defer(tasks.index_post, instance.pk)
+    loaded_image = getattr(instance, '_loaded_image', None) or ''
+    if instance.image and instance.image.name != loaded_image:
+        thumbnails.reset(instance)
+        defer(tasks.make_thumbnails, instance.pk)
+    instance._loaded_image = instance.image.name
+    loaded_author_id = getattr(instance, '_loaded_author_id', None)
+    loaded_group_id = getattr(instance, '_loaded_group_id', None)
+    instance._loaded_author_id = instance.author_id
+    instance._loaded_group_id = instance.group_id
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        counters.change_group(instance.group_id, 1)
+        defer(tasks.fan_out_post, instance.pk)
+        versions.bump_post(instance)
+        return
+    if loaded_group_id != instance.group_id:
+        counters.change_group(loaded_group_id, -1)
+        counters.change_group(instance.group_id, 1)
+    versions.bump_post(instance, [loaded_group_id])
+    if loaded_author_id != instance.author_id:
+        counters.change_user(loaded_author_id, 'posts_count', -1)
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        defer(tasks.move_post, instance.pk)
+        versions.bump(('profile', loaded_author_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, -1)
+    versions.bump_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    loaded_post_id = getattr(instance, '_loaded_post_id', None)
+    if created or loaded_post_id != instance.post_id:
+        counters.change_post(loaded_post_id, -1)
+        counters.change_post(instance.post_id, 1)
+    defer(tasks.index_comment, instance.pk)
+    bump_comment_posts(instance.post_id, loaded_post_id)
+    instance._loaded_post_id = instance.post_id
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+    bump_comment_posts(instance.post_id)
+
+
+def bump_comment_posts(*post_ids):
+    # Число комментариев видно и в списках, поэтому сдвигаются
+    # версии всех лент, где показан пост.
+    for post in Post.objects.filter(pk__in=post_ids).only(
+        'pk', 'author_id', 'group_id'
+    ):
+        versions.bump_post(post)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    versions.bump(('index', None), ('group', instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    loaded = (
+        getattr(instance, '_loaded_user_id', None),
+        getattr(instance, '_loaded_author_id', None),
+    )
+    current = (instance.user_id, instance.author_id)
+    instance._loaded_user_id, instance._loaded_author_id = current
+    if created:
+        follow_added(*current)
+    elif loaded != current:
+        follow_removed(*loaded)
+        follow_added(*current)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follow_removed(instance.user_id, instance.author_id)
+
+
+def follow_added(user_id, author_id):
+    if user_id and author_id:
+        counters.change_user(author_id, 'followers_count', 1)
+        counters.change_user(user_id, 'following_count', 1)
+        defer(tasks.backfill_feed, user_id, author_id)
+        follow_changed(user_id, author_id, True)
+
+
+def follow_removed(user_id, author_id):
+    if user_id and author_id:
+        counters.change_user(author_id, 'followers_count', -1)
+        counters.change_user(user_id, 'following_count', -1)
+        defer(tasks.prune_feed, user_id, author_id)
+        if feeds.left_celebrities(author_id):
+            defer(tasks.backfill_followers, author_id)
+        follow_changed(user_id, author_id, False)
+
+
+def follow_changed(user_id, author_id, added):
+    versions.bump(
+        ('profile', author_id),
+        ('profile', user_id),
+        ('follows', author_id),
+        ('follows', user_id),
+        then=lambda stamps: graph.apply(user_id, author_id, added, stamps)
+    )
@@ -0,0 +1,61 @@
+"""«Кого почитать» на страницах подписок и профиля.
+
+Рекомендации считает пакетный ``manage.py recommend_follows``
+(``posts.recommendations``) и складывает в ``Recommendation``; здесь
+они только читаются — один запрос по индексу ``(user, rank)``. Авторы,
+на которых пользователь подписался после расчёта, отсеиваются по графу
+подписок в памяти (``posts.graph``). Пока рекомендаций нет (новый
+пользователь без подписок), предлагаются самые читаемые авторы.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .graph import graph
+from .models import Recommendation, User, UserStats
+
+POPULAR_KEY = 'suggestions:popular'
+POPULAR_TIMEOUT = 60 * 60
+
+
+def popular_authors():
+    """Id самых читаемых авторов; список живёт в кеше час."""
+    ids = cache.get(POPULAR_KEY)
+    if ids is None:
+        ids = list(UserStats.objects.filter(
+            followers_count__gt=0
+        ).order_by('-followers_count', 'user_id').values_list(
+            'user_id', flat=True
+        )[:settings.RECOMMENDATIONS_TOP_K])
+        cache.set(POPULAR_KEY, ids, POPULAR_TIMEOUT)
+    return ids
+
+
+def for_user(user, exclude=()):
+    """До ``settings.RECOMMENDATIONS_SHOWN`` рекомендаций для ``user``.
+
+    ``exclude`` — id авторов, которых уже видно на странице.
+    """
+    skipped = {user.pk, *exclude}
+
+    def wanted(author_id):
+        return (
+            author_id not in skipped
+            and not graph.is_following(user.pk, author_id)
+        )
+
+    shown = settings.RECOMMENDATIONS_SHOWN
+    suggestions = [
+        recommendation for recommendation in
+        Recommendation.objects.filter(user=user).select_related(
+            'candidate'
+        )[:settings.RECOMMENDATIONS_TOP_K]
+        if wanted(recommendation.candidate_id)
+    ][:shown]
+    if suggestions:
+        return suggestions
+    ids = [pk for pk in popular_authors() if wanted(pk)][:shown]
+    authors = User.objects.in_bulk(ids)
+    return [
+        Recommendation(user=user, candidate=authors[pk])
+        for pk in ids if pk in authors
+    ]
@@ -0,0 +1,83 @@
+"""Фоновые задачи постов (очередь ``core.tasks``).
+
+Задачи получают id и сами читают актуальное состояние: к моменту
+выполнения пост могли изменить или удалить, а подписку — отменить,
+поэтому повтор или выполнение не по порядку не портит данные.
+"""
+from core.tasks import task
+
+from . import feeds, search, thumbnails, versions
+from .models import Comment, Follow, Post
+
+
+@task
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).first()
+    if post is None:
+        return
+    feeds.fan_out(post)
+    # От версии index зависит ETag ленты подписок в API.
+    versions.bump(('index', None))
+
+
+@task
+def move_post(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).first()
+    if post is None:
+        return
+    feeds.move(post)
+    versions.bump(('index', None))
+
+
+@task
+def backfill_feed(user_id, author_id):
+    if not Follow.objects.filter(user_id=user_id,
+                                 author_id=author_id).exists():
+        return
+    feeds.backfill(user_id, author_id)
+    versions.bump(('profile', user_id))
+
+
+@task
+def backfill_followers(author_id):
+    feeds.backfill_followers(author_id)
+    versions.bump(('index', None))
+
+
+@task
+def prune_feed(user_id, author_id):
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        return
+    feeds.prune(user_id, author_id)
+    versions.bump(('profile', user_id))
+
+
+@task
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).only('pk', 'text').first()
+    if post is not None:
+        search.index_post(post)
+
+
+@task
+def index_comment(comment_id):
+    comment = Comment.objects.filter(pk=comment_id).only(
+        'pk', 'post_id', 'text'
+    ).first()
+    if comment is not None:
+        search.index_comment(comment)
+
+
+# Картинки рисуются вне транзакции, даже с TASKS_EAGER: иначе на всё
+# время кодирования запись в SQLite была бы заблокирована.
+@task(atomic=False, eager=False)
+def make_thumbnails(post_id):
+    post = Post.objects.filter(
+        pk=post_id, thumbnail_ready=False
+    ).exclude(image='').first()
+    if post is not None:
+        thumbnails.process(post)
@@ -1,12 +1,14 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import PostForm
 from ..models import Comment, Group, Post
@@ -118,6 +120,97 @@ class PostFormTests(TestCase):
         self.assertEqual(new_post.author, PostFormTests.user)
 
 
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_BYTES=100 * 1024,
+    POST_IMAGE_MAX_PIXELS=1000 * 1000,
+    POST_IMAGE_MAX_FULL_PIXELS=500 * 500,
+    POST_IMAGE_MAX_SIDE=200,
+)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def make_upload(size, image_format='JPEG', **options):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 20, 20)).save(
+            buffer, image_format, **options
+        )
+        return SimpleUploadedFile(
+            name=f'photo.{image_format.lower()}',
+            content=buffer.getvalue(),
+            content_type=f'image/{image_format.lower()}'
+        )
+
+    def make_form(self, upload):
+        return PostForm(
+            data={'text': 'Пост с картинкой'},
+            files={'image': upload}
+        )
+
+    def test_large_image_downsampled(self):
+        ''' Большая картинка уменьшается, EXIF отбрасывается,
+            поворот применяется к пикселям.
+        '''
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Тестовая камера'
+        form = self.make_form(
+            self.make_upload((800, 400), exif=exif.tobytes())
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (100, 200))
+            self.assertFalse(image.getexif())
+
+    def test_small_image_kept(self):
+        ''' Подходящая картинка сохраняется без пересжатия.'''
+        upload = self.make_upload((100, 50), 'PNG')
+        form = self.make_form(upload)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+    def test_limits(self):
+        ''' Слишком тяжёлый файл или слишком много пикселей — ошибка.'''
+        uploads = {
+            'too_many_pixels': self.make_upload((1200, 1000)),
+            'file_too_large': self.make_upload((200, 200), 'BMP'),
+        }
+        for code, upload in uploads.items():
+            with self.subTest(code=code):
+                form = self.make_form(upload)
+                self.assertFalse(form.is_valid())
+                self.assertTrue(form.has_error('image', code))
+
+    def test_full_decode_limit(self):
+        ''' Для форматов без уменьшения при декодировании предел
+            пикселей ниже, чем для JPEG.
+        '''
+        self.assertTrue(
+            self.make_form(self.make_upload((800, 400))).is_valid()
+        )
+        form = self.make_form(self.make_upload((800, 400), 'PNG'))
+        self.assertFalse(form.is_valid())
+        self.assertTrue(form.has_error('image', 'too_many_pixels'))
+
+    def test_palette_image_downsampled(self):
+        ''' Картинка с палитрой и прозрачностью уменьшается в RGBA.'''
+        image = Image.new('P', (400, 200))
+        buffer = BytesIO()
+        image.save(buffer, 'PNG', transparency=0)
+        form = self.make_form(SimpleUploadedFile(
+            name='palette.png', content=buffer.getvalue(),
+            content_type='image/png'
+        ))
+        self.assertTrue(form.is_valid(), form.errors)
+        with Image.open(form.cleaned_data['image']) as result:
+            self.assertEqual(result.size, (200, 100))
+            self.assertEqual(result.mode, 'RGBA')
+
+
 class CommentFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -1,7 +1,30 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.models import Task
 
-from ..models import Comment, Group, Post
+from .. import (
+    counters, digests, ranking, recommendations, transfer, versions
+)
+from ..graph import graph
+from ..management.commands import explain_queries
+from ..models import (
+    Comment, DigestState, FeedEntry, Follow, Group, Post, Recommendation,
+    SearchTerm, UserStats
+)
+from ..tasks import make_thumbnails
 
 User = get_user_model()
 
@@ -103,3 +126,589 @@ class PostModelsTest(TestCase):
             with self.subTest(field=field):
                 help_text_field = Comment._meta.get_field(field).help_text
                 self.assertEqual(help_text_field, help_text)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост длинной более 15 символов',
+            group=CountersTest.group
+        )
+        comment = Comment.objects.create(
+            post=post,
+            author=CountersTest.user,
+            text='Комментарий к тестовому посту'
+        )
+        follow = Follow.objects.create(
+            author=CountersTest.author,
+            user=CountersTest.user
+        )
+        post.refresh_from_db()
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(CountersTest.group.posts_count, 1)
+        author_stats = User.objects.get(pk=CountersTest.author.pk).stats
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(
+            User.objects.get(pk=CountersTest.user.pk).stats.following_count,
+            1
+        )
+        post = Post.objects.get(pk=post.pk)
+        post.group = None
+        post.save()
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        CountersTest.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(CountersTest.group.posts_count, 0)
+        author_stats.refresh_from_db()
+        self.assertEqual(author_stats.followers_count, 0)
+
+    def test_author_changed(self):
+        ''' Пост, переданный другому автору, переходит в его счётчик
+            и в ленты его подписчиков.
+        '''
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=CountersTest.user)
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост длинной более 15 символов',
+        )
+        post = Post.objects.get(pk=post.pk)
+        post.author = CountersTest.user
+        post.save()
+        self.assertEqual(
+            UserStats.objects.get(user=CountersTest.author).posts_count, 0
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=CountersTest.user).posts_count, 1
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=reader, post=post).exists()
+        )
+        call_command('recount', check=True, stdout=StringIO())
+
+    def test_follow_changed(self):
+        ''' Изменённая подписка — отписка от прежнего автора
+            и подписка на нового.
+        '''
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост длинной более 15 символов',
+        )
+        reader = User.objects.create_user(username='reader')
+        follow = Follow.objects.create(
+            user=CountersTest.user, author=CountersTest.author
+        )
+        self.assertTrue(graph.is_following(
+            CountersTest.user.pk, CountersTest.author.pk
+        ))
+        follow = Follow.objects.get(pk=follow.pk)
+        follow.user = reader
+        follow.save()
+        self.assertFalse(
+            FeedEntry.objects.filter(user=CountersTest.user).exists()
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=reader, post=post).exists()
+        )
+        self.assertFalse(graph.is_following(
+            CountersTest.user.pk, CountersTest.author.pk
+        ))
+        self.assertTrue(graph.is_following(reader.pk, CountersTest.author.pk))
+        call_command('recount', check=True, stdout=StringIO())
+
+    def test_recount_command(self):
+        post = Post.objects.create(
+            author=CountersTest.author,
+            text='Тестовый пост длинной более 15 символов',
+        )
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        with self.assertRaises(CommandError):
+            call_command('recount', check=True, stdout=StringIO())
+        call_command('recount', stdout=StringIO())
+        call_command('recount', check=True, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_create_missing_stats(self):
+        UserStats.objects.all().delete()
+        self.assertEqual(counters.create_missing_stats(), 2)
+        self.assertEqual(counters.create_missing_stats(), 0)
+        self.assertEqual(UserStats.objects.count(), 2)
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(author=cls.author, user=cls.user)
+        for num in range(3):
+            post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост номер {num}',
+                group=cls.group
+            )
+            Comment.objects.create(
+                post=post,
+                author=cls.user,
+                text='Комментарий к тестовому посту'
+            )
+
+    def test_feed_queries_use_indexes(self):
+        ''' Запросы лент читают индексы, без полных просмотров.'''
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('Планы запросов в порядке', out.getvalue())
+
+    def test_full_scan_flagged(self):
+        ''' Полный просмотр таблицы считается проблемой.'''
+        command = explain_queries.Command()
+        plan = Post.objects.filter(text__contains='пост').order_by().explain()
+        if connection.vendor == 'sqlite':
+            self.assertTrue(command.check_plan('index', plan))
+        self.assertFalse(command.check_plan('index', 'SEARCH posts_post'))
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Имя'
+        )
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(author=cls.author, user=cls.user)
+        for num in range(5):
+            post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост номер {num}',
+                group=cls.group if num % 2 else None
+            )
+            Comment.objects.create(
+                post=post,
+                author=cls.user,
+                text=f'Комментарий номер {num}'
+            )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return {
+            name: list(model.objects.order_by('pk').values_list(*fields))
+            for name, (model, fields) in transfer.MODELS.items()
+        }
+
+    def clear(self):
+        for model, _ in reversed(list(transfer.MODELS.values())):
+            model.objects.all().delete()
+
+    def test_round_trip(self):
+        ''' Выгрузка и загрузка сохраняют данные, а затем
+            пересчитываются счётчики, поиск, ленты и версии страниц
+            и ставятся в очередь миниатюры.
+        '''
+        Post.objects.filter(text='Тестовый пост номер 0').update(
+            image='posts/imported.jpg'
+        )
+        before = self.snapshot()
+        for data_format in ('ndjson', 'csv'):
+            with self.subTest(data_format=data_format):
+                path = os.path.join(self.directory, data_format)
+                call_command(
+                    'export_data', path, format=data_format,
+                    chunk_size=2, stderr=StringIO()
+                )
+                self.clear()
+                index_version = versions.get('index')
+                post_version = versions.get('post', before['post'][0][0])
+                call_command('import_data', path, chunk_size=2,
+                             stdout=StringIO())
+                self.assertEqual(self.snapshot(), before)
+                self.assertEqual(Post.objects.get(
+                    text='Тестовый пост номер 0'
+                ).comments_count, 1)
+                self.assertTrue(SearchTerm.objects.exists())
+                self.assertEqual(
+                    FeedEntry.objects.filter(user=TransferTest.user).count(),
+                    5
+                )
+                self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+                self.assertGreater(versions.get('index'), index_version)
+                self.assertGreater(
+                    versions.get('post', before['post'][0][0]), post_version
+                )
+                imported = Post.objects.get(image='posts/imported.jpg')
+                self.assertTrue(Task.objects.filter(
+                    name=make_thumbnails.task_name,
+                    args=f'[{imported.pk}]'
+                ).exists())
+
+    def test_resume_from_checkpoint(self):
+        ''' Загрузка продолжается с контрольной точки без дублей.'''
+        path = os.path.join(self.directory, 'data.ndjson')
+        call_command('export_data', path, stderr=StringIO())
+        before = self.snapshot()
+        with open(path, encoding='utf-8') as file:
+            lines = file.readlines()
+        self.clear()
+        # Прервалась после пользователей, группы и двух постов;
+        # третий пост не попал в контрольную точку.
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(lines[:6])
+        call_command('import_data', path, no_finalize=True,
+                     stdout=StringIO())
+        with open(f'{path}.checkpoint', 'w') as file:
+            json.dump({path: 5}, file)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        out = StringIO()
+        call_command('import_data', path, stdout=out)
+        self.assertIn('Продолжение с контрольной точки', out.getvalue())
+        self.assertIn(f'Загружено записей: {len(lines) - 5}',
+                      out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+
+
+@override_settings(
+    DIGEST_MAX_POSTS=2, DIGEST_BATCH_SIZE=2, DIGEST_CONNECTIONS=2
+)
+class DigestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.readers = [
+            User.objects.create_user(
+                username=f'reader{num}', email=f'reader{num}@example.com'
+            )
+            for num in range(5)
+        ]
+        cls.no_email = User.objects.create_user(username='no_email')
+        for user in (*cls.readers, cls.no_email):
+            Follow.objects.create(user=user, author=cls.author)
+        Follow.objects.create(user=cls.readers[0], author=cls.other_author)
+        for num in range(3):
+            Post.objects.create(author=cls.author, text=f'Пост номер {num}')
+        Post.objects.create(author=cls.other_author, text='Пост другого')
+
+    def test_digest_batched(self):
+        ''' Каждый подписчик с почтой получает одно письмо со всеми
+            новыми постами подписок.
+        '''
+        self.assertEqual(digests.send_digests(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        first = next(
+            message for message in mail.outbox
+            if message.to == ['reader0@example.com']
+        )
+        self.assertIn('Пост другого', first.body)
+        self.assertIn('И ещё 2', first.body)
+        self.assertIn('/posts/', first.body)
+        self.assertEqual(
+            DigestState.objects.exclude(last_sent=None).count(), 5
+        )
+
+    def test_rate_limit(self):
+        ''' Следующая сводка — не раньше чем через интервал и только
+            с постами после прошлой.
+        '''
+        now = timezone.now()
+        digests.send_digests(now=now)
+        mail.outbox.clear()
+        Post.objects.create(author=DigestTest.author, text='Свежий пост')
+        self.assertEqual(digests.send_digests(), 0)
+        later = now + timedelta(hours=25)
+        self.assertEqual(digests.send_digests(now=later), 5)
+        self.assertNotIn('Пост номер', mail.outbox[0].body)
+        self.assertIn('Свежий пост', mail.outbox[0].body)
+
+    def test_lookback(self):
+        ''' Давно не получавший сводок узнаёт только о постах последних
+            DIGEST_LOOKBACK_DAYS дней.
+        '''
+        now = timezone.now()
+        DigestState.objects.create(
+            user=DigestTest.readers[0], last_sent=now - timedelta(days=30)
+        )
+        Post.objects.filter(author=DigestTest.author).update(
+            pub_date=now - timedelta(days=10)
+        )
+        digests.send_digests(now=now)
+        body = next(
+            message.body for message in mail.outbox
+            if message.to == ['reader0@example.com']
+        )
+        self.assertIn('Пост другого', body)
+        self.assertNotIn('Пост номер', body)
+        self.assertNotIn('И ещё', body)
+
+    def test_disabled_and_limit(self):
+        ''' Отключившие сводки их не получают; --limit ограничивает
+            число писем.
+        '''
+        DigestState.objects.create(user=DigestTest.readers[0], enabled=False)
+        call_command('send_digests', limit=3, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertNotIn(
+            ['reader0@example.com'], [message.to for message in mail.outbox]
+        )
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{num}')
+            for num in range(4)
+        ]
+        first, second, third, _ = cls.users
+        for user, author in ((first, second), (second, first),
+                             (first, third), (third, second)):
+            Follow.objects.create(user=user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        graph.clear()
+
+    def test_queries(self):
+        ''' Граф отвечает о подписках без запросов к базе,
+            когда массивы загружены.
+        '''
+        first, second, third, fourth = [
+            user.pk for user in FollowGraphTest.users
+        ]
+        graph.following(first)
+        graph.followers(first)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(first, second))
+            self.assertFalse(graph.is_following(first, fourth))
+            self.assertEqual(graph.mutual(first), [second])
+            self.assertEqual(graph.counts(first), (2, 1))
+        self.assertEqual(list(graph.followers(second)), [first, third])
+        self.assertFalse(graph.is_following(None, second))
+
+    def test_incremental_update(self):
+        ''' Своя подписка вносится в массивы без перечитывания,
+            чужая (сдвиг версии) перечитывается из базы.
+        '''
+        first, _, _, fourth = [user.pk for user in FollowGraphTest.users]
+        graph.following(first)
+        graph.followers(fourth)
+        stamps = versions.bump(('follows', first), ('follows', fourth))
+        graph.apply(first, fourth, True, stamps)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(first, fourth))
+            self.assertIn(first, graph.followers(fourth))
+        versions.bump(('follows', first))
+        with self.assertNumQueries(1):
+            self.assertFalse(graph.is_following(first, fourth))
+
+    def test_follow_signals(self):
+        ''' Подписка и отписка сразу видны в графе.'''
+        first, _, _, fourth = FollowGraphTest.users
+        self.assertFalse(graph.is_following(fourth.pk, first.pk))
+        follow = Follow.objects.create(user=fourth, author=first)
+        self.assertTrue(graph.is_following(fourth.pk, first.pk))
+        follow.delete()
+        self.assertFalse(graph.is_following(fourth.pk, first.pk))
+
+
+class VersionsCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        graph.clear()
+
+    def test_bump_after_commit(self):
+        ''' Версия, сдвинутая в транзакции, сдвигается ещё раз после
+            фиксации: страница, собранная до неё, недостижима.
+        '''
+        key = versions.make_key('index')
+        with transaction.atomic():
+            _, during = versions.bump(('index', None))[key]
+            self.assertEqual(versions.get('index'), during)
+        self.assertGreater(versions.get('index'), during)
+
+    def test_graph_after_commit(self):
+        ''' Своя подписка вносится в граф после фиксации без
+            перечитывания.
+        '''
+        user = User.objects.create_user(username='user')
+        author = User.objects.create_user(username='author')
+        self.assertFalse(graph.is_following(user.pk, author.pk))
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(user.pk, author.pk))
+
+
+class RecommendationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in 'abcdefg'
+        }
+        for user, author in ('ab', 'ae', 'bc', 'bd', 'ec', 'fb', 'fg'):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def suggested(self, name):
+        return {
+            recommendation.candidate.username: recommendation
+            for recommendation in Recommendation.objects.filter(
+                user=RecommendationTest.users[name]
+            ).select_related('candidate')
+        }
+
+    def test_recompute(self):
+        ''' Друзья друзей и авторы похожих читателей предлагаются,
+            сам пользователь и его подписки — нет.
+        '''
+        users, total = recommendations.recompute()
+        self.assertEqual(users, 4)
+        self.assertEqual(total, Recommendation.objects.count())
+        suggested = self.suggested('a')
+        self.assertEqual(set(suggested), {'c', 'd', 'g'})
+        self.assertEqual(suggested['c'].rank, 1)
+        self.assertEqual(suggested['c'].mutual, 2)
+        self.assertEqual(suggested['d'].mutual, 1)
+        # g читает f, у которого с a общий автор b.
+        self.assertEqual(suggested['g'].mutual, 0)
+        self.assertGreater(suggested['g'].score, 0)
+        self.assertNotIn('a', self.suggested('f'))
+
+    def test_blocks(self):
+        ''' Расчёт по блокам из одного пользователя совпадает с расчётом
+            одним блоком.
+        '''
+        def snapshot():
+            return sorted(Recommendation.objects.values_list(
+                'user_id', 'candidate_id', 'rank', 'score', 'mutual'
+            ))
+
+        recommendations.recompute(block_size=10 ** 9)
+        whole = snapshot()
+        recommendations.recompute(block_size=1)
+        self.assertEqual(snapshot(), whole)
+
+    def test_top_k_and_prune(self):
+        ''' Хранится не больше top_k рекомендаций, а у отписавшихся
+            от всех они удаляются.
+        '''
+        recommendations.recompute(top_k=1)
+        self.assertEqual(list(self.suggested('a')), ['c'])
+        Follow.objects.filter(user=RecommendationTest.users['f']).delete()
+        call_command('recommend_follows', stdout=StringIO())
+        self.assertEqual(self.suggested('f'), {})
+        self.assertTrue(self.suggested('a'))
+
+
+class RankingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_scores_decay(self):
+        ''' Оценка — затухающая вовлечённость: вдвое больше
+            комментариев уравновешивают пост, вышедший на полураспад
+            позже.
+        '''
+        now = timezone.now()
+        half_life = timedelta(hours=6)
+        with self.settings(TRENDING_HALF_LIFE_HOURS=6,
+                           SCORE_FOLLOWER_WEIGHT=1):
+            old, _ = ranking.scores(now - half_life, 3, 0)
+            new, _ = ranking.scores(now, 1, 0)
+            self.assertAlmostEqual(old, new)
+            older, _ = ranking.scores(now - 2 * half_life, 3, 0)
+            self.assertLess(older, new)
+            # Уровень автора весит как комментарий.
+            self.assertAlmostEqual(
+                ranking.scores(now, 1, 0)[0], ranking.scores(now, 0, 1)[0]
+            )
+
+    def test_update_scores(self):
+        ''' Новые посты и посты с новыми комментариями
+            пересчитываются, остальные не трогаются.
+        '''
+        first = Post.objects.create(author=RankingTest.author, text='Один')
+        second = Post.objects.create(author=RankingTest.author, text='Два')
+        self.assertEqual(ranking.update_scores(), 2)
+        self.assertEqual(ranking.update_scores(), 0)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertFalse(first.score_stale)
+        self.assertGreater(second.trending_score, first.trending_score)
+        for _ in range(3):
+            Comment.objects.create(
+                post=first, author=RankingTest.reader, text='Комментарий'
+            )
+        self.assertEqual(ranking.update_scores(limit=5), 1)
+        first.refresh_from_db()
+        self.assertAlmostEqual(
+            first.trending_score,
+            ranking.scores(first.pub_date, 3, 0)[0]
+        )
+        self.assertGreater(first.trending_score, second.trending_score)
+
+    def test_followers_level(self):
+        ''' Посты пересчитываются, когда у автора меняется уровень
+            (удвоение подписчиков), а не на каждую подписку.
+        '''
+        post = Post.objects.create(author=RankingTest.author, text='Пост')
+        ranking.update_scores()
+        Follow.objects.create(
+            user=RankingTest.reader, author=RankingTest.author
+        )
+        self.assertEqual(ranking.refresh_levels(), 1)
+        self.assertEqual(ranking.update_scores(), 1)
+        stats = UserStats.objects.get(user=RankingTest.author)
+        self.assertEqual(stats.followers_level, 1)
+        post.refresh_from_db()
+        self.assertAlmostEqual(
+            post.popular_score, ranking.scores(post.pub_date, 0, 1)[1]
+        )
+        # 2 подписчика — тот же уровень: пересчитывать нечего.
+        UserStats.objects.filter(user=RankingTest.author).update(
+            followers_count=2
+        )
+        self.assertEqual(ranking.refresh_levels(), 0)
+        call_command('update_scores', '--all', stdout=StringIO())
+        self.assertFalse(Post.objects.filter(score_stale=True).exists())
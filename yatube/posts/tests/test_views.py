@@ -6,10 +6,21 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post
+from core.models import Task
+from core.tasks import run_pending
+
+from .. import feeds, ranking, thumbnails, versions
+from ..graph import graph
+from ..models import (
+    Comment, FeedEntry, Follow, Group, ImageVariant, Post, Recommendation
+)
+from ..tasks import make_thumbnails
 
 User = get_user_model()
 
@@ -177,6 +188,86 @@ class PagesTests(TestCase):
                 self.assertIsInstance(form_field, expected)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост длинной более 15 символов',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=cls.small_gif,
+                content_type='image/gif'
+            )
+        )
+
+    def test_thumbnail_job(self):
+        ''' Миниатюра готовится фоновой задачей, до этого видна заглушка.
+        '''
+        guest_user = Client()
+        url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': ThumbnailTests.post.pk}
+        )
+        self.assertTrue(Task.objects.filter(
+            name=make_thumbnails.task_name,
+            args=f'[{ThumbnailTests.post.pk}]'
+        ).exists())
+        self.assertContains(guest_user.get(url), 'Картинка готовится')
+        run_pending()
+        self.assertFalse(Task.objects.exists())
+        response = guest_user.get(url)
+        self.assertNotContains(response, 'Картинка готовится')
+        self.assertContains(response, '<img class="card-img')
+
+    def test_image_changed(self):
+        ''' Новая картинка снова ставит миниатюры в очередь.'''
+        run_pending()
+        post = Post.objects.get(pk=ThumbnailTests.post.pk)
+        post.image = SimpleUploadedFile(
+            name='other.gif', content=ThumbnailTests.small_gif,
+            content_type='image/gif'
+        )
+        post.save()
+        self.assertFalse(Post.objects.get(pk=post.pk).thumbnail_ready)
+        self.assertFalse(ImageVariant.objects.filter(post=post).exists())
+        run_pending()
+        self.assertTrue(Post.objects.get(pk=post.pk).thumbnail_ready)
+        self.assertTrue(ImageVariant.objects.filter(post=post).exists())
+
+    def test_image_variants(self):
+        ''' Задача нарезает варианты картинки для srcset.'''
+        run_pending()
+        variants = ImageVariant.objects.filter(post=ThumbnailTests.post)
+        formats = thumbnails.variant_formats()
+        self.assertEqual(
+            variants.count(),
+            len(thumbnails.VARIANT_WIDTHS) * len(formats)
+        )
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<picture>')
+        for variant in variants:
+            self.assertContains(
+                response, f'{variant.file.url} {variant.width}w'
+            )
+
+
 class CaheTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -210,6 +301,60 @@ class CaheTests(TestCase):
         second_content = response_new.content
         self.assertNotEqual(first_content, second_content)
 
+    def test_cache_invalidated_on_change(self):
+        ''' Новый пост сразу виден на закешированных страницах.'''
+        cache.clear()
+        guest_user = Client()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'user'}),
+        )
+        for url in urls:
+            guest_user.get(url)
+        Post.objects.create(
+            author=CaheTests.user,
+            text='Самый свежий пост на сайте',
+            group=CaheTests.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = guest_user.get(url)
+                self.assertContains(response, 'Самый свежий пост на сайте')
+
+    def test_cache_invalidated_on_rename(self):
+        ''' Новое имя автора сразу видно в закешированных списках,
+            а вход пользователя их не сбрасывает.
+        '''
+        cache.clear()
+        guest_user = Client()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+        )
+        for url in urls:
+            guest_user.get(url)
+        author = User.objects.get(pk=CaheTests.user.pk)
+        author.first_name = 'Переименованный'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = guest_user.get(url)
+                self.assertContains(response, 'Переименованный')
+        version = versions.get('index')
+        author.save(update_fields=['last_login'])
+        self.assertEqual(versions.get('index'), version)
+
+    def test_cache_shared_by_guests(self):
+        ''' Анонимные пользователи получают одну запись кеша.'''
+        cache.clear()
+        Client().get(reverse('posts:index'))
+        Post.objects.filter(author=CaheTests.user).update(
+            text='Изменено в обход сигналов'
+        )
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'Изменено в обход сигналов')
+
 
 class PaginatorViewsTests(TestCase):
     @classmethod
@@ -252,6 +397,34 @@ class PaginatorViewsTests(TestCase):
         ))
         self.assertEqual(len(response.context['page_obj']), self.post_per_page)
 
+    def test_index_ranked_modes(self):
+        ''' «В тренде» и «Популярное»: посты по оценкам, курсор
+            следующей страницы сохраняет режим.
+        '''
+        cache.clear()
+        ranking.update_scores()
+        posts = list(Post.objects.order_by('pk'))
+        Post.objects.filter(pk=posts[0].pk).update(
+            trending_score=10 ** 6, popular_score=10 ** 6
+        )
+        for mode in ranking.MODES:
+            with self.subTest(mode=mode):
+                response = self.request_user.get(
+                    reverse('posts:index'), {'mode': mode}
+                )
+                page_obj = response.context['page_obj']
+                self.assertEqual(page_obj[0], posts[0])
+                self.assertContains(response, f'?mode={mode}&amp;cursor=')
+                response = self.request_user.get(reverse('posts:index'), {
+                    'mode': mode, 'cursor': page_obj.paginator.next_cursor
+                })
+                self.assertEqual(len(response.context['page_obj']), 3)
+                self.assertNotIn(posts[0], response.context['page_obj'])
+        response = self.request_user.get(
+            reverse('posts:index'), {'mode': 'unknown'}
+        )
+        self.assertIsNone(response.context['mode'])
+
     def test_follow_index_posts(self):
         ''' Паджинатор на странице подписок.'''
         response = self.request_user.get(reverse('posts:follow_index'))
@@ -265,6 +438,401 @@ class PaginatorViewsTests(TestCase):
         ))
         self.assertEqual(len(response.context['page_obj']), self.post_per_page)
 
+    def test_cursor_pages(self):
+        ''' Переход по курсорам паджинатора вперёд и назад.'''
+        url = reverse('posts:index')
+        first_page = self.request_user.get(url).context['page_obj']
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        second_page = self.request_user.get(url, {
+            'cursor': first_page.paginator.next_cursor
+        }).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        seen = [post.pk for post in first_page] + [
+            post.pk for post in second_page
+        ]
+        self.assertEqual(len(set(seen)), 13)
+        previous_page = self.request_user.get(url, {
+            'cursor': second_page.paginator.previous_cursor
+        }).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in previous_page],
+            [post.pk for post in first_page]
+        )
+
+    def test_invalid_cursor(self):
+        ''' Битый курсор открывает первую страницу.'''
+        response = self.request_user.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(len(response.context['page_obj']), self.post_per_page)
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author',
+            first_name='Имя',
+            last_name='Фамилия'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_user = Client()
+        cache.clear()
+
+    def create_posts(self, count):
+        for num in range(count):
+            post = Post.objects.create(
+                author=QueryCountTests.author,
+                text=f'Тестовый пост номер {num}',
+                group=QueryCountTests.group
+            )
+            Comment.objects.create(
+                post=post,
+                author=QueryCountTests.author,
+                text='Комментарий к тестовому посту'
+            )
+
+    def test_list_pages_query_count(self):
+        ''' Число запросов страницы со списком постов не зависит
+            от числа постов на ней.
+        '''
+        urls = {
+            reverse('posts:index'): 2,
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': QueryCountTests.group.slug}
+            ): 3,
+            reverse(
+                'posts:profile',
+                kwargs={'username': QueryCountTests.author.username}
+            ): 3,
+        }
+        for posts_count in (1, 10):
+            self.create_posts(posts_count)
+            for url, queries in urls.items():
+                with self.subTest(url=url, posts_count=posts_count):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        self.guest_user.get(url)
+
+    def test_cached_list_pages_query_count(self):
+        ''' При попадании в кеш страница постов не выбирается:
+            остаются запросы группы и автора для версии страницы.
+        '''
+        self.create_posts(3)
+        urls = {
+            reverse('posts:index'): 0,
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': QueryCountTests.group.slug}
+            ): 1,
+            reverse(
+                'posts:profile',
+                kwargs={'username': QueryCountTests.author.username}
+            ): 1,
+        }
+        for url, queries in urls.items():
+            with self.subTest(url=url):
+                self.guest_user.get(url)
+                with self.assertNumQueries(queries):
+                    self.guest_user.get(url)
+
+
+class TransactionScopeTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        self.client.force_login(self.author)
+        self.queries = []
+
+    def record(self, execute, sql, params, many, context):
+        self.queries.append((sql, connection.in_atomic_block))
+        return execute(sql, params, many, context)
+
+    def request(self, method, *args):
+        with connection.execute_wrapper(self.record):
+            return method(reverse('posts:post_create'), *args)
+
+    def test_get_outside_transaction(self):
+        ''' Страница формы не открывает транзакцию: на SQLite она
+            берёт блокировку записи.
+        '''
+        self.request(self.client.get)
+        self.assertTrue(self.queries)
+        self.assertEqual(
+            [sql for sql, atomic in self.queries if atomic], []
+        )
+
+    def test_only_save_in_transaction(self):
+        ''' Проверка формы идёт вне транзакции, в транзакции
+            только сохранение поста.
+        '''
+        self.request(
+            self.client.post, {'text': 'Текст', 'group': self.group.pk}
+        )
+        self.assertTrue(Post.objects.filter(text='Текст').exists())
+        outside = [sql for sql, atomic in self.queries if not atomic]
+        inside = [sql for sql, atomic in self.queries if atomic]
+        self.assertTrue(any('"posts_group"' in sql for sql in outside))
+        self.assertTrue(
+            any(sql.startswith('INSERT INTO "posts_post"') for sql in inside)
+        )
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост длинной более 15 символов'
+        )
+
+    def setUp(self):
+        self.guest_user = Client()
+        cache.clear()
+
+    def create_comments(self, count):
+        start = Comment.objects.count()
+        for num in range(start, start + count):
+            Comment.objects.create(
+                post=CommentsPaginationTests.post,
+                author=User.objects.create_user(username=f'reader{num}'),
+                text=f'Комментарий номер {num}'
+            )
+
+    def test_post_detail_query_count(self):
+        ''' Число запросов страницы поста не зависит
+            от числа комментариев.
+        '''
+        url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': CommentsPaginationTests.post.pk}
+        )
+        for comments_count in (1, 12):
+            self.create_comments(comments_count)
+            with self.subTest(comments_count=comments_count):
+                cache.clear()
+                # Автор и группа для версии страницы, пост, комментарии.
+                with self.assertNumQueries(3):
+                    self.guest_user.get(url)
+
+    def test_comments_pages(self):
+        ''' Комментарии догружаются по курсору в порядке добавления.'''
+        self.create_comments(12)
+        response = self.guest_user.get(reverse(
+            'posts:post_detail',
+            kwargs={'post_id': CommentsPaginationTests.post.pk}
+        ))
+        self.assertContains(response, 'Комментарий номер 4')
+        self.assertNotContains(response, 'Комментарий номер 5')
+        self.assertContains(response, 'Показать ещё комментарии')
+        url = reverse(
+            'posts:comments',
+            kwargs={'post_id': CommentsPaginationTests.post.pk}
+        )
+        cursor = response.context['page_obj'].paginator.next_cursor
+        texts = []
+        while cursor:
+            data = self.guest_user.get(url, {'cursor': cursor}).json()
+            texts.append(data['html'])
+            cursor = data['next_cursor']
+        self.assertEqual(len(texts), 2)
+        self.assertIn('Комментарий номер 5', texts[0])
+        self.assertIn('Комментарий номер 11', texts[1])
+        self.assertNotIn('Комментарий номер 9', texts[1])
+
+
+class ConditionalResponseTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост длинной более 15 символов',
+            group=cls.group
+        )
+
+    def setUp(self):
+        self.guest_user = Client()
+        self.authorized_user = Client()
+        self.authorized_user.force_login(ConditionalResponseTests.author)
+        cache.clear()
+
+    def urls(self):
+        return {
+            reverse('posts:index'): 0,
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': ConditionalResponseTests.group.slug}
+            ): 1,
+            reverse(
+                'posts:profile',
+                kwargs={'username': ConditionalResponseTests.author.username}
+            ): 1,
+            reverse(
+                'posts:post_detail',
+                kwargs={'post_id': ConditionalResponseTests.post.pk}
+            ): 1,
+        }
+
+    def test_not_modified(self):
+        ''' Повторный запрос с ETag или датой получает 304
+            без выборки постов.
+        '''
+        for url, queries in self.urls().items():
+            with self.subTest(url=url):
+                response = self.guest_user.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                with self.assertNumQueries(queries):
+                    response = self.guest_user.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.guest_user.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_modified_after_change(self):
+        ''' Новый комментарий меняет ETag всех страниц с постом.'''
+        etags = {
+            url: self.guest_user.get(url)['ETag'] for url in self.urls()
+        }
+        Comment.objects.create(
+            post=ConditionalResponseTests.post,
+            author=ConditionalResponseTests.author,
+            text='Новый комментарий'
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_user.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_page_modified_by_author_and_group(self):
+        ''' Страница поста показывает автора, число его постов и группу:
+            новый пост автора, правка автора и группы меняют её ETag.
+        '''
+        url = reverse(
+            'posts:post_detail',
+            kwargs={'post_id': ConditionalResponseTests.post.pk}
+        )
+        author = ConditionalResponseTests.author
+        author.first_name = 'Автор'
+        changes = (
+            lambda: Post.objects.create(author=author, text='Ещё пост'),
+            author.save,
+            ConditionalResponseTests.group.save,
+        )
+        for change in changes:
+            etag = self.guest_user.get(url)['ETag']
+            change()
+            response = self.guest_user.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_authorized_private(self):
+        ''' Страница вошедшего пользователя не совпадает с гостевой
+            и не хранится в общих кешах.
+        '''
+        for url in self.urls():
+            with self.subTest(url=url):
+                guest = self.guest_user.get(url)
+                response = self.authorized_user.get(
+                    url, HTTP_IF_NONE_MATCH=guest['ETag'],
+                    HTTP_IF_MODIFIED_SINCE=guest['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotIn('Last-Modified', response)
+                response = self.authorized_user.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Котики любят тёплое молоко'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.user,
+            text='Собаки любят гулять'
+        )
+        Comment.objects.create(
+            post=cls.other_post,
+            author=cls.user,
+            text='А ещё собаки грызут кости'
+        )
+
+    def setUp(self):
+        self.guest_user = Client()
+
+    def search(self, query):
+        response = self.guest_user.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_stemming(self):
+        ''' Поиск находит посты по разным формам слова.'''
+        self.assertEqual(self.search('котика'), [SearchTests.post])
+        self.assertEqual(self.search('Молоком котиков'), [SearchTests.post])
+
+    def test_search_comments(self):
+        ''' Поиск учитывает текст комментариев.'''
+        self.assertEqual(self.search('кость'), [SearchTests.other_post])
+
+    def test_search_ranking(self):
+        ''' Пост, где слово встречается чаще, выше в выдаче.'''
+        newer_post = Post.objects.create(
+            author=SearchTests.user,
+            text='Собаки спят'
+        )
+        self.assertEqual(
+            self.search('собака'), [SearchTests.other_post, newer_post]
+        )
+
+    def test_search_index_updates(self):
+        ''' Индекс обновляется при редактировании и удалении.'''
+        post = Post.objects.create(
+            author=SearchTests.user,
+            text='Жирафы едят листья'
+        )
+        self.assertEqual(self.search('жираф'), [post])
+        post.text = 'Слоны едят листья'
+        post.save()
+        self.assertEqual(self.search('жираф'), [])
+        post.delete()
+        self.assertEqual(self.search('слоны'), [])
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -304,6 +872,25 @@ class FollowTests(TestCase):
             subscribers_count + 1
         )
 
+    def test_follow_button_reads_own_follow(self):
+        ''' Кнопка на профиле видит подписку, о которой граф
+            процесса ещё не знает (подписались в другом процессе).
+        '''
+        cache.clear()
+        graph.clear()
+        url = reverse(
+            'posts:profile', kwargs={'username': FollowTests.author.username}
+        )
+        self.assertContains(self.request_user.get(url), 'Подписаться')
+        self.assertFalse(
+            graph.is_following(FollowTests.user.pk, FollowTests.author.pk)
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=FollowTests.user, author=FollowTests.author)]
+        )
+        versions.bump(('profile', FollowTests.author.pk))
+        self.assertContains(self.request_user.get(url), 'Отписаться')
+
     def test_following_author_guest_user(self):
         ''' Подписка на автора анонимным пользователем.'''
         subscribers_count = Follow.objects.filter(
@@ -400,3 +987,150 @@ class FollowTests(TestCase):
         context = response.context
         self.assertIsNone(context)
         self.assertRedirects(response, f'{login_url}?next={follow_url}')
+
+    def test_follow_feed_fan_out(self):
+        ''' Новый пост раскладывается в ленты подписчиков,
+            отписка убирает посты автора из ленты.
+        '''
+        Follow.objects.create(
+            author=FollowTests.author,
+            user=FollowTests.user
+        )
+        post = Post.objects.create(
+            author=FollowTests.author,
+            text='Тестовый пост длинной более 15 символов'
+        )
+        self.assertTrue(FeedEntry.objects.filter(
+            user=FollowTests.user, post=post
+        ).exists())
+        self.request_user.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': FollowTests.author.username})
+        )
+        self.assertFalse(FeedEntry.objects.filter(
+            user=FollowTests.user
+        ).exists())
+
+    @override_settings(TASKS_EAGER=False, TASK_WORKERS=0)
+    def test_follow_feed_deferred(self):
+        ''' Раскладка по лентам выполняется фоновой задачей.'''
+        Follow.objects.create(
+            author=FollowTests.author,
+            user=FollowTests.user
+        )
+        post = Post.objects.create(
+            author=FollowTests.author,
+            text='Тестовый пост длинной более 15 символов'
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        run_pending()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=FollowTests.user, post=post
+        ).exists())
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=1)
+    def test_follow_feed_celebrity(self):
+        ''' Посты популярных авторов не раскладываются,
+            а подмешиваются в ленту при чтении.
+        '''
+        Follow.objects.create(
+            author=FollowTests.author,
+            user=FollowTests.user
+        )
+        post = Post.objects.create(
+            author=FollowTests.author,
+            text='Тестовый пост длинной более 15 символов'
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        response = self.request_user.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+    def test_follow_feed_after_celebrity(self):
+        ''' Посты, написанные при большом числе подписчиков, остаются
+            в ленте, когда автор опускается ниже порога.
+        '''
+        other = User.objects.create_user(username='other')
+        for user in (FollowTests.user, other):
+            Follow.objects.create(author=FollowTests.author, user=user)
+        post = Post.objects.create(
+            author=FollowTests.author,
+            text='Тестовый пост длинной более 15 символов'
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=FollowTests.user, post=post
+        ).exists())
+        response = self.request_user.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(FEED_BACKFILL_SIZE=feeds.FAN_OUT_BATCH_SIZE + 1)
+    def test_follow_feed_backfill_batches(self):
+        ''' Ленту заполняет больше записей, чем в одной пачке вставки.'''
+        Post.objects.bulk_create(
+            Post(author=FollowTests.author, text=f'Пост {i}')
+            for i in range(feeds.FAN_OUT_BATCH_SIZE + 1)
+        )
+        Follow.objects.create(
+            author=FollowTests.author,
+            user=FollowTests.user
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=FollowTests.user).count(),
+            feeds.FAN_OUT_BATCH_SIZE + 1
+        )
+
+    def test_follow_feed_pages(self):
+        ''' Лента подписок листается курсором по записям ленты.'''
+        Follow.objects.create(
+            author=FollowTests.author,
+            user=FollowTests.user
+        )
+        posts = [
+            Post.objects.create(author=FollowTests.author, text=f'Пост {i}')
+            for i in range(settings.POSTS_PER_PAGE + 1)
+        ]
+        url = reverse('posts:follow_index')
+        response = self.request_user.get(url)
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), posts[:0:-1])
+        response = self.request_user.get(
+            url, {'cursor': page_obj.paginator.next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), posts[:1])
+
+    def test_follow_suggestions(self):
+        ''' «Кого почитать» на странице подписок и своём профиле:
+            рассчитанные рекомендации, без тех, на кого уже подписан,
+            а без рекомендаций — самые читаемые авторы.
+        '''
+        cache.clear()
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=FollowTests.author)
+        Recommendation.objects.create(
+            user=FollowTests.user, candidate=reader, rank=1, score=2,
+            mutual=2
+        )
+        pages = (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=[FollowTests.user.username]),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.request_user.get(page)
+                suggested = response.context['suggestions']
+                self.assertEqual(
+                    [item.candidate for item in suggested], [reader]
+                )
+                self.assertContains(response, 'Кого почитать')
+        Follow.objects.create(user=FollowTests.user, author=reader)
+        response = self.request_user.get(pages[0])
+        self.assertEqual(
+            [item.candidate for item in response.context['suggestions']],
+            [FollowTests.author]
+        )
+        response = self.request_user.get(
+            reverse('posts:profile', args=[FollowTests.author.username])
+        )
+        self.assertNotIn('suggestions', response.context)
@@ -0,0 +1,106 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Раньше миниатюра рисовалась тегом ``{% thumbnail %}`` при первом показе
+поста, прямо внутри запроса. Теперь сохранение поста с новой картинкой
+ставит задачу ``posts.tasks.make_thumbnails`` в очередь ``core.tasks``.
+Пока миниатюра не готова, шаблоны показывают заглушку.
+
+Вместе с миниатюрой задача готовит набор вариантов картинки
+(``ImageVariant``) нескольких ширин и форматов для ``srcset``: телефон
+скачивает 480-пиксельную копию вместо 960-пиксельной. AVIF и WebP
+пишутся, только если их умеет сборка Pillow, JPEG есть всегда.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from sorl.thumbnail import get_thumbnail
+
+from . import versions
+from .models import ImageVariant, Post
+
+# Геометрии, которые используют шаблоны постов.
+GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Ширины вариантов для srcset; пропорции те же, что у миниатюры 960x339.
+VARIANT_WIDTHS = (480, 768, 960)
+VARIANT_RATIO = 339 / 960
+VARIANT_QUALITY = {'AVIF': 50, 'WEBP': 75, 'JPEG': 80}
+
+
+def variant_formats():
+    """Форматы из ``ImageVariant.FORMATS``, которые умеет писать Pillow."""
+    Image.init()
+    return [name for name in ImageVariant.FORMATS if name in Image.SAVE]
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    options = {'quality': VARIANT_QUALITY[image_format]}
+    if image_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        options.update(method=6)
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def delete_variants(post):
+    for variant in ImageVariant.objects.filter(post=post):
+        variant.file.delete(save=False)
+        variant.delete()
+
+
+def make_variants(post):
+    """Нарезать варианты картинки поста; вернуть список ``ImageVariant``."""
+    delete_variants(post)
+    post.image.open()
+    try:
+        source = Image.open(post.image)
+        source = ImageOps.exif_transpose(source).convert('RGB')
+    finally:
+        post.image.close()
+    name = os.path.splitext(os.path.basename(post.image.name))[0]
+    variants = []
+    for width in VARIANT_WIDTHS:
+        image = ImageOps.fit(
+            source, (width, round(width * VARIANT_RATIO)),
+            Image.LANCZOS
+        )
+        for image_format in variant_formats():
+            content = _encode(image, image_format)
+            variant = ImageVariant(
+                post=post, width=width, format=image_format,
+                size=len(content)
+            )
+            variant.file.save(
+                f'{name}-{width}.{image_format.lower()}',
+                ContentFile(content), save=False
+            )
+            variant.save()
+            variants.append(variant)
+    return variants
+
+
+def reset(post):
+    """Отметить, что миниатюры картинки поста ещё не готовы.
+
+    Сами миниатюры готовит задача ``posts.tasks.make_thumbnails``.
+    """
+    Post.objects.filter(pk=post.pk).update(thumbnail_ready=False)
+    post.thumbnail_ready = False
+    delete_variants(post)
+
+
+def process(post):
+    """Нарисовать миниатюры и варианты картинки поста."""
+    for geometry, options in GEOMETRIES:
+        get_thumbnail(post.image, geometry, **options)
+    make_variants(post)
+    # Если картинку успели сменить, готовность отметит задача новой.
+    Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnail_ready=True
+    )
+    versions.bump_post(post)
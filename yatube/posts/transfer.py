@@ -0,0 +1,251 @@
+"""Потоковая выгрузка и загрузка данных сайта (NDJSON и CSV).
+
+В отличие от ``dumpdata``/``loaddata`` записи не собираются в память
+целиком: выгрузка читает таблицы через ``iterator(chunk_size=...)``,
+загрузка вставляет пачки по ``chunk_size`` строк через ``bulk_create``.
+Первичные ключи сохраняются, а повтор уже загруженной строки
+пропускается (``ignore_conflicts``), поэтому загрузку можно безопасно
+продолжить с контрольной точки — файла с числом загруженных строк
+каждого источника, который обновляется после каждой пачки.
+
+NDJSON — один файл, строка на запись с полем ``model``. CSV — каталог
+с файлом на каждую модель. Модели идут в порядке зависимостей:
+пользователи, группы, посты, комментарии, подписки.
+"""
+import csv
+import json
+import os
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from core.tasks import defer
+
+from . import counters, feeds, search, tasks, versions
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 2000
+# Выгружаемые поля моделей. Пароли пользователей не выгружаются:
+# загруженные пользователи входят после сброса пароля.
+MODELS = {
+    'user': (User, ('id', 'username', 'first_name', 'last_name',
+                    'email', 'date_joined')),
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, ('id', 'text', 'pub_date', 'author_id', 'group_id',
+                    'image')),
+    'comment': (Comment, ('id', 'post_id', 'author_id', 'text',
+                          'created')),
+    'follow': (Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+def _rows(name, chunk_size):
+    model, fields = MODELS[name]
+    queryset = model._default_manager.order_by('pk').values_list(*fields)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, (
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        )))
+
+
+def export_ndjson(stream, names=MODELS, chunk_size=CHUNK_SIZE):
+    """Записать модели ``names`` в ``stream``; вернуть число строк."""
+    count = 0
+    for name in names:
+        for row in _rows(name, chunk_size):
+            stream.write(json.dumps(
+                {'model': name, **row}, ensure_ascii=False
+            ) + '\n')
+            count += 1
+    return count
+
+
+def export_csv(directory, names=MODELS, chunk_size=CHUNK_SIZE):
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for name in names:
+        path = os.path.join(directory, f'{name}.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, MODELS[name][1])
+            writer.writeheader()
+            for row in _rows(name, chunk_size):
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def read_ndjson(path):
+    """Записи файла NDJSON: ``(источник, модель, поля)``."""
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield path, record.pop('model'), record
+
+
+def read_csv(directory):
+    for name in MODELS:
+        path = os.path.join(directory, f'{name}.csv')
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf-8') as file:
+            for record in csv.DictReader(file):
+                yield path, name, record
+
+
+class Checkpoint:
+    """Число загруженных строк по источникам, в JSON-файле."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path) as file:
+                self.done = json.load(file)
+
+    def save(self):
+        if not self.path:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.done, file)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+@contextmanager
+def explicit_dates():
+    """Сохранить даты из файла, а не текущее время ``auto_now_add``."""
+    fields = [
+        field
+        for model, _ in MODELS.values()
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _build(name, record):
+    model, fields = MODELS[name]
+    values = {}
+    for field_name in fields:
+        field = model._meta.get_field(field_name)
+        value = record.get(field_name)
+        if value in ('', None) and field.null:
+            value = None
+        elif field.is_relation:
+            value = field.target_field.to_python(value)
+        else:
+            value = field.to_python(value)
+        values[field.attname] = value
+    if name == 'user':
+        values['password'] = '!'
+    return model(**values)
+
+
+def _flush(source, name, objects, checkpoint):
+    if not objects:
+        return
+    model = MODELS[name][0]
+    with transaction.atomic():
+        model._default_manager.bulk_create(objects, ignore_conflicts=True)
+    checkpoint.done[source] = checkpoint.done.get(source, 0) + len(objects)
+    checkpoint.save()
+
+
+def import_records(records, checkpoint, chunk_size=CHUNK_SIZE):
+    """Загрузить записи пачками; вернуть число обработанных строк.
+
+    Строки, учтённые в ``checkpoint``, пропускаются без разбора.
+    """
+    seen = {}
+    batch, batch_key = [], None
+    loaded = 0
+    with explicit_dates():
+        for source, name, record in records:
+            seen[source] = seen.get(source, 0) + 1
+            if seen[source] <= checkpoint.done.get(source, 0):
+                continue
+            if batch and (batch_key != (source, name)
+                          or len(batch) >= chunk_size):
+                _flush(*batch_key, batch, checkpoint)
+                loaded += len(batch)
+                batch = []
+            batch_key = (source, name)
+            batch.append(_build(name, record))
+        if batch:
+            _flush(*batch_key, batch, checkpoint)
+            loaded += len(batch)
+    return loaded
+
+
+def _chunked(values, size):
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bump_versions(chunk_size=CHUNK_SIZE):
+    """Сдвинуть версии всех страниц: загрузка обходит сигналы, и без
+    этого кешированные фрагменты и ответы 304 остались бы прежними."""
+    versions.bump(*((scope, None) for scope in versions.GLOBAL_SCOPES))
+    for model, scopes in ((User, ('profile', 'follows')),
+                          (Group, ('group',)),
+                          (Post, ('post',))):
+        pks = model._default_manager.values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=chunk_size)
+        for chunk in _chunked(pks, chunk_size):
+            versions.bump(*(
+                (scope, pk) for pk in chunk for scope in scopes
+            ))
+
+
+def enqueue_thumbnails(chunk_size=CHUNK_SIZE):
+    """Поставить в очередь миниатюры загруженных картинок."""
+    post_ids = Post.objects.exclude(image='').filter(
+        thumbnail_ready=False
+    ).values_list('pk', flat=True)
+    count = 0
+    for post_id in post_ids.iterator(chunk_size=chunk_size):
+        defer(tasks.make_thumbnails, post_id)
+        count += 1
+    return count
+
+
+def finalize():
+    """Сделать то, что при обычном сохранении делают сигналы моделей."""
+    models = [model for model, _ in MODELS.values()]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    with transaction.atomic():
+        counters.create_missing_stats()
+        counters.recount()
+    with transaction.atomic():
+        search.rebuild()
+    follows = Follow.objects.exclude(user=None).exclude(author=None)
+    for user_id, author_id in follows.values_list(
+            'user_id', 'author_id').iterator(chunk_size=CHUNK_SIZE):
+        feeds.backfill(user_id, author_id)
+    enqueue_thumbnails()
+    bump_versions()
@@ -0,0 +1,144 @@
+"""Обработка загруженных картинок постов с ограниченной памятью.
+
+Загрузки пишутся во временный файл на диске (``FILE_UPLOAD_HANDLERS``),
+а не в память. Перед декодированием по заголовку проверяются размер
+файла и число пикселей (для форматов, которые декодируются целиком, —
+меньший предел). Слишком большие оригиналы уменьшаются: JPEG — ещё при
+декодировании (``Image.draft``), остальные форматы — целым шагом
+``Image.reduce`` и затем ``thumbnail``. Метаданные EXIF (в том
+числе геотеги) при пересохранении отбрасываются, поворот из EXIF
+применяется к самим пикселям.
+"""
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+# Поворот картинки в EXIF (тег Orientation).
+EXIF_ORIENTATION = 0x0112
+TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+# Форматы, которые сохраняются как есть, если не нужно уменьшение:
+# анимацию GIF пересохранение бы потеряло.
+SAVE_FORMATS = {'JPEG': 'JPEG', 'MPO': 'JPEG', 'PNG': 'PNG', 'GIF': 'GIF'}
+# Форматы, которые Image.draft уменьшает ещё при декодировании.
+DRAFT_FORMATS = ('JPEG', 'MPO')
+# Режимы, которые Image.reduce усредняет без перевода в RGB: палитру
+# и 1-битные картинки приходится сначала развернуть.
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK')
+
+
+def _check_size(upload):
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл слишком большой: %(size)s, можно не больше %(limit)s.',
+            code='file_too_large',
+            params={
+                'size': filesizeformat(upload.size),
+                'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES),
+            },
+        )
+
+
+def _check_pixels(image):
+    width, height = image.size
+    limit = settings.POST_IMAGE_MAX_PIXELS
+    if image.format not in DRAFT_FORMATS:
+        # Такие картинки целиком разворачиваются в памяти.
+        limit = min(limit, settings.POST_IMAGE_MAX_FULL_PIXELS)
+    if width * height > limit:
+        raise ValidationError(
+            'Слишком большая картинка: %(width)s×%(height)s пикселей.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def _needs_processing(image):
+    return (
+        max(image.size) > settings.POST_IMAGE_MAX_SIDE
+        or bool(image.getexif())
+        or image.format not in SAVE_FORMATS
+    )
+
+
+def _decode(image):
+    """Декодировать картинку не крупнее ``POST_IMAGE_MAX_SIDE``."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    orientation = image.getexif().get(EXIF_ORIENTATION)
+    icc_profile = image.info.get('icc_profile')
+    if image.format in DRAFT_FORMATS:
+        # Масштабирование 1/2…1/8 прямо в декодере DCT: полноразмерный
+        # растр в памяти не появляется.
+        scale = max(max(image.size) / max_side, 1)
+        image.draft('RGB', (int(image.width / scale),
+                            int(image.height / scale)))
+    transparent = (
+        'A' in image.getbands() or 'transparency' in image.info
+    )
+    mode = 'RGBA' if transparent else 'RGB'
+    # Перевод в RGB(A) — после уменьшения: копия полноразмерного растра
+    # удвоила бы пиковую память. Прозрачный цвет (``transparency``)
+    # усреднение потеряло бы, такие картинки переводятся сразу.
+    if image.mode not in REDUCE_MODES or 'transparency' in image.info:
+        image = image.convert(mode)
+    factor = max(image.size) // max_side
+    if factor > 1:
+        image = image.reduce(factor)
+    if image.mode != mode:
+        image = image.convert(mode)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if orientation in TRANSPOSE:
+        image = image.transpose(TRANSPOSE[orientation])
+    # Если хватило draft, растр ещё не прочитан, а файл закроется
+    # сразу после декодирования.
+    image.load()
+    # Из метаданных остаётся только цветовой профиль.
+    image.info = {'icc_profile': icc_profile} if icc_profile else {}
+    return image
+
+
+def process_image(upload):
+    """Проверить загрузку и при необходимости пересохранить её.
+
+    Возвращает исходный файл, если он уже годится, или новый
+    временный файл без EXIF и не крупнее ``POST_IMAGE_MAX_SIDE``.
+    """
+    if not isinstance(upload, UploadedFile):
+        # Картинка уже сохранена у поста и не менялась.
+        return upload
+    _check_size(upload)
+    upload.seek(0)
+    with Image.open(upload) as image:
+        _check_pixels(image)
+        if not _needs_processing(image):
+            upload.seek(0)
+            return upload
+        save_format = SAVE_FORMATS.get(image.format, 'PNG')
+        image = _decode(image)
+    if save_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    name, _ = os.path.splitext(upload.name)
+    name = f'{name}.{save_format.lower().replace("jpeg", "jpg")}'
+    result = TemporaryUploadedFile(
+        name, Image.MIME[save_format], 0, None
+    )
+    options = {'optimize': True, **image.info}
+    if save_format == 'JPEG':
+        options.update(quality=90, progressive=True)
+    image.save(result, save_format, **options)
+    result.size = result.tell()
+    result.seek(0)
+    result.image = image
+    return result
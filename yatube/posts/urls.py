@@ -6,6 +6,7 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', (views.index), name='index'),
+    path('search/', views.search_posts, name='search'),
     path(
         'group/<slug:slug>/',
         views.group_posts,
@@ -21,6 +22,11 @@ urlpatterns = [
         views.post_detail,
         name='post_detail'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='comments'
+    ),
     path(
         'create/',
         views.post_create,
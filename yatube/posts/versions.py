@@ -0,0 +1,103 @@
+"""Версии (поколения) кешированных страниц.
+
+У каждой ленты есть версия в кеше: ``index``, ``group:<pk>``,
+``profile:<pk>``, ``post:<pk>``. Версия входит в ключ кеша фрагмента,
+поэтому изменение поста, комментария, группы или подписки просто
+сдвигает версию, а старые записи больше не читаются и вытесняются
+сами. Это позволяет хранить фрагменты долго, не показывая устаревшее.
+Версию ``follows:<pk>`` подписок пользователя проверяет граф подписок
+в памяти процесса (``posts.graph``).
+
+Версия — время последнего изменения в микросекундах, так что её же
+можно отдавать как ``Last-Modified``. В общем кеше версии бессрочные,
+в locmem процесса — ``settings.VERSIONS_TIMEOUT`` секунд.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'version'
+# Версии без pk: общие для всего сайта.
+GLOBAL_SCOPES = ('index', 'ranking', 'recommendations')
+
+
+def make_key(scope, pk=None):
+    if pk is None:
+        return f'{KEY_PREFIX}:{scope}'
+    return f'{KEY_PREFIX}:{scope}:{pk}'
+
+
+def _now():
+    return int(time.time() * 1_000_000)
+
+
+def get(scope, pk=None):
+    key = make_key(scope, pk)
+    version = cache.get(key)
+    if version is None:
+        # Версия потеряна (вытеснена или кеш очищен): начинаем новое
+        # поколение, чтобы не совпасть ни с одним старым ключом.
+        cache.add(key, _now(), settings.VERSIONS_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def _bump(keys):
+    current = cache.get_many(keys)
+    now = _now()
+    new = {key: max(now, current.get(key, 0) + 1) for key in keys}
+    cache.set_many(new, settings.VERSIONS_TIMEOUT)
+    return {key: (current.get(key), new[key]) for key in keys}
+
+
+def _chain(first, second):
+    """Итог двух сдвигов подряд как одного, если между ними версию
+    никто не менял; иначе старая версия неизвестна (``None``)."""
+    return {
+        key: (old if second[key][0] == new else None, second[key][1])
+        for key, (old, new) in first.items()
+    }
+
+
+def bump(*scopes, then=None):
+    """Сдвинуть версии; ``scopes`` — пары ``(scope, pk)``.
+
+    Возвращает ``{ключ: (старая версия, новая)}``; старой может
+    не быть (``None``).
+
+    Внутри транзакции версии сдвигаются ещё раз после её фиксации.
+    Пока транзакция открыта, параллельный запрос может прочитать новую
+    версию, но старые строки и закешировать под ней старую страницу
+    (а по её ETag отвечать 304); второй сдвиг делает такую запись
+    недостижимой. Первый сдвиг нужен самой транзакции: её следующие
+    чтения уже видят изменения. ``then`` получает итог обоих сдвигов
+    после фиксации (или сразу вне транзакции).
+    """
+    keys = {
+        make_key(scope, pk) for scope, pk in scopes
+        if pk is not None or scope in GLOBAL_SCOPES
+    }
+    if not keys:
+        return {}
+    stamps = _bump(keys)
+    if transaction.get_connection().in_atomic_block:
+        def again():
+            committed = _chain(stamps, _bump(keys))
+            if then is not None:
+                then(committed)
+        transaction.on_commit(again)
+    elif then is not None:
+        then(stamps)
+    return stamps
+
+
+def bump_post(post, group_ids=()):
+    bump(
+        ('index', None),
+        ('profile', post.author_id),
+        ('post', post.pk),
+        ('group', post.group_id),
+        *(('group', group_id) for group_id in group_ids),
+    )
@@ -1,77 +1,215 @@
+from functools import partial
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+
+from core import replicas
 
+from . import conditional, feeds, ranking, search, suggestions, versions
+from .feeds import follow_feed
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .paginators import CursorPaginator
 
 
-def paginator(queryset, request):
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def paginator(queryset, request, ordering=('-pub_date', '-pk'),
+              lazy=False):
+    paginator = CursorPaginator(
+        queryset, settings.POSTS_PER_PAGE, ordering=ordering
+    )
+    cursor = request.GET.get('cursor')
+    if lazy:
+        # Страница читается в шаблоне, внутри {% cache %}.
+        return paginator.get_lazy_page(cursor)
+    page_obj = paginator.get_page(cursor)
     return page_obj
 
 
+def comments_paginator(post):
+    return CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        ordering=('created', 'pk')
+    )
+
+
+def comments_page(post, cursor=None):
+    return comments_paginator(post).get_page(cursor)
+
+
 def index(request):
-    posts = Post.objects.all()
-    page_obj = paginator(posts, request)
+    mode = request.GET.get('mode')
+    if mode not in ranking.MODES:
+        mode = None
+    version = versions.get('index')
+    if mode:
+        # Порядок ранжированных лент меняет и пересчёт оценок.
+        version = max(version, versions.get('ranking'))
+    response = conditional.not_modified(request, version)
+    if response is not None:
+        return response
+    replicas.require_fresh(version)
+    posts = Post.objects.feed().pictures()
+    if mode:
+        page_obj = paginator(
+            posts, request, ranking.MODES[mode], lazy=True
+        )
+    else:
+        page_obj = paginator(posts, request, lazy=True)
     template = 'posts/index.html'
     context = {
         'posts': posts,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_version': version,
+        'mode': mode,
+        'page_query': f'mode={mode}&' if mode else ''
     }
-    return render(request, template, context)
+    response = render(request, template, context)
+    return conditional.add_headers(request, response, version)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(posts, request)
+    version = versions.get('group', group.pk)
+    response = conditional.not_modified(request, version)
+    if response is not None:
+        return response
+    replicas.require_fresh(version)
+    posts = group.posts.feed().pictures()
+    page_obj = paginator(posts, request, lazy=True)
     template = 'posts/group_list.html'
     context = {
         'group': group,
         'posts': posts,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_version': version
     }
-    return render(request, template, context)
+    response = render(request, template, context)
+    return conditional.add_headers(request, response, version)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = paginator(posts, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    # Подписка и отписка тоже сдвигают версию профиля.
+    version = versions.get('profile', author.pk)
+    page_version = version
+    own_profile = request.user.pk == author.pk
+    if own_profile:
+        # На своём профиле виден блок «Кого почитать».
+        page_version = max(version, versions.get('recommendations'))
+    response = conditional.not_modified(request, page_version)
+    if response is not None:
+        return response
+    replicas.require_fresh(page_version)
+    posts = author.posts.feed().pictures()
+    page_obj = paginator(posts, request, lazy=True)
     template = 'posts/profile.html'
     context = {
         'author': author,
         'posts': posts,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'cache_version': version
     }
+    if own_profile:
+        context['suggestions'] = suggestions.for_user(request.user)
     follow_not_author = (
         request.user.is_authenticated
         and (request.user.username is not author.username)
     )
     if follow_not_author:
-        following = Follow.objects.filter(
-            author=author,
-            user=request.user
-        )
-        context['following'] = following
+        # Свою подписку пользователь должен видеть сразу, а граф другого
+        # процесса узнаёт о ней только по общей версии follows (в
+        # locmem — через VERSIONS_TIMEOUT). Поэтому кнопка читает базу.
+        context['following'] = Follow.objects.filter(
+            user=request.user, author=author
+        ).exists()
+    response = render(request, template, context)
+    return conditional.add_headers(request, response, page_version)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    posts = search.search(Post.objects.feed().pictures(), query)
+    page_obj = Paginator(posts, settings.POSTS_PER_PAGE).get_page(
+        request.GET.get('page')
+    )
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': page_obj
+    }
     return render(request, template, context)
 
 
+def post_page_version(post_id):
+    """Версия страницы поста или ``None``, если поста нет.
+
+    Кроме самого поста страница показывает имя автора, число его постов
+    и название группы, а их изменения сдвигают версии ``profile`` и
+    ``group``. Автор и группа — один запрос по первичному ключу, он
+    дешевле рендеринга; удаление поста сдвигает его версию.
+    """
+    ids = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if ids is None:
+        return None
+    author_id, group_id = ids
+    page_versions = [
+        versions.get('post', post_id),
+        versions.get('profile', author_id),
+    ]
+    if group_id is not None:
+        page_versions.append(versions.get('group', group_id))
+    return max(page_versions)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    version = post_page_version(post_id)
+    if version is None:
+        raise Http404
+    response = conditional.not_modified(request, version)
+    if response is not None:
+        return response
+    replicas.require_fresh(version)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
     form = CommentForm(request.POST or None)
     template = 'posts/post_detail.html'
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        # Шаблон вызывает функцию внутри {% cache %}: при попадании
+        # в кеш запрос комментариев не выполняется.
+        'comments_page': partial(comments_page, post),
+        'cache_version': version
     }
-    return render(request, template, context)
+    response = render(request, template, context)
+    return conditional.add_headers(request, response, version)
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    page_obj = comments_page(post, request.GET.get('cursor'))
+    html = render_to_string(
+        'posts/includes/comment_list.html',
+        {'comments': page_obj},
+        request
+    )
+    return JsonResponse({
+        'html': html,
+        'next_cursor': page_obj.paginator.next_cursor
+    })
 
 
 @login_required
@@ -83,7 +221,8 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', username=post.author)
     template = 'posts/create_post.html'
     context = {
@@ -101,7 +240,8 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        post = form.save()
+        with transaction.atomic():
+            post = form.save()
         return redirect('posts:post_detail', post_id=post.pk)
     template = 'posts/update_post.html'
     context = {
@@ -119,20 +259,20 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    user = request.user
-    authors = user.follower.values_list('author', flat=True)
-    posts = Post.objects.filter(author__id__in=authors)
-    page_obj = paginator(posts, request)
+    posts = follow_feed(request.user).feed().pictures()
+    page_obj = paginator(posts, request, feeds.ORDERING)
     template = 'posts/follow.html'
     context = {
         'posts': posts,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'suggestions': suggestions.for_user(request.user)
     }
     return render(request, template, context)
 
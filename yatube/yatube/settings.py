@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from core.databases import from_url, tuned_sqlite
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -45,15 +47,18 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,12 +90,49 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': from_url(os.getenv(
+        'YATUBE_DATABASE_URL', os.path.join(BASE_DIR, 'db.sqlite3')
+    )),
 }
 
+# Профиль SQLite под конкурентную запись (YATUBE_SQLITE_PROFILE=production,
+# core.db_backends.sqlite3): WAL, synchronous=NORMAL, mmap, ожидание
+# блокировки до SQLITE_BUSY_TIMEOUT мс и соединения, живущие
+# CONN_MAX_AGE секунд. Только для основной базы: постоянное соединение
+# с репликой не увидело бы копию, которую подменил copy_replicas.
+SQLITE_TUNING = None
+if os.getenv('YATUBE_SQLITE_PROFILE', 'default') == 'production':
+    SQLITE_TUNING = {
+        'conn_max_age': int(os.getenv('YATUBE_CONN_MAX_AGE', 600)),
+        'busy_timeout': int(os.getenv('YATUBE_SQLITE_BUSY_TIMEOUT', 20000)),
+        'mmap_size': int(os.getenv('YATUBE_SQLITE_MMAP_SIZE', 256 * 2 ** 20)),
+    }
+    DATABASES['default'] = tuned_sqlite(DATABASES['default'], **SQLITE_TUNING)
+
+# Реплики для чтения (core.replicas): адреса через запятую, например
+# копии SQLite, которые обновляет manage.py copy_replicas, или реплики
+# PostgreSQL. В тестах реплики смотрят в тестовую основную базу.
+DATABASE_REPLICAS = []
+for number, url in enumerate(
+        filter(None, os.getenv('YATUBE_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = from_url(
+        url.strip(), TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Страницы, которые читают с реплик, и сколько секунд после записи
+# пользователь читает только с основной базы.
+REPLICA_VIEWS = (
+    'posts.views.index',
+    'posts.views.group_posts',
+    'posts.views.profile',
+    'posts.views.post_detail',
+    'posts.views.follow_index',
+)
+REPLICA_PIN_COOKIE = 'read_primary'
+REPLICA_PIN_SECONDS = int(os.getenv('YATUBE_REPLICA_PIN_SECONDS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -140,8 +182,123 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+# Адрес сайта для ссылок в письмах.
+SITE_URL = os.getenv('YATUBE_SITE_URL', 'http://127.0.0.1:8000')
+
+# Сводки новых постов подписок (posts.digests, manage.py send_digests):
+# не чаще раза в DIGEST_INTERVAL_HOURS на пользователя, до
+# DIGEST_MAX_POSTS постов в письме, посты не старше DIGEST_LOOKBACK_DAYS
+# дней.
+DIGEST_INTERVAL_HOURS = 24
+DIGEST_MAX_POSTS = 10
+DIGEST_LOOKBACK_DAYS = 7
+DIGEST_BATCH_SIZE = 500
+DIGEST_CONNECTIONS = 4
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# max-age страниц лент для гостей. При 0 браузер и прокси хранят
+# страницу, но каждый раз переспрашивают её (ответ 304 дешёвый).
+PAGE_CACHE_MAX_AGE = int(os.getenv('YATUBE_PAGE_MAX_AGE', 0))
+
+# Авторы с таким числом подписчиков не раскладываются по лентам при
+# публикации, их посты подмешиваются в /follow/ при чтении.
+FEED_CELEBRITY_FOLLOWERS = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = 1000
+# Граф подписок в памяти процесса (posts.graph): сколько пользователей
+# держать и через сколько секунд перечитывать их подписки из базы.
+FOLLOW_GRAPH_MAX_USERS = 10000
+FOLLOW_GRAPH_TTL = 300
+# «Кого почитать» (posts.recommendations, manage.py recommend_follows):
+# сколько рекомендаций хранить на пользователя и показывать на странице,
+# и сколько пользователей записывать одной транзакцией.
+RECOMMENDATIONS_TOP_K = 20
+RECOMMENDATIONS_SHOWN = 5
+RECOMMENDATIONS_BLOCK_SIZE = int(
+    os.getenv('YATUBE_RECOMMENDATIONS_BLOCK_SIZE', 1000)
+)
+# Ленты «В тренде» и «Популярное» (posts.ranking, manage.py
+# update_scores): за сколько часов вес поста падает вдвое и сколько
+# комментариев стоит каждое удвоение числа подписчиков автора.
+TRENDING_HALF_LIFE_HOURS = 6
+POPULAR_HALF_LIFE_HOURS = 24 * 7
+SCORE_FOLLOWER_WEIGHT = 1
+SCORE_BATCH_SIZE = 1000
+
+# Потоки, в которых yatube.asgi выполняет представления. Медленные
+# клиенты их не занимают: чтение запроса и отправку ответа делает
+# цикл событий ASGI-сервера.
+ASGI_WORKERS = int(os.getenv('YATUBE_ASGI_WORKERS', 8))
+
+# Фоновые задачи core.tasks. При YATUBE_TASKS_EAGER=0 побочная работа
+# записей (раскладка по лентам, поисковый индекс, миниатюры) уходит в
+# очередь, которую разбирает manage.py run_tasks --loop и TASK_WORKERS
+# потоков самого процесса. По умолчанию раскладка и индекс выполняются
+# сразу, в запросе, а миниатюры — после коммита: в потоках TASK_WORKERS
+# или, если их нет, в том же запросе вне транзакции.
+TASKS_EAGER = os.getenv('YATUBE_TASKS_EAGER', '1') == '1'
+TASK_WORKERS = int(os.getenv('YATUBE_TASK_WORKERS', 0))
+
+# Загрузки пишутся сразу во временный файл, а не в память процесса.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Ограничения картинки поста: больше байт или пикселей — ошибка формы,
+# сторона длиннее POST_IMAGE_MAX_SIDE — картинка уменьшается. Не-JPEG
+# декодируется в полный размер, для него предел POST_IMAGE_MAX_FULL_PIXELS.
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 60_000_000
+POST_IMAGE_MAX_FULL_PIXELS = 25_000_000
+POST_IMAGE_MAX_SIDE = 2560
+
+# Замеры core.middleware.ProfilingMiddleware: для каких представлений,
+# какую долю запросов писать в лог и какие бюджеты считать превышением
+# ('*' — для всех, ключ-имя представления уточняет бюджет).
+PROFILING_VIEWS = ('posts.views', 'api.views')
+PROFILING_SAMPLE_RATE = float(os.getenv('YATUBE_PROFILING_SAMPLE', 0.01))
+# Заголовок Server-Timing получает персонал и DEBUG; всем посетителям —
+# только при YATUBE_SERVER_TIMING=1 (нагрузочные тесты).
+PROFILING_SERVER_TIMING = os.getenv('YATUBE_SERVER_TIMING', '0') == '1'
+PROFILING_BUDGETS = {
+    '*': {'queries': 10, 'ms': 300},
+    'posts.views.search_posts': {'queries': 10, 'ms': 800},
+    # Записи обновляют счётчики, ленты и поисковый индекс.
+    'posts.views.post_create': {'queries': 25, 'ms': 500},
+    'posts.views.post_edit': {'queries': 25, 'ms': 500},
+    'posts.views.add_comment': {'queries': 20, 'ms': 300},
+    'posts.views.profile_follow': {'queries': 20, 'ms': 500},
+    'posts.views.profile_unfollow': {'queries': 20, 'ms': 500},
+}
+PROFILING_LOG_FILE = os.path.join(BASE_DIR, 'profiling.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'profiling': {
+            'format': '%(asctime)s %(levelname)s %(message)s',
+        },
+    },
+    'handlers': {
+        'profiling': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': PROFILING_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'encoding': 'utf-8',
+            'formatter': 'profiling',
+        },
+    },
+    'loggers': {
+        'yatube.profiling': {
+            'handlers': ['profiling'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -151,8 +308,34 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+# Бэкенд кеша выбирается переменной окружения YATUBE_CACHE.
+# locmem — свой кеш у каждого процесса, остальные общие для всех воркеров.
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache_backends.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'core.cache_backends.resp.RedisCache',
+        'LOCATION': os.getenv('YATUBE_REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+
+CACHE_BACKEND = os.getenv('YATUBE_CACHE', 'locmem')
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND]
 }
+# Версии страниц (posts.versions) в общем кеше бессрочные. В locmem у
+# каждого процесса свои версии и сдвиг в одном воркере не доходит до
+# других, поэтому там версия живёт VERSIONS_TIMEOUT секунд: дольше
+# страница устаревшей не останется.
+VERSIONS_TIMEOUT = 20 if CACHE_BACKEND == 'locmem' else None